@@ -0,0 +1,360 @@
+# async_engine.py
+#
+# asyncio download engine (`download.py --engine async`).
+#
+# All tasks share one httpx connection pool. Each task still owns its portal
+# session (cookie jar + app_token), because the portal chains app_tokens from
+# one response to the next: link-resolve POSTs are therefore issued one at a
+# time per session, while PDF GETs, disk writes and GCS uploads for earlier
+# rows overlap with them. A global and a per-court semaphore bound the number
+# of requests in flight. Index, progress and dead-letter writes are SQLite,
+# so they run on worker threads rather than stalling the event loop.
+
+import asyncio
+import logging
+import time
+import urllib.parse
+from collections import defaultdict
+from contextlib import asynccontextmanager, nullcontext
+from typing import Optional
+
+import httpx
+
+import metrics
+from download import (
+    Downloader, RunContext, ROOT_URL, SEARCH_URL, CAPTCHA_URL, CAPTCHA_TOKEN_URL,
+    PDF_LINK_URL, PDF_LINK_WO_CAPTCHA, PAGE_SIZE, NO_CAPTCHA_BATCH, FAILED_DB, Shutdown,
+    endpoint_name, leased_task, task_finished,
+)
+from pdf_stream import NotAPdf, CHUNK_SIZE
+from retry import API_RETRY, CAPTCHA_RETRY, TASK_RETRY, RetriesExhausted
+from row_parser import RowRecord, parse_row
+from scheduler import FairScheduler
+from work_queue import WorkQueue
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_POLL = 0.5  # s between checks while every court with tasks left is at its cap
+
+
+class InFlightLimits:
+    """Global + per-court caps on concurrent HTTP requests."""
+
+    def __init__(self, global_limit: int, per_court: int):
+        self._global = asyncio.Semaphore(global_limit)
+        self._courts = defaultdict(lambda: asyncio.Semaphore(per_court))
+
+    @asynccontextmanager
+    async def slot(self, court_code: str):
+        async with self._courts[court_code]:
+            async with self._global:
+                yield
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """The run's pool, lent to a session's client: closing the client leaves it open."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self):
+        pass  # _run() closes the pool itself
+
+
+class AsyncDownloader(Downloader):
+    def __init__(self, court_code: str, transport: httpx.AsyncHTTPTransport,
+                 limits: InFlightLimits, ctx: Optional[RunContext] = None):
+        super().__init__(court_code, ctx)
+        self.session = None
+        self.transport = SharedTransport(transport)
+        self.limits = limits
+        self.client = None
+        self._clients = []  # every session's client, closed once the window is done
+        self.inflight = set()
+
+    def _apermit(self, url: str):
+        if not self.ctx.limiter:
+            return nullcontext()
+        return self.ctx.limiter.arequest(urllib.parse.urlsplit(url).netloc, self.code)
+
+    async def _send(self, method, url, client=None, **kw) -> httpx.Response:
+        client = client or self.client
+        async with self._apermit(url), self.limits.slot(self.code):
+            return await client.request(method, url, **kw)
+
+    async def init_session(self):
+        # A fresh client means a fresh cookie jar on the shared transport;
+        # fetches still running on the previous session keep their client.
+        with metrics.INIT_SESSION_SECONDS.time(court=self.code):
+            self.client = httpx.AsyncClient(transport=self.transport, timeout=60)
+            self._clients.append(self.client)
+            await self._send("GET", f"{ROOT_URL}/pdfsearch/",
+                             headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
+        if not self.client.cookies.get("JSESSION"):
+            raise RuntimeError("Failed to init session")
+
+    async def solve_captcha(self) -> str:
+        for _ in range(CAPTCHA_RETRY.attempts):
+            with metrics.CAPTCHA_HTTP_SECONDS.time(court=self.code):
+                r = await self._send("GET", CAPTCHA_URL, timeout=30)
+                r.raise_for_status()
+            with metrics.CAPTCHA_OCR_SECONDS.time(court=self.code):
+                ans = await asyncio.to_thread(self._read_captcha, r.content)
+            metrics.CAPTCHA_SOLVES.inc(court=self.code, result="unreadable" if ans is None else "ok")
+            if ans is not None:
+                return ans
+        raise RetriesExhausted(f"Captcha fail: {CAPTCHA_RETRY.attempts} unreadable images")
+
+    async def refresh_token(self, use_app=False):
+        ans = await self.solve_captcha()
+        data = {"captcha": ans, "search_opt": "PHRASE", "ajax_req": "true"}
+        if use_app and self.app_token:
+            data["app_token"] = self.app_token
+        metrics.TOKEN_REFRESHES.inc(court=self.code)
+        with metrics.API_REQUEST_SECONDS.time(court=self.code, endpoint="checkCaptcha"):
+            r = await self._send("POST", CAPTCHA_TOKEN_URL, headers=self.headers(), data=data)
+        self.app_token = r.json().get("app_token")
+
+    async def request_api(self, method, url, data):
+        endpoint = endpoint_name(url)
+        for attempt in range(1, API_RETRY.attempts + 1):
+            with metrics.API_REQUEST_SECONDS.time(court=self.code, endpoint=endpoint):
+                r = await self._send(method, url, headers=self.headers(), data=data)
+            try:
+                j = r.json()
+            except Exception:
+                j = {}
+            if "app_token" in j:
+                self.app_token = j["app_token"]
+            if "filename" in j and "securimage_show" in j["filename"]:
+                ans = await self.solve_captcha()
+                metrics.API_RETRIES.inc(court=self.code, endpoint=endpoint, reason="pdf_captcha")
+                data.update({"captcha1": ans, "app_token": j["app_token"]})
+                with metrics.API_REQUEST_SECONDS.time(court=self.code, endpoint="openpdf"):
+                    return await self._send("POST", PDF_LINK_WO_CAPTCHA, headers=self.headers(),
+                                            data=data)
+            if not (j.get("session_expire") == "Y" or "errormsg" in j):
+                return r
+            reason = "session_expire" if j.get("session_expire") == "Y" else "errormsg"
+            self._congested(url)
+            if attempt >= API_RETRY.attempts:
+                break
+            metrics.API_RETRIES.inc(court=self.code, endpoint=endpoint, reason=reason)
+            await asyncio.sleep(API_RETRY.delay(attempt))
+            await self.refresh_token(use_app=True)
+            data["app_token"] = self.app_token
+        raise RetriesExhausted(f"{endpoint}: {reason} after {API_RETRY.attempts} attempts")
+
+    async def process_date_range(self, frm: str, to: str):
+        if not (frm and to):
+            return
+        fetches = set()
+        try:
+            await self._process_window(frm, to, fetches)
+        finally:
+            # A failed pass still lets its fetches settle before their clients close.
+            if fetches:
+                await asyncio.gather(*list(fetches), return_exceptions=True)
+            for client in self._clients:
+                await client.aclose()
+            self._clients.clear()
+
+    async def _process_window(self, frm: str, to: str, fetches: set):
+        logger.info(f"Processing {self.code} {frm}->{to}")
+        sp = self.default_search_payload()
+        sp.update({"from_date": frm, "to_date": to, "state_code": self.code, "app_token": self.app_token or ""})
+        sp["iDisplayStart"] = await asyncio.to_thread(self._resume_offset, frm, to)
+
+        await self.init_session()
+        resolved_count = 0
+
+        while True:
+            resp = await self.request_api("POST", SEARCH_URL, sp)
+            rows = resp.json().get("reportrow", {}).get("aaData", [])
+            if not rows:
+                if fetches:
+                    await asyncio.gather(*list(fetches))
+                if self.ctx.progress:
+                    await asyncio.to_thread(self.ctx.progress.mark_done, self.code, frm, to)
+                logger.info(f"Marked {self.code} {frm}→{to} done")
+                break
+
+            for idx, row in enumerate(rows):
+                offset = sp["iDisplayStart"] + idx
+                if self.ctx.stopping.is_set():
+                    if fetches:
+                        await asyncio.gather(*list(fetches))
+                    await asyncio.to_thread(self._checkpoint, frm, to, offset, force=True)
+                    logger.info(f"✋ Stopped {self.code} {frm}→{to} at row {offset}")
+                    raise Shutdown()
+                await asyncio.to_thread(self._checkpoint, frm, to, offset)
+                rec = None
+                try:
+                    rec = parse_row(row[1])
+                    if not await self._start_row(rec, idx, frm, to, offset, fetches):
+                        continue
+                except Exception as e:
+                    await asyncio.to_thread(self._row_failed, rec.pdf_link if rec else None,
+                                            frm, to, repr(e), offset=offset)
+                    continue
+                # Only rows that cost a link POST count towards the batch.
+                resolved_count += 1
+                if resolved_count >= NO_CAPTCHA_BATCH:
+                    logger.info("Resetting session after batch")
+                    resolved_count = 0
+                    await self.init_session()
+                    sp["app_token"] = self.app_token
+                    # Resume the listing after this row instead of re-reading the page.
+                    sp["sEcho"] += 1
+                    sp["iDisplayStart"] += idx + 1
+                    break
+            else:
+                sp["sEcho"] += 1
+                sp["iDisplayStart"] += PAGE_SIZE
+
+        if fetches:
+            await asyncio.gather(*list(fetches))
+
+    async def _start_row(self, rec: RowRecord, idx: int, frm: str, to: str, offset: int,
+                         fetches: set) -> bool:
+        frag = rec.pdf_link
+        if not frag or frag in self.inflight or not await asyncio.to_thread(
+                self._wants, frag, frm, to):
+            return False
+
+        lp = self.default_pdf_payload()
+        lp.update({"path": frag, "val": idx, "app_token": self.app_token or ""})
+        r2 = await self.request_api("POST", PDF_LINK_URL, lp)
+        outputfile = r2.json().get("outputfile")
+
+        self.inflight.add(frag)
+        self._open_offsets.add(offset)
+        t = asyncio.create_task(self._fetch_and_store(self.client, outputfile, rec, frm, to, offset))
+        fetches.add(t)
+        t.add_done_callback(fetches.discard)
+        return True
+
+    async def _download_pdf_async(self, client, outputfile, frag: str, frm: str, to: str) -> None:
+        if not outputfile:
+            raise RuntimeError("No outputfile in PDF-link response")
+        sink = await asyncio.to_thread(self._open_pdf_sink, frag, frm, to)
+        started = time.perf_counter()
+        write_s = 0.0
+        try:
+            async with self._apermit(ROOT_URL), self.limits.slot(self.code):
+                async with client.stream("GET", ROOT_URL + outputfile) as r:
+                    async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                        t = time.perf_counter()
+                        if sink.remote is None:
+                            sink.write(chunk)
+                        else:
+                            # Remote writes can block on a resumable-upload round trip.
+                            await asyncio.to_thread(sink.write, chunk)
+                        write_s += time.perf_counter() - t
+            t = time.perf_counter()
+            await asyncio.to_thread(sink.commit)
+            write_s += time.perf_counter() - t
+        except NotAPdf:
+            sink.abort()
+            raise NotAPdf(f"Portal served HTML in place of the PDF: {frag}") from None
+        except Exception:
+            sink.abort()
+            raise
+        self._pdf_timed(sink, time.perf_counter() - started, write_s)
+        await asyncio.to_thread(self._pdf_stored, sink, frag, frm, to)
+
+    async def _fetch_and_store(self, client, outputfile, rec: RowRecord, frm: str, to: str,
+                               offset: int):
+        try:
+            await self._download_pdf_async(client, outputfile, rec.pdf_link, frm, to)
+            await asyncio.to_thread(self._save_and_upload, rec, frm, to)
+        except Exception as e:
+            await asyncio.to_thread(self._row_failed, rec.pdf_link, frm, to, repr(e))
+        else:
+            await asyncio.to_thread(self._row_done, rec.pdf_link, frm, to)
+        finally:
+            self.inflight.discard(rec.pdf_link)
+            self._settle(offset)
+
+
+async def _run(tasks, workers: int, max_in_flight: int, per_court_in_flight: int,
+               ctx: Optional[RunContext], wq: Optional[WorkQueue] = None,
+               per_court_tasks: int = 0, order: str = "oldest"):
+    transport = httpx.AsyncHTTPTransport(
+        verify=False,
+        limits=httpx.Limits(max_connections=max_in_flight,
+                            max_keepalive_connections=max_in_flight),
+    )
+    limits = InFlightLimits(max_in_flight, per_court_in_flight)
+    sched = FairScheduler(tasks, per_court_tasks, order)
+    done = 0
+
+    async def run_task(task):
+        dl = AsyncDownloader(task.court_code, transport, limits, ctx)
+        dl.only = task.only
+        await dl.process_date_range(task.frm, task.to)
+
+    async def next_task():
+        if wq is not None:
+            lease = await asyncio.to_thread(wq.next, None, ctx.stopping if ctx else None)
+            return (None, None) if lease is None else (leased_task(lease), lease)
+        # Every court with tasks left may be at its cap; wait for one to finish.
+        while (task := sched.take()) is None and sched.pending():
+            if ctx and ctx.stopping.is_set():
+                break
+            await asyncio.sleep(SCHEDULE_POLL)
+        return task, None
+
+    async def worker():
+        nonlocal done
+        while not (ctx and ctx.stopping.is_set()):
+            task, lease = await next_task()
+            if task is None:
+                return
+            logger.info(f"▶ Starting {task}")
+            error = None
+            started = time.time()
+            try:
+                await TASK_RETRY.acall(run_task, task, what=f"Task {task}")
+            except Shutdown:
+                if lease is not None:
+                    await asyncio.to_thread(wq.release, lease)
+                raise
+            except Exception as e:
+                error = e
+            finally:
+                if lease is None:
+                    sched.done(task)
+            await asyncio.to_thread(task_finished, task, ctx, error, started)
+            if lease is not None:
+                await asyncio.to_thread(wq.finish, lease, error is None,
+                                        None if error is None else f"see {FAILED_DB}")
+            done += 1
+            logger.info(f"✅ Completed task {done}" + ("" if wq else f"/{len(tasks)}"))
+
+    n_workers = workers if wq is not None else min(workers, len(tasks))
+    try:
+        # Let every worker wind down on a Shutdown before re-raising the first error.
+        results = await asyncio.gather(*(worker() for _ in range(n_workers)),
+                                       return_exceptions=True)
+        for r in results:
+            if isinstance(r, BaseException):
+                raise r
+        if ctx and ctx.stopping.is_set() and sched.pending():
+            raise Shutdown()
+    finally:
+        await transport.aclose()
+
+
+def run_async(tasks, workers: int, max_in_flight: int = 32, per_court_in_flight: int = 4,
+              ctx: Optional[RunContext] = None, queue: Optional[WorkQueue] = None,
+              per_court_tasks: int = 0, order: str = "oldest"):
+    """
+    Run `tasks`, interleaved across courts (scheduler.py), or, given a shared
+    `queue`, whatever can be claimed from it.
+    """
+    asyncio.run(_run(tasks, workers, max_in_flight, per_court_in_flight, ctx, queue,
+                     per_court_tasks, order))
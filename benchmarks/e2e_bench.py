@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# benchmarks/e2e_bench.py
+#
+# Offline end-to-end benchmark: starts benchmarks/fake_portal.py in-process,
+# points download.py at it (ECOURTS_ROOT_URL) and drives run() in a scratch
+# directory, then reports rows/s, portal requests per row, captcha solves
+# per row and p50/p99 server latency per endpoint.
+#
+#   python benchmarks/e2e_bench.py --engine pipeline --courts 2 --days 7 --latency 0.03
+#
+# --stub_captcha answers every captcha with "0" instead of running OCR (the
+# fake portal accepts any answer unless --strict_captcha is given).
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+sys.path.insert(0, str(REPO / "benchmarks"))
+
+from fake_portal import FakePortal  # noqa: E402
+
+
+class _StubSolver:
+    def solve(self, content: bytes) -> str:
+        return "0"
+
+
+def percentile(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0.0
+
+
+def report(elapsed, snap):
+    counts, lat = snap["counts"], snap["latency"]
+    rows = counts.get("pdf", 0)
+    total = sum(counts.values())
+    print(f"rows downloaded : {rows} in {elapsed:.2f}s → {rows / elapsed:.1f} rows/s")
+    if rows:
+        print(f"requests / row  : {total / rows:.2f}")
+        print(f"captchas / row  : {counts.get('captcha', 0) / rows:.3f}")
+    print(f"bytes served    : {snap['bytes_out'] / 1e6:.1f} MB")
+    print("endpoint            count     p50 ms     p99 ms")
+    for ep in sorted(counts):
+        xs = lat.get(ep, [])
+        print(f"  {ep:16s} {counts[ep]:8d} {percentile(xs, 0.5) * 1000:10.1f} "
+              f"{percentile(xs, 0.99) * 1000:10.1f}")
+    every = [x for xs in lat.values() for x in xs]
+    if every:
+        print(f"  {'all':16s} {len(every):8d} {statistics.median(every) * 1000:10.1f} "
+              f"{percentile(every, 0.99) * 1000:10.1f}")
+
+
+def main():
+    p = argparse.ArgumentParser(description="End-to-end scraper benchmark against a fake portal")
+    p.add_argument("--engine", choices=["thread", "pipeline", "async"], default="thread")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--courts", type=int, default=2, help="First N courts from court-codes.json")
+    p.add_argument("--start_date", default="2024-01-01")
+    p.add_argument("--days", type=int, default=7)
+    p.add_argument("--day_step", type=int, default=1)
+    p.add_argument("--session_pool", type=int, default=0)
+    p.add_argument("--rate", type=float, default=0, help="Scraper-side requests/s cap")
+    p.add_argument("--adaptive", action="store_true", help="Scraper-side AIMD concurrency")
+    p.add_argument("--rows_per_day", type=int, default=20)
+    p.add_argument("--pdf_size", type=int, default=200 * 1024)
+    p.add_argument("--latency", type=float, default=0.0)
+    p.add_argument("--jitter", type=float, default=0.0)
+    p.add_argument("--error_rate", type=float, default=0.0)
+    p.add_argument("--session_ttl", type=float, default=0)
+    p.add_argument("--session_requests", type=int, default=0)
+    p.add_argument("--free_links", type=int, default=25)
+    p.add_argument("--strict_captcha", action="store_true")
+    p.add_argument("--stub_captcha", action="store_true",
+                   help="Skip OCR and answer every captcha with '0'")
+    p.add_argument("--corpus", help="Recorded rows for the portal to replay")
+    p.add_argument("--verbose", action="store_true", help="Keep the scraper's INFO logging")
+    args = p.parse_args()
+
+    portal = FakePortal(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        session_ttl=args.session_ttl, session_requests=args.session_requests,
+                        free_links=args.free_links, rows_per_day=args.rows_per_day,
+                        pdf_size=args.pdf_size, strict_captcha=args.strict_captcha,
+                        corpus=args.corpus).start()
+    os.environ["ECOURTS_ROOT_URL"] = portal.url
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="e2e-bench-")
+    try:
+        # download.py keeps its data and progress.db relative to the cwd.
+        shutil.copy(REPO / "court-codes.json", scratch)
+        os.chdir(scratch)
+        import logging
+        import download
+        import captcha
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+        if args.stub_captcha:
+            captcha._solver = _StubSolver()
+
+        codes = list(download.get_court_codes())[:args.courts]
+        end = (download.datetime.strptime(args.start_date, "%Y-%m-%d")
+               + download.timedelta(days=args.days - 1)).strftime("%Y-%m-%d")
+        print(f"{args.engine} engine, {len(codes)} courts × {args.days} days × "
+              f"{args.rows_per_day} rows/day, portal at {portal.url}")
+
+        t = time.perf_counter()
+        download.run(codes, args.start_date, end, args.day_step, args.workers,
+                     engine=args.engine, upload=False, session_pool=args.session_pool,
+                     rate=args.rate, adaptive=args.adaptive)
+        elapsed = time.perf_counter() - t
+        report(elapsed, portal.stats.snapshot())
+    finally:
+        os.chdir(cwd)
+        portal.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# benchmarks/fake_portal.py
+#
+# Local stand-in for judgments.ecourts.gov.in, for offline benchmarks. It
+# serves the endpoints the downloader uses: the /pdfsearch/ landing page
+# (JSESSION cookie), the securimage captcha, checkCaptcha, the search
+# listing, openpdfcaptcha / openpdf and the PDFs themselves. Latency, session
+# expiry and `errormsg` injection are configurable, and every request is
+# counted and timed so a harness can report requests and captchas per row.
+#
+# Search rows are synthetic (rows_per_day per court per day), or replay the
+# HTML of recorded rows (--corpus: saved search responses or metadata JSONs
+# with raw_html) with each row's pdf link rewritten to a unique path.
+#
+#   python benchmarks/fake_portal.py --port 8800 --latency 0.05
+#   ECOURTS_ROOT_URL=http://127.0.0.1:8800 python download.py --no-upload ...
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROW_TEMPLATE = (
+    "<button type='button' role='link' class='btn btn-link p-0' "
+    "onclick=\"javascript:open_pdf('{i}','{date}','{path}#page=&search=+&toolbar=0','')\">"
+    "WP/{i}/{year} of Applicant {i} vs State</button><br>"
+    "Order in writ petition {i}<br>"
+    "<strong>Judge : HON'BLE JUSTICE A B C</strong><br>"
+    "<strong class='caseDetailsTD'>"
+    "<span style='color:#212F3D'> CNR :</span><font> {cnr}</font>"
+    "<span style='color:#212F3D'> | Date of registration :</span><font> {date}</font>"
+    "<span style='color:#212F3D'> | Decision Date :</span><font> {date}</font>"
+    "<span style='color:#212F3D'> | Disposal Nature :</span><font> DISPOSED OFF</font>"
+    "<span style='color:#212F3D'> | Court : Principal Bench</span></strong>"
+)
+_OPEN_PDF_RE = re.compile(r"(open_pdf\('.*?','.*?',')(.*?)('\))")
+
+CAPTCHA_IMG = (
+    "<img id='captcha_image_pdf' "
+    "src='/pdfsearch/vendor/securimage/securimage_show.php?{r}'>"
+)
+
+
+def _render_captcha(a: int, b: int) -> bytes:
+    import cv2
+    import numpy as np
+
+    img = np.full((40, 120), 255, np.uint8)
+    cv2.putText(img, f"{a}+{b}", (8, 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def load_templates(path: Optional[str]) -> List[str]:
+    """Recorded row HTML to replay; empty to use the synthetic template."""
+    if not path:
+        return []
+    path = Path(path)
+    files = sorted(path.glob("**/*.json")) if path.is_dir() else [path]
+    rows = []
+    for f in files:
+        try:
+            data = json.loads(f.read_text())
+        except (OSError, ValueError):
+            continue
+        if not isinstance(data, dict):
+            continue
+        if data.get("raw_html"):
+            rows.append(data["raw_html"])
+        rows.extend(r[1] for r in data.get("reportrow", {}).get("aaData", []))
+    return [r for r in rows if _OPEN_PDF_RE.search(r)]
+
+
+class PortalSessionState:
+    def __init__(self, free_links: int):
+        self.created = time.monotonic()
+        self.requests = 0
+        self.token = None
+        self.answer = None
+        self.links_left = free_links
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = defaultdict(int)
+        self.latency = defaultdict(list)
+        self.bytes_out = 0
+
+    def add(self, endpoint: str, secs: float, nbytes: int):
+        with self._lock:
+            self.counts[endpoint] += 1
+            self.latency[endpoint].append(secs)
+            self.bytes_out += nbytes
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"counts": dict(self.counts),
+                    "latency": {k: list(v) for k, v in self.latency.items()},
+                    "bytes_out": self.bytes_out}
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+            self.latency.clear()
+            self.bytes_out = 0
+
+
+class FakePortal:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, session_ttl: float = 0,
+                 session_requests: int = 0, free_links: int = 25, rows_per_day: int = 20,
+                 pdf_size: int = 200 * 1024, strict_captcha: bool = False,
+                 corpus: Optional[str] = None, seed: int = 0):
+        """
+        `latency`/`jitter`: seconds added to every response (uniform ±jitter).
+        `error_rate`: fraction of API POSTs answered with an `errormsg`.
+        `session_ttl`/`session_requests`: expire a session after that many
+        seconds or API requests (0 = never). `free_links`: link resolves per
+        captcha before openpdfcaptcha demands another one.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        self.session_requests = session_requests
+        self.free_links = free_links
+        self.rows_per_day = rows_per_day
+        self.strict_captcha = strict_captcha
+        self.templates = load_templates(corpus)
+        self.pdf = (b"%PDF-1.4\n" + b"0" * max(0, pdf_size - 16) + b"\n%%EOF\n")
+        self.stats = Stats()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._sessions: Dict[str, PortalSessionState] = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakePortal":
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        name="fake-portal", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ── behaviour ────────────────────────────────────────────────────────────
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + (self._random() * 2 - 1) * self.jitter))
+
+    def _session(self, sid: Optional[str]) -> Optional[PortalSessionState]:
+        with self._lock:
+            return self._sessions.get(sid)
+
+    def new_session(self) -> str:
+        sid = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[sid] = PortalSessionState(self.free_links)
+        return sid
+
+    def _expired(self, s: PortalSessionState) -> bool:
+        return bool((self.session_ttl and time.monotonic() - s.created > self.session_ttl)
+                    or (self.session_requests and s.requests > self.session_requests))
+
+    def captcha(self, sid: Optional[str]) -> bytes:
+        with self._rng_lock:
+            a, b = self._rng.randint(1, 20), self._rng.randint(1, 20)
+        s = self._session(sid)
+        if s is not None:
+            s.answer = str(a + b)
+        return _render_captcha(a, b)
+
+    def check_captcha(self, s: Optional[PortalSessionState], form: Dict) -> Dict:
+        if s is None:
+            return {"errormsg": "Session not found"}
+        if self.strict_captcha and form.get("captcha") != s.answer:
+            return {"errormsg": "Invalid Captcha"}
+        # A fresh captcha revives an expired session.
+        s.created = time.monotonic()
+        s.requests = 0
+        s.token = uuid.uuid4().hex
+        s.links_left = self.free_links
+        return {"app_token": s.token}
+
+    def api(self, route: str, s: Optional[PortalSessionState], form: Dict) -> Dict:
+        """search / openpdfcaptcha / openpdf for an authenticated session."""
+        if s is None or s.token is None:
+            return {"errormsg": "Please enter captcha"}
+        s.requests += 1
+        if self._expired(s):
+            s.token = None
+            return {"session_expire": "Y"}
+        if self.error_rate and self._random() < self.error_rate:
+            return {"errormsg": "Please try again", "app_token": s.token}
+        s.token = uuid.uuid4().hex
+        if route == "home":
+            return {**self.search(form), "app_token": s.token}
+        if route == "openpdfcaptcha" and s.links_left <= 0:
+            return {"filename": CAPTCHA_IMG.format(r=s.token), "app_token": s.token}
+        if route == "openpdf":
+            if self.strict_captcha and form.get("captcha1") != s.answer:
+                return {"errormsg": "Invalid Captcha", "app_token": s.token}
+            s.links_left = self.free_links
+        s.links_left -= 1
+        path = form.get("path", "")
+        return {"outputfile": f"/pdfsearch/tmp/{uuid.uuid5(uuid.NAMESPACE_URL, path).hex}.pdf",
+                "app_token": s.token}
+
+    def search(self, form: Dict) -> Dict:
+        court = form.get("state_code", "")
+        frm = datetime.strptime(form["from_date"], "%Y-%m-%d")
+        to = datetime.strptime(form["to_date"], "%Y-%m-%d")
+        total = ((to - frm).days + 1) * self.rows_per_day
+        start = int(form.get("iDisplayStart", 0))
+        length = int(form.get("iDisplayLength", 1000))
+        rows = [[str(i + 1), self.row(court, frm, i)]
+                for i in range(start, min(total, start + length))]
+        return {"reportrow": {"aaData": rows, "iTotalRecords": total,
+                              "iTotalDisplayRecords": total}}
+
+    def row(self, court: str, frm: datetime, i: int) -> str:
+        day = frm + timedelta(days=i // self.rows_per_day)
+        date = day.strftime("%d-%m-%Y")
+        safe = court.replace("~", "_")
+        cnr = f"FAKE{safe}{day:%Y%m%d}{i % self.rows_per_day:05d}"
+        path = f"court/cnrorders/{safe}/orders/{day:%Y}/{cnr}_{day:%Y-%m-%d}.pdf"
+        if self.templates:
+            tmpl = self.templates[i % len(self.templates)]
+            return _OPEN_PDF_RE.sub(lambda m: m.group(1) + path + m.group(3), tmpl, count=1)
+        return ROW_TEMPLATE.format(i=i, date=date, year=day.year, path=path, cnr=cnr)
+
+    # ── HTTP ─────────────────────────────────────────────────────────────────
+
+    def _handler(self):
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _sid(self) -> Optional[str]:
+                for part in self.headers.get("Cookie", "").split(";"):
+                    k, _, v = part.strip().partition("=")
+                    if k == "JSESSION":
+                        return v
+                return None
+
+            def _send(self, endpoint, started, body: bytes, ctype: str, cookie=None):
+                portal._delay()
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                if cookie:
+                    self.send_header("Set-Cookie", f"JSESSION={cookie}; Path=/")
+                self.end_headers()
+                self.wfile.write(body)
+                portal.stats.add(endpoint, time.perf_counter() - started, len(body))
+
+            def _json(self, endpoint, started, obj):
+                self._send(endpoint, started, json.dumps(obj).encode(), "application/json")
+
+            def do_GET(self):
+                started = time.perf_counter()
+                url = urllib.parse.urlsplit(self.path)
+                if url.path.rstrip("/") == "/pdfsearch":
+                    sid = self._sid()
+                    cookie = None if portal._session(sid) else portal.new_session()
+                    self._send("landing", started, b"<html>eCourts</html>", "text/html",
+                               cookie=cookie)
+                elif url.path.endswith("securimage_show.php"):
+                    self._send("captcha", started, portal.captcha(self._sid()), "image/png")
+                elif url.path.startswith("/pdfsearch/tmp/") and url.path.endswith(".pdf"):
+                    self._send("pdf", started, portal.pdf, "application/pdf")
+                elif url.path == "/__stats":
+                    self._json("stats", started, portal.stats.snapshot()["counts"])
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                started = time.perf_counter()
+                n = int(self.headers.get("Content-Length", 0))
+                form = {k: v[0] for k, v in
+                        urllib.parse.parse_qs(self.rfile.read(n).decode(),
+                                              keep_blank_values=True).items()}
+                route = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query) \
+                    .get("p", [""])[0].rstrip("/").rpartition("/")[2]
+                s = portal._session(self._sid())
+                if route == "checkCaptcha":
+                    self._json("checkCaptcha", started, portal.check_captcha(s, form))
+                elif route in ("home", "openpdfcaptcha", "openpdf"):
+                    self._json(route, started, portal.api(route, s, form))
+                else:
+                    self.send_error(404)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Offline stand-in for the eCourts judgments portal")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8800)
+    p.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    p.add_argument("--jitter", type=float, default=0.0, help="± uniform jitter on --latency")
+    p.add_argument("--error_rate", type=float, default=0.0,
+                   help="Fraction of API POSTs answered with an errormsg")
+    p.add_argument("--session_ttl", type=float, default=0, help="Session lifetime (s, 0 = none)")
+    p.add_argument("--session_requests", type=int, default=0,
+                   help="API requests per session before it expires (0 = none)")
+    p.add_argument("--free_links", type=int, default=25,
+                   help="Link resolves per captcha before openpdfcaptcha asks again")
+    p.add_argument("--rows_per_day", type=int, default=20)
+    p.add_argument("--pdf_size", type=int, default=200 * 1024)
+    p.add_argument("--strict_captcha", action="store_true",
+                   help="Reject wrong captcha answers instead of accepting any")
+    p.add_argument("--corpus", help="Recorded rows to replay (search responses or metadata tree)")
+    args = p.parse_args()
+
+    portal = FakePortal(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, session_ttl=args.session_ttl,
+                        session_requests=args.session_requests, free_links=args.free_links,
+                        rows_per_day=args.rows_per_day, pdf_size=args.pdf_size,
+                        strict_captcha=args.strict_captcha, corpus=args.corpus)
+    print(f"Fake portal on {portal.url} (export ECOURTS_ROOT_URL={portal.url})")
+    try:
+        portal.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# benchmarks/import_time.py
+#
+# Measure the cold-start cost of importing a module (default: download) in a
+# fresh interpreter: median wall time and peak RSS over several runs, plus the
+# slowest imports reported by `python -X importtime`.
+#
+#   python benchmarks/import_time.py --module download --runs 5
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+
+PROBE = (
+    "import time, resource, sys; t = time.perf_counter(); import {mod}; "
+    "print(time.perf_counter() - t, "
+    "resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+)
+
+
+def _run(args, cwd):
+    return subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True,
+                          text=True, env={**os.environ, "PYTHONPATH": str(REPO)}, check=True)
+
+
+def time_import(module: str, runs: int):
+    # Run from a scratch dir: importing download creates its output folders.
+    with tempfile.TemporaryDirectory() as cwd:
+        secs, rss = [], []
+        for _ in range(runs):
+            out = _run(["-c", PROBE.format(mod=module)], cwd).stdout.split()
+            secs.append(float(out[0]))
+            rss.append(int(out[1]))
+        trace = _run(["-X", "importtime", "-c", f"import {module}"], cwd).stderr
+    return secs, rss, trace
+
+
+def slowest(trace: str, top: int):
+    rows = []
+    for line in trace.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if m:
+            rows.append((int(m.group(2)), m.group(4)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark module import time")
+    p.add_argument("--module", default="download")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--top", type=int, default=10)
+    args = p.parse_args()
+
+    secs, rss, trace = time_import(args.module, args.runs)
+    print(f"import {args.module}: median {statistics.median(secs) * 1000:.1f} ms "
+          f"(min {min(secs) * 1000:.1f}, max {max(secs) * 1000:.1f}) over {args.runs} runs")
+    print(f"peak RSS: {max(rss) / 1024:.1f} MB")
+    print("slowest imports (cumulative):")
+    for us, name in slowest(trace, args.top):
+        print(f"  {us / 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# benchmarks/row_parser_bench.py
+#
+# Micro-benchmark for row_parser.parse_row over a corpus of recorded search
+# rows, next to the previous per-row cost (BeautifulSoup for the pdf link,
+# then lxml with one formatted XPath per detail label).
+#
+# --corpus takes saved search responses (JSON with reportrow.aaData), or a
+# directory of metadata JSONs carrying raw_html. Without one, a synthetic
+# 1000-row page is used.
+#
+#   python benchmarks/row_parser_bench.py --corpus ecourts-data --repeat 5
+
+import argparse
+import json
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import lxml.html as LH  # noqa: E402
+
+from row_parser import parse_row  # noqa: E402
+
+SAMPLE_ROW = (
+    "<button type='button' role='link' class='btn btn-link p-0' "
+    "onclick=\"javascript:open_pdf('1','2024-01-05','court/cnrorders/hc/orders/"
+    "HCBM010012342024_{i}_2024-01-05.pdf#page=&search=+&toolbar=0','')\">"
+    "WP/1234/2024 of Applicant {i} vs State</button><br>"
+    "Order on interim application {i}<br>"
+    "<strong>Judge : HON'BLE JUSTICE A B C</strong><br>"
+    "<strong class='caseDetailsTD'>"
+    "<span style='color:#212F3D'> CNR :</span><font> HCBM01001234{i:04d}</font>"
+    "<span style='color:#212F3D'> | Date of registration :</span><font> 02-01-2024</font>"
+    "<span style='color:#212F3D'> | Decision Date :</span><font> 05-01-2024</font>"
+    "<span style='color:#212F3D'> | Disposal Nature :</span><font> DISPOSED OFF</font>"
+    "<span style='color:#212F3D'> | Court : Principal Bench</span></strong>"
+)
+
+
+def load_corpus(path):
+    if path is None:
+        return [SAMPLE_ROW.format(i=i) for i in range(1000)]
+    path = Path(path)
+    files = sorted(path.glob("**/*.json")) if path.is_dir() else [path]
+    rows = []
+    for f in files:
+        try:
+            data = json.loads(f.read_text())
+        except (OSError, ValueError):
+            continue
+        if not isinstance(data, dict):
+            continue
+        if data.get("raw_html"):
+            rows.append(data["raw_html"])
+        for row in data.get("reportrow", {}).get("aaData", []):
+            rows.append(row[1])
+    return rows
+
+
+def legacy_parse(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    btn = soup.find("button", onclick=True)
+    frag = None
+    if btn:
+        m = re.search(r"open_pdf\('.*?','.*?','(.*?)'\)", btn["onclick"])
+        frag = m.group(1).split("#")[0] if m else None
+
+    tree = LH.fromstring(html)
+    out = {"pdf_link": frag,
+           "title": "".join(tree.xpath("//button//text()")).strip(),
+           "judge": ""}
+    for s in tree.xpath("//strong/text()"):
+        if "Judge" in s or "Hon'ble" in s:
+            out["judge"] = s.split(":", 1)[-1].strip()
+            break
+    cd = tree.xpath('//strong[@class="caseDetailsTD"]')
+    if cd:
+        for label in ("CNR", "Date of registration", "Decision Date", "Disposal Nature"):
+            r = cd[0].xpath(f'.//span[contains(text(), "{label}")]/following-sibling::font/text()')
+            out[label] = r[0].strip() if r else ""
+    return out
+
+
+def bench(fn, rows, repeat):
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for html in rows:
+            fn(html)
+        times.append(time.perf_counter() - t)
+    return statistics.median(times)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark search-row parsing")
+    p.add_argument("--corpus", help="Saved search responses or a metadata tree")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--limit", type=int, default=0, help="Use at most this many rows")
+    args = p.parse_args()
+
+    rows = load_corpus(args.corpus)
+    if args.limit:
+        rows = rows[:args.limit]
+    if not rows:
+        sys.exit("No rows found in corpus")
+    print(f"{len(rows)} rows, median of {args.repeat} runs")
+
+    parsers = [("parse_row", parse_row)]
+    try:
+        import bs4  # noqa: F401
+        parsers.append(("legacy (bs4 + lxml)", legacy_parse))
+    except ImportError:
+        print("bs4 not installed; skipping the legacy parser")
+
+    for name, fn in parsers:
+        secs = bench(fn, rows, args.repeat)
+        print(f"  {name:20s} {secs / len(rows) * 1e6:8.1f} µs/row  "
+              f"{len(rows) / secs:10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# captcha.py
+#
+# Shared captcha solver. One EasyOCR model is loaded per process (on first
+# use — importing this module doesn't pull in torch/OpenCV) and fed by a
+# single inference thread: concurrent solve() calls from any number of worker
+# threads are queued, decoded in memory and recognised together in one
+# readtext_batched call instead of contending for the model one by one.
+
+import logging
+import queue
+import re
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# The portal's captchas are small arithmetic problems ("12 + 7").
+ALLOWLIST = "0123456789+-*/xX×÷"
+
+
+def solve_math(expr: str) -> str:
+    expr = expr.replace("×", "*").replace("X", "*").replace("x", "*").replace("÷", "/")
+    for op in "+-*/":
+        if op in expr:
+            a, b = expr.split(op)
+            return str(int(a) + int(b) if op == "+" else
+                       int(a) - int(b) if op == "-" else
+                       int(a) * int(b) if op == "*" else
+                       int(a) // int(b))
+    raise ValueError("Bad captcha")
+
+
+def preprocess(content: bytes) -> "np.ndarray":
+    """Decode PNG bytes to an upscaled, binarised grayscale array."""
+    import cv2
+    import numpy as np
+
+    img = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError("Undecodable captcha image")
+    img = cv2.resize(img, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+    _, img = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return img
+
+
+class _Request:
+    def __init__(self, image: "np.ndarray"):
+        self.image = image
+        self.text = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class CaptchaSolver:
+    def __init__(self, max_batch: int = 16, max_wait: float = 0.02, gpu: bool = False):
+        """
+        `max_batch` caps images per inference call; `max_wait` is how long (s)
+        the first queued image waits for company before the batch is run.
+        """
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.gpu = gpu
+        self.reader = None
+        self._queue = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """Load the model and start the inference thread (idempotent)."""
+        with self._lock:
+            if self._started:
+                return
+            import easyocr
+            self.reader = easyocr.Reader(["en"], gpu=self.gpu)
+            threading.Thread(target=self._loop, name="captcha-ocr", daemon=True).start()
+            self._started = True
+
+    def read(self, content: bytes) -> str:
+        """Return the recognised text of a captcha image (may be empty)."""
+        self.warm()
+        req = _Request(preprocess(content))
+        self._queue.put(req)
+        req.done.wait()
+        if req.error:
+            raise req.error
+        return req.text
+
+    def solve(self, content: bytes) -> Optional[str]:
+        """Return the captcha answer, or None if the image couldn't be read."""
+        txt = self.read(content)
+        if not re.search(r"[0-9\+\-\*\/]", txt):
+            return None
+        return solve_math(txt)
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.max_wait))
+            except queue.Empty:
+                pass
+            try:
+                self._recognise(batch)
+            except Exception as e:
+                logger.error(f"Captcha OCR failed: {e}")
+                for req in batch:
+                    req.error = e
+            for req in batch:
+                req.done.set()
+
+    def _recognise(self, batch: list[_Request]):
+        # readtext_batched needs equally sized inputs; captchas normally are.
+        by_shape = {}
+        for req in batch:
+            by_shape.setdefault(req.image.shape, []).append(req)
+        for (h, w), reqs in by_shape.items():
+            if len(reqs) == 1:
+                results = [self.reader.readtext(reqs[0].image, allowlist=ALLOWLIST)]
+            else:
+                results = self.reader.readtext_batched(
+                    [r.image for r in reqs], n_width=w, n_height=h,
+                    batch_size=len(reqs), allowlist=ALLOWLIST)
+            for req, res in zip(reqs, results):
+                # Join detections left to right: "12", "+", "7" → "12+7".
+                res = sorted(res, key=lambda d: d[0][0][0])
+                req.text = "".join(d[1] for d in res).replace(" ", "")
+
+
+_solver = None
+_solver_lock = threading.Lock()
+
+
+def get_solver() -> CaptchaSolver:
+    """Process-wide solver; the model itself loads on the first solve()."""
+    global _solver
+    with _solver_lock:
+        if _solver is None:
+            _solver = CaptchaSolver()
+        return _solver
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# cli.py
+#
+# One entry point for the scraper:
+#
+#   backfill     every window not yet done in [--start_date, --end_date]
+#   incremental  each court's recent windows (re-searched: the portal publishes
+#                judgments days after their date), plus any gap since the
+#                court's last finished window
+#   reprocess    re-search windows already done, or only what failed.db holds
+#   stats        corpus statistics (corpus_stats.py)
+#   daemon       `incremental`, forever, in one warm process
+#
+# Every command resolves where a court stands from progress.db (the legacy
+# track.json / progress.json are imported into it once), and takes the same
+# engine, storage and metrics options as download.py.
+#
+# The daemon opens its run context once: the progress store, index, GCS
+# client, session pool, metrics endpoint and captcha model stay loaded
+# between polls instead of being rebuilt by every cron tick. Each court is
+# polled every --interval seconds, and the courts' polls are spread evenly
+# across that interval, so the portal sees a steady trickle of searches
+# rather than every court at once. Between polls nothing is left half-done
+# or kept warm for nothing: open segments (--storage segments) are sealed and
+# uploaded after every poll, and the session pool stops renewing sessions
+# (each renewal is a captcha) until the next poll asks for one.
+#
+#   python cli.py backfill --court_codes 9~13,27~1 --start_date 2020-01-01
+#   python cli.py daemon --court_codes all --interval 21600 --metrics_port 9100
+#   python cli.py stats --json
+
+import argparse
+import heapq
+import logging
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from captcha import get_solver
+from download import (
+    FAILED_DB, Shutdown, add_run_arguments, execute, generate_tasks, get_court_codes,
+    graceful_shutdown, open_context, open_progress_store, run, run_options, start_services,
+)
+from gcs_utils import get_bucket
+from progress_store import ProgressStore
+
+logger = logging.getLogger(__name__)
+
+FMT = "%Y-%m-%d"
+LOOKBACK_DAYS = 7
+POLL_INTERVAL = 6 * 3600
+
+
+def court_list(arg: Optional[str]) -> List[str]:
+    """Codes from a comma-separated --court_codes; "all" (or none) means court-codes.json."""
+    all_codes = get_court_codes()
+    if not arg or arg == "all":
+        return sorted(all_codes)
+    codes = [c.strip() for c in arg.split(",") if c.strip()]
+    unknown = [c for c in codes if c not in all_codes]
+    if unknown:
+        raise SystemExit(f"Unknown court codes: {', '.join(unknown)}")
+    return codes
+
+
+def incremental_start(progress: ProgressStore, code: str, lookback: int,
+                      today: Optional[datetime] = None) -> str:
+    """
+    First day an incremental pass over `code` covers: `lookback` days back,
+    or earlier if the court's finished windows stop before that.
+    """
+    today = today or datetime.now()
+    recent = (today - timedelta(days=lookback - 1)).strftime(FMT)
+    done = progress.completed(code)
+    if not done:
+        return recent
+    after_last = (datetime.strptime(done[-1][1], FMT) + timedelta(days=1)).strftime(FMT)
+    return min(after_last, recent)
+
+
+# ── Commands ──────────────────────────────────────────────────────────────────
+
+def cmd_backfill(args):
+    if not (args.court_codes or args.queue_join):
+        raise SystemExit("backfill: --court_codes is required (or 'all')")
+    codes = court_list(args.court_codes) if args.court_codes else []
+    run(codes, args.start_date, args.end_date, args.day_step,
+        plan_target=args.plan_target, plan_span=args.plan_span, queue=args.queue,
+        queue_join=args.queue_join, lease_seconds=args.lease_seconds, **run_options(args))
+
+
+def cmd_incremental(args):
+    codes = court_list(args.court_codes)
+    today = datetime.now()
+    progress = open_progress_store()
+    by_start = defaultdict(list)
+    for code in codes:
+        by_start[incremental_start(progress, code, args.lookback, today)].append(code)
+    progress.close()
+    for start, group in sorted(by_start.items()):
+        logger.info(f"▶ Incremental {start} → today for {len(group)} courts")
+        run(group, start, today.strftime(FMT), args.day_step, rescan=True, **run_options(args))
+
+
+def cmd_reprocess(args):
+    if not (args.failed or args.start_date):
+        raise SystemExit("reprocess: give --start_date (and --end_date), or --failed")
+    run(court_list(args.court_codes), args.start_date, args.end_date, args.day_step,
+        rescan=True, retry_failed=args.failed, **run_options(args))
+
+
+def cmd_daemon(args):
+    Daemon(court_list(args.court_codes), args.interval, args.lookback, args).run()
+
+
+class Daemon:
+    """Incremental polling of `codes` from one process that keeps its context open."""
+
+    def __init__(self, codes: List[str], interval: float, lookback: int,
+                 args: argparse.Namespace):
+        self.codes = codes
+        self.interval = interval
+        self.lookback = lookback
+        self.day_step = args.day_step
+        self.opts = run_options(args)
+        self.ctx = None
+
+    def _open(self):
+        opts = dict(self.opts)
+        services = {k: opts.pop(k) for k in ("engine", "stage_workers", "queue_size",
+                                             "session_pool")}
+        del opts["per_court_tasks"], opts["order"]  # execute() takes these, per poll
+        self.ctx = open_context(**opts)
+        start_services(self.ctx, use_index=opts["use_index"], **services)
+        # Load the slow pieces now, not on the first poll's first captcha or upload.
+        get_solver().warm()
+        if opts["upload"]:
+            get_bucket()
+
+    def schedule(self, now: float) -> list:
+        """(due, code) heap with the courts' first polls spread over one interval."""
+        step = self.interval / max(1, len(self.codes))
+        heap = [(now + i * step, code) for i, code in enumerate(self.codes)]
+        heapq.heapify(heap)
+        return heap
+
+    def poll(self, code: str):
+        today = datetime.now()
+        start = incremental_start(self.ctx.progress, code, self.lookback, today)
+        tasks = list(generate_tasks([code], start, today.strftime(FMT), self.day_step))
+        logger.info(f"🔄 Polling {code}: {len(tasks)} windows since {start}")
+        try:
+            execute(tasks, self.ctx, self.opts["workers"], self.opts["engine"],
+                    self.opts["max_in_flight"], self.opts["per_court_in_flight"],
+                    per_court_tasks=self.opts["per_court_tasks"], order=self.opts["order"])
+        finally:
+            self._idle()
+
+    def _idle(self):
+        """Flush what the poll wrote and let the session pool go quiet until the next one."""
+        if self.ctx.segments:
+            self.ctx.segments.seal_open()  # on_seal queues the uploads
+        if self.ctx.session_pool:
+            self.ctx.session_pool.pause()
+
+    def run(self):
+        self._open()
+        heap = self.schedule(time.time())
+        logger.info(f"🕰 Daemon polling {len(self.codes)} courts every {self.interval:.0f}s "
+                    f"({self.interval / max(1, len(self.codes)):.0f}s apart)")
+        try:
+            with graceful_shutdown(self.ctx):
+                self._loop(heap)
+        finally:
+            self.ctx.close()
+
+    def _loop(self, heap: list):
+        while True:
+            due, code = heap[0]
+            if self.ctx.stopping.wait(max(0.0, due - time.time())):
+                raise Shutdown()
+            heapq.heappop(heap)
+            started = time.monotonic()
+            try:
+                self.poll(code)
+            except Exception as e:
+                # Failed windows are in failed.db, and recent ones come round again next poll.
+                logger.exception(f"❌ Poll of {code} failed: {e}")
+            else:
+                logger.info(f"✅ Polled {code} in {time.monotonic() - started:.0f}s")
+            # Skip polls missed while an earlier one overran, keeping the stagger.
+            now = time.time()
+            while due <= now:
+                due += self.interval
+            heapq.heappush(heap, (due, code))
+
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="e-Court judgments scraper")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    def scraping(name: str, help: str, codes_help: str) -> argparse.ArgumentParser:
+        s = sub.add_parser(name, help=help, description=help)
+        s.add_argument("--court_codes", default=None, help=codes_help)
+        s.add_argument("--day_step", type=int, default=1, help="Days per window")
+        add_run_arguments(s)
+        return s
+
+    s = scraping("backfill", "Download every window not yet done",
+                 "Comma-separated codes, or 'all' (required unless --queue_join)")
+    s.add_argument("--start_date", default=None,
+                   help="YYYY-MM-DD start (default: START_DATE in download.py)")
+    s.add_argument("--end_date", default=None, help="YYYY-MM-DD end (default: today)")
+    s.add_argument("--plan_target", type=int, default=0,
+                   help="Split/merge windows to about this many judgments per task")
+    s.add_argument("--plan_span", type=int, default=31,
+                   help="With --plan_target: days per initial probe window")
+    s.add_argument("--queue", type=Path, default=None,
+                   help="Shared work-queue file to enqueue into and drain with other nodes")
+    s.add_argument("--queue_join", action="store_true",
+                   help="With --queue: just work on tasks already queued")
+    s.add_argument("--lease_seconds", type=float, default=300,
+                   help="With --queue: lease length without a heartbeat")
+    s.set_defaults(func=cmd_backfill)
+
+    s = scraping("incremental", "Re-search each court's recent windows once",
+                 "Comma-separated codes, or 'all' (default)")
+    s.add_argument("--lookback", type=int, default=LOOKBACK_DAYS,
+                   help="Days back from today to re-search for late-published judgments")
+    s.set_defaults(func=cmd_incremental, order="recent")
+
+    s = scraping("reprocess", "Re-search windows already done, or only failed ones",
+                 "Comma-separated codes, or 'all' (default)")
+    s.add_argument("--start_date", default=None, help="YYYY-MM-DD start")
+    s.add_argument("--end_date", default=None, help="YYYY-MM-DD end (default: today)")
+    s.add_argument("--failed", action="store_true",
+                   help=f"Only redo what {FAILED_DB} recorded (within the dates, if given)")
+    s.set_defaults(func=cmd_reprocess)
+
+    s = scraping("daemon", "Poll courts for new judgments from one long-running process",
+                 "Comma-separated codes, or 'all' (default)")
+    s.add_argument("--interval", type=float, default=POLL_INTERVAL,
+                   help="Seconds between two polls of the same court; courts are staggered "
+                        "evenly across it")
+    s.add_argument("--lookback", type=int, default=LOOKBACK_DAYS,
+                   help="Days back from today each poll re-searches")
+    # Warm sessions are most of what the daemon keeps loaded.
+    s.set_defaults(func=cmd_daemon, session_pool=2, order="recent")
+
+    # Listed for --help only; main() hands `stats ...` to corpus_stats.py as is.
+    sub.add_parser("stats", add_help=False,
+                   help="Corpus statistics (options: see `cli.py stats --help`)")
+    return p
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["stats"]:
+        import corpus_stats
+        return corpus_stats.main(argv[1:])
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+    except Shutdown:
+        logger.warning("✋ Stopped; rerun to resume from the checkpoints in progress.db")
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
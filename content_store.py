@@ -0,0 +1,51 @@
+# content_store.py
+#
+# Content-addressed PDF storage (`download.py --dedupe`). The same judgment
+# PDF can be listed under several courts, windows or re-listings; with
+# --dedupe each distinct PDF is kept once, named by its sha256:
+#
+#   ecourts-data/cas/<aa>/<bb>/<sha256>.pdf        local copy
+#   gs://<bucket>/pdf/sha256/<aa>/<sha256>.pdf     GCS copy
+#
+# PDFs stream (and are hashed, see pdf_stream.py) into a staging file, which
+# adopt() then renames to its content path, or drops if that content is
+# already there. Per-judgment metadata points at the hash.
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Tuple
+
+CAS_DIR = "cas"
+STAGING_DIR = ".staging"
+GCS_PREFIX = "pdf/sha256"
+
+
+class ContentStore:
+    def __init__(self, root: Path):
+        self.root = Path(root) / CAS_DIR
+        self.staging = self.root / STAGING_DIR
+        self.staging.mkdir(parents=True, exist_ok=True, mode=0o755)
+
+    def staging_path(self, frag: str) -> Path:
+        """Where a PDF streams to before its hash is known."""
+        return self.staging / f"{hashlib.sha1(frag.encode()).hexdigest()}.pdf"
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}.pdf"
+
+    @staticmethod
+    def gcs_key(sha256: str) -> str:
+        return f"{GCS_PREFIX}/{sha256[:2]}/{sha256}.pdf"
+
+    def adopt(self, staged: Path, sha256: str) -> Tuple[Path, bool]:
+        """Move a staged PDF to its content path; (path, False) if the content was already stored."""
+        dest = self.path(sha256)
+        if dest.exists():
+            staged.unlink(missing_ok=True)
+            return dest, False
+        dest.parent.mkdir(parents=True, exist_ok=True, mode=0o755)
+        # Two rows racing on the same new content both land identical bytes.
+        os.replace(staged, dest)
+        dest.chmod(0o644)
+        return dest, True
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# corpus_stats.py
+#
+# Counts, byte totals and size histograms per court, year and file type for
+# a downloaded corpus, plus PDFs without metadata and metadata without PDFs.
+# Metadata whose PDF lives only in GCS, or that records the PDF as never
+# downloaded, is listed separately rather than as missing.
+#
+# Storage layouts: per-judgment files (PDF next to its JSON); --dedupe, where
+# PDFs sit once under cas/ and each JSON names its PDF in `pdfpath`; and
+# --storage segments, where judgments are counted record by record from the
+# segments' .jsonl files.
+#
+# Two sources:
+#   scan   walk the tree with os.scandir from a thread pool (stat calls
+#          overlap, which is what matters on network disks). With
+#          --incremental, each directory's summary is cached by its mtime,
+#          and unchanged directories are not listed again. A directory's
+#          mtime moves whenever a file is created, renamed in or deleted,
+#          which covers how the scraper writes; segment directories are
+#          always re-read, as their files grow in place.
+#   index  read ecourts-data/index.sqlite (no file system walk at all;
+#          metadata JSON sizes are not recorded there).
+#
+#   python corpus_stats.py --root ecourts-data --incremental
+#   python corpus_stats.py --source index --json > stats.json
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from content_store import CAS_DIR
+from segment_store import SEGMENT_DIR
+
+CACHE_NAME = ".corpus_stats.sqlite"
+# Histogram bucket upper bounds (bytes); the last bucket is open-ended.
+HIST_BOUNDS = [1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20]
+HIST_LABELS = ["<1K", "<4K", "<16K", "<64K", "<256K", "<1M", "<4M", "<16M", ">=16M"]
+UNKNOWN = "unknown"
+# Names the scraper writes transiently or for its own bookkeeping.
+SKIP_SUFFIXES = (".part", ".tmp", "-wal", "-shm", "-journal")
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path     TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    subdirs  TEXT NOT NULL,
+    summary  TEXT NOT NULL
+);
+"""
+
+# Report lists of judgments whose PDF or metadata isn't where it's expected.
+LISTS = ("missing_pdf", "missing_metadata", "gcs_only", "not_downloaded")
+
+_YEAR = re.compile(r"^(19|20)\d\d$")
+
+
+def bucket(size: int) -> int:
+    for i, bound in enumerate(HIST_BOUNDS):
+        if size < bound:
+            return i
+    return len(HIST_BOUNDS)
+
+
+def file_type(name: str) -> str:
+    suffix = os.path.splitext(name)[1].lower().lstrip(".")
+    return suffix or "other"
+
+
+def classify(parts: List[str]) -> Tuple[str, str]:
+    """(court, year) for a directory, from the layouts the scraper writes."""
+    if not parts:
+        return UNKNOWN, UNKNOWN
+    if parts[0] == "segments":          # segments/<code>/<year>/
+        parts = parts[1:]
+    court = parts[0] if parts else UNKNOWN
+    year = next((p for p in parts[1:] if _YEAR.match(p)), UNKNOWN)
+    return court, year
+
+
+# ── Scanning ──────────────────────────────────────────────────────────────────
+
+def _add(types: Dict[str, list], ftype: str, size: int):
+    t = types.setdefault(ftype, [0, 0, [0] * len(HIST_LABELS)])
+    t[0] += 1
+    t[1] += size
+    t[2][bucket(size)] += 1
+
+
+def _count_segment(jsonl: str, types: Dict[str, list]):
+    """Count a segment's judgments: one metadata line each, plus its packed PDF."""
+    with open(jsonl, "rb") as f:
+        for line in f:
+            try:
+                meta = json.loads(line)
+            except ValueError:
+                continue  # torn last line of a segment still being written
+            _add(types, "json", len(line))
+            if meta.get("length") is not None:
+                _add(types, "pdf", meta["length"])
+
+
+def _pdf_status(meta_path: str) -> Tuple[str, Optional[str]]:
+    """
+    Why a metadata JSON has no PDF beside it: ("cas", <content file name>),
+    ("gcs_only", None), ("not_downloaded", None) or ("missing_pdf", None).
+    """
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return "missing_pdf", None
+    if meta.get("pdfpath"):
+        return "cas", os.path.basename(meta["pdfpath"])
+    if meta.get("downloaded") is False:
+        return "not_downloaded", None
+    if meta.get("pdfpathgcs"):
+        return "gcs_only", None
+    return "missing_pdf", None
+
+
+def dir_kind(rel: str) -> str:
+    top = Path(rel).parts[:1]
+    return "cas" if top == (CAS_DIR,) else "segments" if top == (SEGMENT_DIR,) else "files"
+
+
+def summarize_dir(path: str, kind: str = "files") -> Tuple[List[str], Dict]:
+    """
+    List one directory: its subdirectories and a summary of its files. In a
+    "cas" directory PDFs are matched to metadata by name later, not by stem
+    here; a "segments" directory is summarised from its .jsonl files.
+    """
+    subdirs, types, stems = [], {}, {"pdf": set(), "json": set()}
+    with os.scandir(path) as it:
+        for e in it:
+            if e.name.startswith("."):
+                continue
+            if e.is_dir(follow_symlinks=False):
+                subdirs.append(e.name)
+                continue
+            if not e.is_file(follow_symlinks=False) or e.name.endswith(SKIP_SUFFIXES):
+                continue
+            ftype = file_type(e.name)
+            if kind == "segments" and ftype in ("jsonl", "pdfs"):
+                if ftype == "jsonl":
+                    _count_segment(e.path, types)
+                continue
+            _add(types, ftype, e.stat(follow_symlinks=False).st_size)
+            if ftype in stems:
+                stems[ftype].add(os.path.splitext(e.name)[0])
+    summary = {"types": types, "volatile": kind == "segments"}
+    if kind == "cas":
+        summary["cas_files"] = sorted(s + ".pdf" for s in stems["pdf"])
+        return subdirs, summary
+    summary["missing_metadata"] = sorted(stems["pdf"] - stems["json"])
+    summary["cas_refs"] = {}
+    for stem in sorted(stems["json"] - stems["pdf"]):
+        status, name = _pdf_status(os.path.join(path, stem + ".json"))
+        if status == "cas":
+            summary["cas_refs"][stem] = name
+        else:
+            summary.setdefault(status, []).append(stem)
+    return subdirs, summary
+
+
+class ScanCache:
+    def __init__(self, path: Path):
+        self._db = sqlite3.connect(str(path))
+        self._db.executescript(CACHE_SCHEMA)
+
+    def load(self) -> Dict[str, Tuple[int, List[str], Dict]]:
+        rows = self._db.execute("SELECT path, mtime_ns, subdirs, summary FROM dirs")
+        return {p: (m, json.loads(s), json.loads(summ)) for p, m, s, summ in rows}
+
+    def save(self, entries: Dict[str, Tuple[int, List[str], Dict]], changed: set):
+        with self._db:
+            known = {r[0] for r in self._db.execute("SELECT path FROM dirs")}
+            self._db.executemany("DELETE FROM dirs WHERE path = ?",
+                                 [(p,) for p in known - set(entries)])
+            self._db.executemany(
+                "INSERT OR REPLACE INTO dirs (path, mtime_ns, subdirs, summary) VALUES (?, ?, ?, ?)",
+                [(p, *entries[p][:1], json.dumps(entries[p][1]), json.dumps(entries[p][2]))
+                 for p in changed])
+
+    def close(self):
+        self._db.close()
+
+
+def walk(root: Path, workers: int = 16, cache: Optional[ScanCache] = None):
+    """
+    Parallel walk of `root`; returns ({relative dir: (mtime_ns, subdirs,
+    summary)}, number of directories actually listed).
+    """
+    cached = cache.load() if cache else {}
+    entries, changed = {}, set()
+
+    def visit(rel: str):
+        path = os.path.join(root, rel) if rel else str(root)
+        mtime = os.stat(path).st_mtime_ns
+        hit = cached.get(rel)
+        if hit is not None and hit[0] == mtime and not hit[2].get("volatile"):
+            return rel, hit, False
+        subdirs, summary = summarize_dir(path, dir_kind(rel))
+        return rel, (mtime, subdirs, summary), True
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(visit, "")}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                try:
+                    rel, entry, listed = f.result()
+                except FileNotFoundError:
+                    continue  # removed while we were walking
+                entries[rel] = entry
+                if listed:
+                    changed.add(rel)
+                for name in entry[1]:
+                    pending.add(pool.submit(visit, os.path.join(rel, name)))
+    if cache:
+        cache.save(entries, changed)
+    return entries, len(changed)
+
+
+# ── Report ────────────────────────────────────────────────────────────────────
+
+class Report:
+    def __init__(self, source: str, root: Path):
+        self.source = source
+        self.root = str(root)
+        # court → year → type → [count, bytes, hist]
+        self.groups: Dict[str, Dict[str, Dict[str, list]]] = {}
+        self.missing_pdf: List[str] = []
+        self.missing_metadata: List[str] = []
+        self.gcs_only: List[str] = []        # metadata whose PDF was streamed to GCS only
+        self.not_downloaded: List[str] = []  # metadata recording that the PDF never came
+        self.extra: Dict = {}
+
+    def add(self, court: str, year: str, ftype: str, count: int, nbytes: Optional[int],
+            hist: List[int]):
+        """`nbytes` None: size unknown (the index doesn't record metadata sizes)."""
+        self._merge(self.groups.setdefault(court, {}).setdefault(year, {}),
+                    {ftype: [count, nbytes, hist]})
+
+    @staticmethod
+    def _merge(into: Dict[str, list], types: Dict[str, list]):
+        for ftype, (n, b, h) in types.items():
+            t = into.setdefault(ftype, [0, 0, [0] * len(HIST_LABELS)])
+            t[0] += n
+            t[1] = None if b is None or t[1] is None else t[1] + b
+            t[2] = [x + y for x, y in zip(t[2], h)]
+
+    @staticmethod
+    def _render(types: Dict[str, list]) -> Dict:
+        return {ftype: {"count": n, "bytes": b,
+                        "avg_bytes": round(b / n) if n and b is not None else None,
+                        "histogram": dict(zip(HIST_LABELS, h))}
+                for ftype, (n, b, h) in sorted(types.items())}
+
+    def as_dict(self) -> Dict:
+        courts, totals = {}, {}
+        for court, years in sorted(self.groups.items()):
+            court_totals = {}
+            for types in years.values():
+                self._merge(court_totals, types)
+            self._merge(totals, court_totals)
+            courts[court] = {"totals": self._render(court_totals),
+                             "years": {y: self._render(t) for y, t in sorted(years.items())}}
+        return {"source": self.source, "root": self.root, "generated": time.time(),
+                **self.extra, "totals": self._render(totals), "courts": courts,
+                **{key: sorted(getattr(self, key)) for key in LISTS}}
+
+
+def scan_stats(root: Path, workers: int = 16, incremental: bool = False) -> Report:
+    root = Path(root)
+    started = time.perf_counter()
+    cache = ScanCache(root / CACHE_NAME) if incremental else None
+    try:
+        entries, listed = walk(root, workers, cache)
+    finally:
+        if cache:
+            cache.close()
+    report = Report("scan", root)
+    cas_files, cas_refs = {}, {}
+    for rel, (_, _, summary) in entries.items():
+        court, year = classify(Path(rel).parts)
+        for ftype, (n, b, h) in summary["types"].items():
+            report.add(court, year, ftype, n, b, h)
+        for key in ("missing_pdf", "gcs_only", "not_downloaded"):
+            getattr(report, key).extend(os.path.join(rel, s + ".json")
+                                        for s in summary.get(key, []))
+        report.missing_metadata += [os.path.join(rel, s + ".pdf")
+                                    for s in summary.get("missing_metadata", [])]
+        cas_files.update((name, os.path.join(rel, name)) for name in summary.get("cas_files", []))
+        cas_refs.update((os.path.join(rel, s + ".json"), name)
+                        for s, name in summary.get("cas_refs", {}).items())
+    # --dedupe: metadata and PDFs are matched through the content name instead.
+    referenced = set(cas_refs.values())
+    report.missing_pdf += [meta for meta, name in cas_refs.items() if name not in cas_files]
+    report.missing_metadata += [path for name, path in cas_files.items() if name not in referenced]
+    report.extra = {"dirs": len(entries), "dirs_listed": listed,
+                    "elapsed_s": round(time.perf_counter() - started, 3)}
+    return report
+
+
+def index_stats(index_path: Path) -> Report:
+    started = time.perf_counter()
+    db = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+    report = Report("index", index_path)
+    empty = [0] * len(HIST_LABELS)
+    try:
+        rows = db.execute("SELECT pdf_link, court_code, local_path, meta_path, size, gcs_key "
+                          "FROM judgments")
+        for frag, court, local_path, meta_path, size, gcs_key in rows:
+            # The metadata path carries the year even when the PDF is packed or deduplicated.
+            _, year = classify(Path(meta_path or local_path or "").parts)
+            court = court or UNKNOWN
+            if local_path or gcs_key:
+                hist = list(empty)
+                hist[bucket(size or 0)] += 1
+                report.add(court, year, "pdf", 1, size or 0, hist)
+                if not local_path and meta_path:
+                    report.gcs_only.append(meta_path)
+            elif meta_path:
+                # Packed metadata without a PDF is a downloaded: false line.
+                status = ("not_downloaded" if meta_path.endswith(".jsonl")
+                          else _pdf_status(meta_path)[0])
+                getattr(report, "missing_pdf" if status == "cas" else status).append(meta_path)
+            if meta_path:
+                report.add(court, year, "json", 1, None, empty)
+            elif local_path:
+                report.missing_metadata.append(local_path)
+    finally:
+        db.close()
+    report.extra = {"elapsed_s": round(time.perf_counter() - started, 3)}
+    return report
+
+
+def print_report(d: Dict, limit: int = 20):
+    def size(b):
+        return "?" if b is None else f"{b / 1e9:.2f} GB" if b >= 1e9 else f"{b / 1e6:.1f} MB"
+
+    print(f"{d['source']} of {d['root']}"
+          + (f": {d['dirs']} dirs ({d['dirs_listed']} listed)" if "dirs" in d else "")
+          + f" in {d['elapsed_s']}s")
+    print(f"{'court':12s} {'year':8s} {'pdfs':>9s} {'pdf size':>11s} {'jsons':>9s} {'json size':>11s}")
+    for court, c in d["courts"].items():
+        for year, t in c["years"].items():
+            pdf, js = t.get("pdf", {}), t.get("json", {})
+            print(f"{court:12s} {year:8s} {pdf.get('count', 0):9d} {size(pdf.get('bytes', 0)):>11s} "
+                  f"{js.get('count', 0):9d} {size(js.get('bytes', 0)):>11s}")
+    for ftype, t in d["totals"].items():
+        avg = "?" if t["avg_bytes"] is None else f"{t['avg_bytes'] / 1024:.1f} KiB"
+        print(f"\n{ftype}: {t['count']} files, {size(t['bytes'])}, avg {avg}")
+        for label, n in t["histogram"].items():
+            if n:
+                print(f"  {label:>6s} {n:9d}")
+    for key in LISTS:
+        items = d[key]
+        print(f"\n{key.replace('_', ' ')}: {len(items)}")
+        for p in items[:limit]:
+            print(f"  {p}")
+        if len(items) > limit:
+            print(f"  … {len(items) - limit} more (see --json)")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Corpus statistics per court, year and file type")
+    p.add_argument("--root", default="ecourts-data", help="Tree to walk")
+    p.add_argument("--source", choices=["auto", "scan", "index"], default="auto",
+                   help="auto: the download index if there is one, else a scan")
+    p.add_argument("--index", default=None, help="Index path (default: <root>/index.sqlite)")
+    p.add_argument("--workers", type=int, default=16, help="Scan threads")
+    p.add_argument("--incremental", action="store_true",
+                   help="Re-list only directories whose mtime changed since the last scan "
+                        f"(cache in <root>/{CACHE_NAME})")
+    p.add_argument("--json", action="store_true", help="Print the report as JSON")
+    p.add_argument("--out", type=Path, default=None, help="Also write the JSON report here")
+    args = p.parse_args(argv)
+
+    root = Path(args.root)
+    index = Path(args.index) if args.index else root / "index.sqlite"
+    if args.source == "index" or (args.source == "auto" and index.exists()):
+        report = index_stats(index)
+    elif root.is_dir():
+        report = scan_stats(root, args.workers, args.incremental)
+    else:
+        sys.exit(f"No such directory: {root}")
+    d = report.as_dict()
+    if args.out:
+        args.out.write_text(json.dumps(d, indent=2))
+    if args.json:
+        json.dump(d, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(d)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# dead_letter.py
+#
+# Persistent record of what a run gave up on: single rows (court, window,
+# pdf_link), rows that couldn't be parsed (pdf_link '#row<offset>') and whole
+# windows (pdf_link ''), with the last error and how often they failed.
+# `download.py --retry-failed` re-searches only those windows and fetches
+# only the recorded rows (all of a window with an unparsed row); successes
+# are removed.
+# SQLite in WAL mode behind one shared, locked connection.
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS failures (
+    court_code   TEXT NOT NULL,
+    frm          TEXT NOT NULL,
+    to_date      TEXT NOT NULL,
+    frag         TEXT NOT NULL,
+    error        TEXT,
+    attempts     INTEGER NOT NULL,
+    first_failed REAL NOT NULL,
+    last_failed  REAL NOT NULL,
+    PRIMARY KEY (court_code, frm, to_date, frag)
+);
+"""
+
+WINDOW = ""  # frag value for a failed window (task) rather than a row
+UNPARSED = "#row"  # frag prefix, plus listing offset, for a row without a readable pdf_link
+
+
+class Failure:
+    def __init__(self, court_code: str, frm: str, to: str, frag: str, error: str, attempts: int):
+        self.court_code = court_code
+        self.frm = frm
+        self.to = to
+        self.frag = frag
+        self.error = error
+        self.attempts = attempts
+
+
+class DeadLetterStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def record(self, court_code: str, frm: str, to: str, frag: str, error: str):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO failures (court_code, frm, to_date, frag, error, attempts, "
+                "first_failed, last_failed) VALUES (?, ?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT(court_code, frm, to_date, frag) DO UPDATE SET "
+                "error = excluded.error, attempts = attempts + 1, "
+                "last_failed = excluded.last_failed",
+                (court_code, frm, to, frag or WINDOW, error[:2000], now, now))
+
+    def resolve(self, court_code: str, frm: str, to: str, frag: str):
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM failures WHERE court_code = ? AND frm = ? AND to_date = ? "
+                "AND frag = ?", (court_code, frm, to, frag or WINDOW))
+
+    def resolve_window(self, court_code: str, frm: str, to: str, before: float):
+        """
+        Clear a window's own failure and its unparsed rows, if recorded before
+        `before`; failures recorded since (by the task now finishing) stay.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM failures WHERE court_code = ? AND frm = ? AND to_date = ? "
+                "AND (frag = ? OR substr(frag, 1, ?) = ?) AND last_failed < ?",
+                (court_code, frm, to, WINDOW, len(UNPARSED), UNPARSED, before))
+
+    def pending(self, codes: Optional[List[str]] = None, start: Optional[str] = None,
+                end: Optional[str] = None) -> List[Failure]:
+        sql = "SELECT court_code, frm, to_date, frag, error, attempts FROM failures"
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY court_code, frm, frag").fetchall()
+        return [Failure(*r) for r in rows
+                if (codes is None or r[0] in codes)
+                and (start is None or r[2] >= start) and (end is None or r[1] <= end)]
+
+    def count(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT frag = '', COUNT(*) FROM failures GROUP BY frag = ''").fetchall()
+        out = {"rows": 0, "windows": 0}
+        for is_window, n in rows:
+            out["windows" if is_window else "rows"] = n
+        return out
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -3,30 +3,50 @@ import argparse
 import json
 import logging
 import re
+import signal
 import uuid
 import urllib.parse
 import urllib3
-from tempfile import gettempdir
 from datetime import datetime, timedelta
 from pathlib import Path
 import threading
 import concurrent.futures
 import os
+import sys
+import time
+import functools
+import itertools
+import contextlib
 
 import requests
-from bs4 import BeautifulSoup
-import lxml.html as LH
-import easyocr
 
 from typing import Optional, Tuple, Dict
-from gcs_utils import upload_to_gcs
+from captcha import get_solver, solve_math
+from content_store import ContentStore
+from dead_letter import DeadLetterStore, UNPARSED, WINDOW
+from gcs_utils import GCSUploader, open_gcs_writer, gcs_public_url
+from pdf_stream import PdfSink, NotAPdf, CHUNK_SIZE
+from download_index import DownloadIndex
+import metrics
+from metrics import MetricsExporter
+from pipeline import Pipeline, Stage
+from planner import plan_windows
+from progress_store import ProgressStore
+from rate_limit import PortalLimiter
+from segment_store import Segment, SegmentStore
+from retry import API_RETRY, CAPTCHA_RETRY, TASK_RETRY, RetriesExhausted
+from row_parser import RowRecord, parse_row
+from scheduler import ORDERS, FairScheduler, interleave
+from session_pool import PortalSession, SessionPool
+from work_queue import WorkQueue
 
 # ─── Setup & Constants ─────────────────────────────────────────────────────────
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
-ROOT_URL            = "https://judgments.ecourts.gov.in"
+# Overridable to point the scraper at a stand-in (benchmarks/fake_portal.py).
+ROOT_URL            = os.environ.get("ECOURTS_ROOT_URL", "https://judgments.ecourts.gov.in").rstrip("/")
 SEARCH_URL          = f"{ROOT_URL}/pdfsearch/?p=pdf_search/home/"
 CAPTCHA_URL         = f"{ROOT_URL}/pdfsearch/vendor/securimage/securimage_show.php"
 CAPTCHA_TOKEN_URL   = f"{ROOT_URL}/pdfsearch/?p=pdf_search/checkCaptcha"
@@ -34,14 +54,18 @@ PDF_LINK_URL        = f"{ROOT_URL}/pdfsearch/?p=pdf_search/openpdfcaptcha"
 PDF_LINK_WO_CAPTCHA = f"{ROOT_URL}/pdfsearch/?p=pdf_search/openpdf"
 
 OUTPUT_DIR         = Path("ecourts-data")
-TRACK_FILE         = Path("track.json")
+TRACK_FILE         = Path("track.json")       # legacy, imported into PROGRESS_DB
+PROGRESS_FILE      = Path("progress.json")    # legacy, imported into PROGRESS_DB
+PROGRESS_DB        = Path("progress.db")
+FAILED_DB          = Path("failed.db")        # dead-letter store for --retry-failed
+INDEX_FILE         = OUTPUT_DIR / "index.sqlite"
 COURT_CODES_FILE   = Path("court-codes.json")
-CAPTCHA_TMP_DIR    = Path(gettempdir()) / "ecourts-captcha-tmp"
 CAPTCHA_FAIL_DIR   = Path("captcha-failures")
 
 START_DATE         = "2008-01-01"
 PAGE_SIZE          = 1000
 NO_CAPTCHA_BATCH   = 25
+CHECKPOINT_SECONDS = 15                       # min gap between a window's cursor writes
 
 PAYLOAD = (
     "&sEcho=1&iColumns=2&sColumns=,&iDisplayStart=0&iDisplayLength=100&mDataProp_0=0"
@@ -58,17 +82,21 @@ PAYLOAD = (
     "&citation_supl=&citation_page=&case_no1=&case_year1=&pet_res1=&fulltext_case_type1="
     "&citation_keyword=&sel_lang=&proximity=&neu_cit_year=&neu_no=&ajax_req=true"
 )
+API_HEADERS = {
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+    "Origin": ROOT_URL,
+    "Referer": ROOT_URL,
+    "User-Agent": "Mozilla/5.0",
+    "X-Requested-With": "XMLHttpRequest",
+}
 PDF_LINK_PAYLOAD = (
     "val=0&lang_flg=undefined&path=&page=&search=+&citation_year=&fcourt_type=2"
     "&file_type=undefined&nc_display=undefined&ajax_req=true"
 )
 
-_track_lock = threading.Lock()
-reader = easyocr.Reader(["en"])
-
 # Create directories with proper permissions
 try:
-    CAPTCHA_TMP_DIR.mkdir(parents=True, exist_ok=True, mode=0o755)
     CAPTCHA_FAIL_DIR.mkdir(parents=True, exist_ok=True, mode=0o755)
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True, mode=0o755)
 except PermissionError as e:
@@ -91,17 +119,14 @@ def save_json(path: Path, data: Dict):
     path.write_text(json.dumps(data, indent=2))
     path.chmod(0o644)
 
-def get_tracking_data() -> Dict:
-    return get_json(TRACK_FILE)
-
-def save_tracking_data(d: Dict):
-    save_json(TRACK_FILE, d)
+def open_progress_store() -> ProgressStore:
+    store = ProgressStore(PROGRESS_DB)
+    store.import_legacy(TRACK_FILE, PROGRESS_FILE, START_DATE)
+    return store
 
-def save_court_tracking(court_code: str, tracking: Dict):
-    with _track_lock:
-        all_ = get_tracking_data()
-        all_[court_code] = tracking
-        save_tracking_data(all_)
+def endpoint_name(url: str) -> str:
+    """Short label for a portal URL in metrics: "home", "checkCaptcha", "openpdfcaptcha"..."""
+    return url.rstrip("/").rpartition("/")[2]
 
 def get_court_codes() -> Dict:
     return get_json(COURT_CODES_FILE)
@@ -120,165 +145,607 @@ def get_new_date_range(last_date: str, step: int=1) -> Tuple[Optional[str], Opti
 def date_ranges(court_code: str,
                 start_date: Optional[str]=None,
                 end_date: Optional[str]=None,
-                step: int=1):
-    if start_date and not end_date:
-        end_date = datetime.now().strftime("%Y-%m-%d")
-    if start_date and end_date:
-        s, e = datetime.strptime(start_date, "%Y-%m-%d"), datetime.strptime(end_date, "%Y-%m-%d")
-        cur = s
-        while cur <= e:
-            r_end = min(cur + timedelta(days=step-1), e)
-            yield cur.strftime("%Y-%m-%d"), r_end.strftime("%Y-%m-%d")
-            cur = r_end + timedelta(days=1)
-    else:
-        track = get_tracking_data().get(court_code, {})
-        last  = track.get("last_date", START_DATE)
-        cur   = datetime.strptime(last, "%Y-%m-%d") + timedelta(days=1)
-        e     = datetime.now()
-        while cur <= e:
-            r_end = min(cur + timedelta(days=step-1), e)
-            yield cur.strftime("%Y-%m-%d"), r_end.strftime("%Y-%m-%d")
-            cur = r_end + timedelta(days=1)
+                step: int=1,
+                progress: Optional[ProgressStore]=None):
+    """
+    `step`-day windows over [start_date or START_DATE, end_date or today],
+    skipping whatever `progress` already has marked complete for the court.
+    """
+    start = start_date or START_DATE
+    end = end_date or datetime.now().strftime("%Y-%m-%d")
+    if progress:
+        yield from progress.pending_ranges(court_code, start, end, step)
+        return
+    s, e = datetime.strptime(start, "%Y-%m-%d"), datetime.strptime(end, "%Y-%m-%d")
+    cur = s
+    while cur <= e:
+        r_end = min(cur + timedelta(days=step-1), e)
+        yield cur.strftime("%Y-%m-%d"), r_end.strftime("%Y-%m-%d")
+        cur = r_end + timedelta(days=1)
 
 # ─── Task Orchestration ────────────────────────────────────────────────────────
 
 class CourtDateTask:
-    def __init__(self, court_code: str, frm: str, to: str):
+    def __init__(self, court_code: str, frm: str, to: str, expected: Optional[int]=None,
+                 only: Optional[set]=None):
         self.id = str(uuid.uuid4())
         self.court_code = court_code
         self.frm = frm
         self.to = to
+        self.expected = expected  # result count, when the planner probed it
+        self.only = only          # retry: fetch just these pdf_links from the window
 
     def __str__(self):
         return f"{self.court_code} {self.frm}->{self.to} [{self.id}]"
 
-def generate_tasks(codes: list[str], start_date, end_date, step):
+class Shutdown(BaseException):
+    """
+    Raised in workers once SIGINT/SIGTERM has asked the run to stop. A
+    BaseException, like KeyboardInterrupt, so task retries and the per-row
+    `except Exception` handlers let it through.
+    """
+
+def generate_tasks(codes: list[str], start_date, end_date, step,
+                   progress: Optional[ProgressStore]=None):
     all_codes = get_court_codes()
     for code in codes:
         if code not in all_codes:
             raise ValueError(f"Unknown court code {code}")
-        for frm, to in date_ranges(code, start_date, end_date, step):
+        for frm, to in date_ranges(code, start_date, end_date, step, progress):
             yield CourtDateTask(code, frm, to)
 
-def process_task(task: CourtDateTask):
-    logger.info(f"▶ Starting {task}")
+def failed_tasks(store: DeadLetterStore, codes: list[str], start_date=None, end_date=None) -> list:
+    """Tasks redoing what `store` holds: whole failed windows, or just their failed rows."""
+    windows: Dict[Tuple[str, str, str], Optional[set]] = {}
+    for f in store.pending(codes, start_date, end_date):
+        key = (f.court_code, f.frm, f.to)
+        if f.frag == WINDOW or f.frag.startswith(UNPARSED):
+            windows[key] = None
+        elif windows.get(key, set()) is not None:
+            windows.setdefault(key, set()).add(f.frag)
+    return [CourtDateTask(code, frm, to, only=only) for (code, frm, to), only in windows.items()]
+
+class RunContext:
+    """Settings and shared services for one run(), handed to every Downloader."""
+    def __init__(self, upload: bool=True, local_copy: bool=True, pipeline: Optional[Pipeline]=None,
+                 session_pool: Optional[SessionPool]=None, index: Optional[DownloadIndex]=None,
+                 progress: Optional[ProgressStore]=None, metrics: Optional[MetricsExporter]=None,
+                 limiter: Optional[PortalLimiter]=None, failures: Optional[DeadLetterStore]=None,
+                 segments: Optional[SegmentStore]=None, content: Optional[ContentStore]=None):
+        self.upload = upload
+        self.local_copy = local_copy  # False: PDFs stream straight to GCS
+        self.pipeline = pipeline
+        self.session_pool = session_pool
+        self.index = index
+        self.progress = progress
+        self.metrics = metrics
+        self.limiter = limiter  # shared pacing of portal requests, if any
+        self.failures = failures
+        self.segments = segments  # packed storage instead of a PDF + JSON per judgment
+        self.content = content    # --dedupe: PDFs stored once, by sha256
+        self.stopping = threading.Event()  # set by graceful_shutdown()
+        self.uploader = GCSUploader() if upload else None
+
+    def close(self):
+        # Drain the pipeline first: its stages still use sessions and the index.
+        if self.pipeline:
+            self.pipeline.close()
+        if self.segments:
+            self.segments.close()  # seals, and queues the segments' uploads
+        if self.uploader:
+            self.uploader.close()
+        if self.session_pool:
+            self.session_pool.close()
+        if self.index:
+            self.index.close()
+        if self.failures:
+            self.failures.close()
+        if self.progress:
+            self.progress.close()
+        if self.metrics:
+            self.metrics.close()  # last, so the final dump sees everything
+
+def task_finished(task: CourtDateTask, ctx: Optional[RunContext], error: Optional[Exception]=None,
+                  started: Optional[float]=None):
+    """
+    Dead-letter a task that failed for good, or clear what earlier runs
+    recorded against its window (failures from before `started`).
+    """
+    if error is not None:
+        logger.error(f"❌ Failed {task}: {error!r}")
+    if not (ctx and ctx.failures):
+        return
+    if error is not None:
+        ctx.failures.record(task.court_code, task.frm, task.to, WINDOW, repr(error))
+    else:
+        ctx.failures.resolve_window(task.court_code, task.frm, task.to,
+                                    started if started is not None else time.time())
+
+@contextlib.contextmanager
+def graceful_shutdown(ctx: RunContext):
+    """
+    While running, SIGINT/SIGTERM let in-flight rows finish, checkpoint every
+    open window and stop (Shutdown); a second signal aborts at once.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def handler(signum, frame):
+        if ctx.stopping.is_set():
+            raise KeyboardInterrupt
+        logger.warning(f"✋ {signal.Signals(signum).name}: finishing in-flight rows and "
+                       f"checkpointing (send again to abort)")
+        ctx.stopping.set()
+
+    previous = {s: signal.signal(s, handler) for s in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        yield
+    finally:
+        for s, h in previous.items():
+            signal.signal(s, h)
+
+def upload_segment(ctx: RunContext, seg: Segment):
+    """on_seal hook: a sealed segment goes to GCS as two objects, PDFs and metadata."""
+    if not ctx.uploader:
+        return
+    prefix = f"segments/highcourt/{seg.court_code}/{seg.year}"
+    for path, ctype in ((seg.pdfs, "application/octet-stream"), (seg.meta, "application/x-ndjson")):
+        fut = ctx.uploader.submit(path, f"{prefix}/{path.name}", ctype)
+        fut.add_done_callback(
+            lambda f, path=path: f.exception() and logger.error(
+                f"GCS upload of {path} failed: {f.exception()}"))
+
+def _run_task(task: CourtDateTask, ctx: Optional[RunContext]):
+    if ctx and ctx.stopping.is_set():
+        raise Shutdown()
+    dl = Downloader(task.court_code, ctx)
+    dl.only = task.only
     try:
-        dl = Downloader(task.court_code)
         dl.process_date_range(task.frm, task.to)
-    except Exception:
-        logger.error(f"❌ Failed {task}:", exc_info=True)
+    finally:
+        dl.close()
+
+def process_task(task: CourtDateTask, ctx: Optional[RunContext]=None) -> bool:
+    logger.info(f"▶ Starting {task}")
+    started = time.time()
+    try:
+        TASK_RETRY.call(_run_task, task, ctx, what=f"Task {task}")
+    except Exception as e:
+        task_finished(task, ctx, e)
+        return False
+    task_finished(task, ctx, started=started)
+    return True
+
+def leased_task(lease) -> CourtDateTask:
+    return CourtDateTask(lease.court_code, lease.frm, lease.to, lease.expected, lease.only)
+
+def drain_queue(queue: WorkQueue, workers: int, ctx: RunContext):
+    """Claim and run tasks from the shared queue on `workers` threads until it is drained."""
+    def worker():
+        while (lease := queue.next(stop=ctx.stopping)) is not None:
+            try:
+                ok = process_task(leased_task(lease), ctx)
+            except Shutdown:
+                queue.release(lease)
+                raise
+            queue.finish(lease, ok, None if ok else f"see {FAILED_DB}")
+            logger.info(f"✅ Completed {lease}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for f in [pool.submit(worker) for _ in range(workers)]:
+            f.result()
 
-def run(codes, start_date, end_date, step, workers):
-    tasks = list(generate_tasks(codes, start_date, end_date, step))
-    if not tasks:
+def drain_schedule(sched: FairScheduler, workers: int, ctx: RunContext):
+    """Run the scheduler's tasks on `workers` threads, each taking whatever it hands out next."""
+    completed = itertools.count(1)
+
+    def worker():
+        while (task := sched.next(stop=ctx.stopping)) is not None:
+            try:
+                process_task(task, ctx)
+            finally:
+                sched.done(task)
+            logger.info(f"✅ Completed task {next(completed)}/{len(sched)}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for f in [pool.submit(worker) for _ in range(min(workers, len(sched)))]:
+            f.result()
+    if ctx.stopping.is_set() and sched.pending():
+        raise Shutdown()
+
+def plan_tasks(codes: list[str], start_date, end_date, span: int, target: int,
+               ctx: RunContext, workers: int, progress: Optional[ProgressStore]=None) -> list:
+    """
+    Probe `span`-day windows per court and split/merge them to ~`target`
+    judgments each. Windows found empty are marked done without a task.
+    """
+    all_codes = get_court_codes()
+    for code in codes:
+        if code not in all_codes:
+            raise ValueError(f"Unknown court code {code}")
+
+    def plan_court(code):
+        dl = Downloader(code, ctx)
+        try:
+            dl.init_session()
+            windows = date_ranges(code, start_date, end_date, span, progress)
+            return code, plan_windows(dl.count_results, windows, target)
+        finally:
+            dl.close()
+
+    tasks = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for code, planned in pool.map(plan_court, codes):
+            court_tasks = []
+            for frm, to, n in planned:
+                if n == 0:
+                    if ctx.progress:
+                        ctx.progress.mark_done(code, frm, to)
+                    continue
+                court_tasks.append(CourtDateTask(code, frm, to, expected=n))
+            total = sum(n or 0 for _, _, n in planned)
+            logger.info(f"Planned {code}: ~{total} judgments in {len(court_tasks)} tasks")
+            tasks.extend(court_tasks)
+    return tasks
+
+def open_context(workers=4, max_in_flight=32, per_court_in_flight=4, upload=True,
+                 local_copy=True, use_index=True, storage="files", segment_mb=1024,
+                 dedupe=False, metrics_port=0, metrics_dump=None, metrics_interval=60,
+                 rate=0.0, court_rate=0.0, adaptive=False, latency_target=0.0) -> RunContext:
+    """The stores and limits a run needs before it knows its tasks."""
+    if not (local_copy or upload):
+        raise ValueError("PDFs must be kept locally, uploaded, or both")
+    if storage == "segments" and not (local_copy and use_index):
+        raise ValueError("Segment storage needs the local copy and the download index")
+    if dedupe and not (local_copy and use_index and storage == "files"):
+        raise ValueError("--dedupe needs the local copy, the download index and file storage")
+    exporter = None
+    if metrics_port or metrics_dump:
+        exporter = MetricsExporter(port=metrics_port, dump_path=metrics_dump,
+                                   interval=metrics_interval)
+    limiter = None
+    if rate or court_rate or adaptive:
+        limiter = PortalLimiter(host_rate=rate, court_rate=court_rate, adaptive=adaptive,
+                                initial=min(per_court_in_flight, workers),
+                                max_concurrency=max_in_flight, per_court=per_court_in_flight,
+                                latency_target=latency_target)
+    ctx = RunContext(upload=upload, local_copy=local_copy, progress=open_progress_store(),
+                     metrics=exporter, limiter=limiter, failures=DeadLetterStore(FAILED_DB))
+    if storage == "segments":
+        ctx.segments = SegmentStore(OUTPUT_DIR, segment_bytes=segment_mb << 20,
+                                    on_seal=functools.partial(upload_segment, ctx))
+    if dedupe:
+        ctx.content = ContentStore(OUTPUT_DIR)
+    return ctx
+
+def start_services(ctx: RunContext, engine="thread", stage_workers: Optional[Dict[str, int]]=None,
+                   queue_size=64, session_pool=0, use_index=True):
+    """What only pays off once there is work: the index, the row pipeline, warm sessions."""
+    if use_index and not ctx.index:
+        ctx.index = DownloadIndex.open(INDEX_FILE, root=OUTPUT_DIR)
+    if engine == "pipeline" and not ctx.pipeline:
+        stage_workers = dict(stage_workers or {})
+        if ctx.limiter and ctx.limiter.adaptive:
+            # Enough threads in the stages that call the portal for the limiter to widen into.
+            for stage in ("resolve", "fetch"):
+                stage_workers[stage] = max(stage_workers.get(stage, 0), ctx.limiter.ceiling())
+        ctx.pipeline = build_row_pipeline(stage_workers, queue_size).start()
+    if session_pool and engine != "async" and not ctx.session_pool:
+        ctx.session_pool = SessionPool(open_portal_session, size=session_pool)
+
+def execute(tasks, ctx: RunContext, workers, engine="thread", max_in_flight=32,
+            per_court_in_flight=4, wq: Optional[WorkQueue]=None, per_court_tasks=0,
+            order="oldest"):
+    """
+    Run `tasks` (or drain `wq`) on an open context; raises Shutdown if
+    stopped early. Tasks are interleaved across courts (scheduler.py), at
+    most `per_court_tasks` of a court at a time (0 = no cap). With an
+    adaptive limiter, `workers` is only where concurrency starts: the pool
+    is sized for the limiter's ceiling and the limiter gates the requests.
+    """
+    tasks = list(tasks)
+    if ctx.limiter and ctx.limiter.adaptive:
+        courts = None if wq else len({t.court_code for t in tasks})
+        workers = max(workers, ctx.limiter.ceiling(courts))
+    with graceful_shutdown(ctx):
+        if engine == "async":
+            from async_engine import run_async
+            run_async(tasks, workers, max_in_flight, per_court_in_flight, ctx, queue=wq,
+                      per_court_tasks=per_court_tasks, order=order)
+        elif wq:
+            drain_queue(wq, workers, ctx)
+        else:
+            drain_schedule(FairScheduler(tasks, per_court_tasks, order), workers, ctx)
+
+def run(codes, start_date, end_date, step, workers,
+        engine="thread", max_in_flight=32, per_court_in_flight=4,
+        stage_workers: Optional[Dict[str, int]]=None, queue_size=64, upload=True,
+        session_pool=0, use_index=True, rescan=False, plan_target=0, plan_span=31,
+        local_copy=True, metrics_port=0, metrics_dump=None, metrics_interval=60,
+        rate=0.0, court_rate=0.0, adaptive=False, latency_target=0.0, retry_failed=False,
+        queue: Optional[Path]=None, queue_join=False, lease_seconds=300.0,
+        storage="files", segment_mb=1024, dedupe=False, per_court_tasks=0, order="oldest"):
+    """
+    With `queue`, tasks go into a shared work queue (work_queue.py) that this
+    and any other node drain together; `queue_join` skips planning and only
+    works on what is already queued. `storage="segments"` packs judgments
+    into per-court/year segment files (segment_store.py); `dedupe` stores
+    each distinct PDF once, by sha256 (content_store.py).
+    """
+    ctx = open_context(workers=workers, max_in_flight=max_in_flight,
+                       per_court_in_flight=per_court_in_flight, upload=upload,
+                       local_copy=local_copy, use_index=use_index, storage=storage,
+                       segment_mb=segment_mb, dedupe=dedupe, metrics_port=metrics_port,
+                       metrics_dump=metrics_dump, metrics_interval=metrics_interval,
+                       rate=rate, court_rate=court_rate, adaptive=adaptive,
+                       latency_target=latency_target)
+    skip = None if rescan else ctx.progress
+    if queue_join:
+        tasks = []
+    elif retry_failed:
+        tasks = failed_tasks(ctx.failures, codes, start_date, end_date)
+        pending = ctx.failures.count()
+        logger.info(f"Retrying {pending['windows']} failed windows and {pending['rows']} failed "
+                    f"rows in {len(tasks)} tasks from {FAILED_DB}")
+    elif plan_target:
+        tasks = plan_tasks(codes, start_date, end_date, plan_span, plan_target,
+                           ctx, workers, skip)
+    else:
+        tasks = list(generate_tasks(codes, start_date, end_date, step, skip))
+    wq = None
+    if queue:
+        wq = WorkQueue(queue, lease_seconds=lease_seconds)
+        # Claimed in insertion order, so enqueue the courts interleaved.
+        added = wq.add(interleave(tasks, order))
+        logger.info(f"Queued {added} new tasks in {queue} ({len(tasks) - added} already there); "
+                    f"queue: {wq.counts()}")
+    elif not tasks:
         logger.info("No tasks to run.")
+        ctx.close()
         return
-    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
-        for i, _ in enumerate(pool.map(process_task, tasks), 1):
-            logger.info(f"✅ Completed task {i}/{len(tasks)}")
+    start_services(ctx, engine, stage_workers, queue_size, session_pool, use_index)
+    try:
+        execute(tasks, ctx, workers, engine, max_in_flight, per_court_in_flight, wq,
+                per_court_tasks, order)
+    except Shutdown:
+        logger.warning(f"✋ Stopped early; a rerun resumes from the checkpoints in {PROGRESS_DB}")
+        raise
+    finally:
+        if wq:
+            wq.close()
+        ctx.close()
     logger.info("✅ All done.")
 
+# ─── Row Pipeline ─────────────────────────────────────────────────────────────
+# search (task threads) → link resolve → PDF fetch + local write → GCS upload
+
+class RowJob:
+    def __init__(self, dl: "Downloader", rec: RowRecord, idx: int, frm: str, to: str,
+                 offset: int):
+        self.dl = dl
+        self.rec = rec
+        self.frag = rec.pdf_link
+        self.idx = idx
+        self.offset = offset  # position in the window's whole listing
+        self.frm = frm
+        self.to = to
+        self.session = None
+        self.outputfile = None
+        self.resolved = False
+        self.meta = None
+
+def _resolve_stage(job: RowJob) -> RowJob:
+    dl = job.dl
+    lp = dl.default_pdf_payload()
+    with dl.lock:
+        lp.update({"path": job.frag, "val": job.idx, "app_token": dl.app_token or ""})
+        r2 = dl.request_api("POST", PDF_LINK_URL, lp)
+        job.session = dl.session
+    job.outputfile = r2.json().get("outputfile")
+    job.resolved = True
+    dl._row_resolved()
+    return job
+
+def _fetch_stage(job: RowJob) -> RowJob:
+    dl = job.dl
+    dl._download_pdf(job.session, job.outputfile, job.frag, job.frm, job.to)
+    job.meta = dl._save_metadata(job.rec, job.frm, job.to)
+    return job
+
+def _upload_stage(job: RowJob) -> None:
+    job.dl._upload(job.meta, job.frag, job.frm, job.to)
+
+def _exit_stage(job: RowJob) -> None:
+    if job.meta is None:
+        # The stage that raised has already logged the traceback.
+        job.dl._row_failed(job.frag, job.frm, job.to, "pipeline stage failed", exc_info=False)
+    else:
+        job.dl._row_done(job.frag, job.frm, job.to)
+    job.dl._row_exited(job)
+
+def build_row_pipeline(stage_workers: Dict[str, int], queue_size: int=64) -> Pipeline:
+    return Pipeline([
+        Stage("resolve", _resolve_stage, stage_workers.get("resolve", 2), queue_size),
+        Stage("fetch", _fetch_stage, stage_workers.get("fetch", 4), queue_size),
+        Stage("upload", _upload_stage, stage_workers.get("upload", 4), queue_size),
+    ], on_exit=_exit_stage)
+
+# ─── Session Pool ─────────────────────────────────────────────────────────────
+
+def open_portal_session() -> PortalSession:
+    """New portal session with cookies and a captcha-backed app_token."""
+    s = requests.Session()
+    s.get(f"{ROOT_URL}/pdfsearch/", headers={"User-Agent": "Mozilla/5.0"},
+          verify=False, timeout=30)
+    if not s.cookies.get("JSESSION"):
+        raise RuntimeError("Failed to init session")
+    ans = None
+    for _ in range(6):
+        r = s.get(CAPTCHA_URL, verify=False, timeout=30)
+        r.raise_for_status()
+        ans = get_solver().solve(r.content)
+        if ans is not None:
+            break
+    if ans is None:
+        raise RuntimeError("Captcha fail")
+    r = s.post(CAPTCHA_TOKEN_URL, headers=API_HEADERS,
+               data={"captcha": ans, "search_opt": "PHRASE", "ajax_req": "true"},
+               verify=False, timeout=60)
+    return PortalSession(s, r.json().get("app_token"), NO_CAPTCHA_BATCH)
+
 # ─── Downloader ───────────────────────────────────────────────────────────────
 
 class Downloader:
-    def __init__(self, court_code: str):
+    def __init__(self, court_code: str, ctx: Optional[RunContext]=None):
+        self.ctx = ctx or RunContext()
         self.code = court_code
         self.name = get_court_codes()[court_code]
-        self.tracking = get_tracking_data().get(court_code, {})
         self.session = requests.Session()
         self.app_token = None
+        self.uses_left = NO_CAPTCHA_BATCH
+        self.lease = None
+        self._retired = []  # leases swapped out while row jobs may still use them
+        # Pipeline mode: stage threads share this session and app_token.
+        self.pipeline = self.ctx.pipeline
+        self.lock = threading.RLock()
+        self._cond = threading.Condition()
+        self._queued = set()
+        self._unresolved = 0
+        self._unfinished = 0
+        self.only = None  # set of pdf_links when retrying dead-lettered rows
+        # Listing offsets of rows handed to the pipeline/async fetches and not
+        # yet settled; the window's cursor can't move past the lowest one.
+        self._open_offsets = set()
+        self._saved_offset = 0
+        self._saved_at = 0.0
 
     def init_session(self):
-        self.session.cookies.clear()
-        r = self.session.get(f"{ROOT_URL}/pdfsearch/",
-                             headers={"User-Agent": "Mozilla/5.0"},
+        with metrics.INIT_SESSION_SECONDS.time(court=self.code):
+            self._open_session()
+
+    def _open_session(self):
+        if self.ctx.session_pool:
+            self._swap_lease()
+            return
+        self.uses_left = NO_CAPTCHA_BATCH
+        if self.pipeline:
+            # Rows still fetching hold the previous session; don't clear it under them.
+            self.session = requests.Session()
+        else:
+            self.session.cookies.clear()
+        with self._permit(ROOT_URL):
+            self.session.get(f"{ROOT_URL}/pdfsearch/", headers={"User-Agent": "Mozilla/5.0"},
                              verify=False, timeout=30)
         if not self.session.cookies.get("JSESSION"):
             raise RuntimeError("Failed to init session")
 
+    def _swap_lease(self):
+        self.close()
+        self.lease = self.ctx.session_pool.acquire(stop=self.ctx.stopping)
+        if self.lease is None:
+            raise Shutdown()
+        self.session = self.lease.session
+        self.app_token = self.lease.app_token
+        self.uses_left = self.lease.uses_left
+
+    def close(self):
+        """
+        Hand a pooled session back with its remaining uses, once no row job
+        still in the pipeline can be using it (the last one to exit does it).
+        """
+        with self._cond:
+            if self.lease:
+                self.lease.app_token = self.app_token
+                self.lease.uses_left = self.uses_left
+                self._retired.append(self.lease)
+                self.lease = None
+            self._release_retired()
+
+    def _release_retired(self):
+        if self._unfinished == 0:
+            for lease in self._retired:
+                self.ctx.session_pool.release(lease)
+            self._retired.clear()
+
     def headers(self) -> Dict:
-        return {
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-            "Origin": ROOT_URL,
-            "Referer": ROOT_URL,
-            "User-Agent": "Mozilla/5.0",
-            "X-Requested-With": "XMLHttpRequest",
-        }
+        return dict(API_HEADERS)
+
+    def _permit(self, url: str):
+        """Limiter slot for one request to `url`'s host (no-op without a limiter)."""
+        if not self.ctx.limiter:
+            return contextlib.nullcontext()
+        return self.ctx.limiter.request(urllib.parse.urlsplit(url).netloc, self.code)
+
+    def _congested(self, url: str):
+        if self.ctx.limiter:
+            self.ctx.limiter.signal(urllib.parse.urlsplit(url).netloc, self.code)
 
     def solve_math(self, expr: str) -> str:
-        expr = expr.replace("×", "*").replace("X", "*").replace("x", "*").replace("÷", "/")
-        for op in "+-*/":
-            if op in expr:
-                a, b = expr.split(op)
-                return str(int(a) + int(b) if op == "+" else
-                           int(a) - int(b) if op == "-" else
-                           int(a) * int(b) if op == "*" else
-                           int(a) // int(b))
-        raise ValueError("Bad captcha")
-
-    def solve_captcha(self, retries=0) -> str:
-        if retries > 5:
-            raise RuntimeError("Captcha fail")
-        try:
-            r = self.session.get(CAPTCHA_URL, verify=False, timeout=30)
-            r.raise_for_status()
-            
-            img_id = uuid.uuid4().hex[:8]
-            tmp = CAPTCHA_TMP_DIR / f"{self.code}_{img_id}.png"
-            
-            # Secure file write with proper permissions
-            tmp.touch(mode=0o600, exist_ok=True)
-            tmp.write_bytes(r.content)
-            tmp.chmod(0o644)  # Readable by all after write
-            
-            res = reader.readtext(str(tmp))
-            tmp.unlink(missing_ok=True)  # Cleanup immediately
-            
-            if not res:
-                if retries > 5:
-                    raise ValueError("Bad captcha (max retries exceeded)")
-                
-            txt = res[0][1].strip()
-            if re.search(r"[0-9\+\-\*\/]", txt):
-                return self.solve_math(txt)
-                
-            return self.solve_captcha(retries + 1)
-            
-        except Exception as e:
-            logger.error(f"CAPTCHA processing failed: {e}")
-            raise
+        return solve_math(expr)
+
+    def _read_captcha(self, content: bytes) -> Optional[str]:
+        return get_solver().solve(content)
+
+    def solve_captcha(self) -> str:
+        for _ in range(CAPTCHA_RETRY.attempts):
+            try:
+                with metrics.CAPTCHA_HTTP_SECONDS.time(court=self.code), self._permit(CAPTCHA_URL):
+                    r = self.session.get(CAPTCHA_URL, verify=False, timeout=30)
+                    r.raise_for_status()
+                with metrics.CAPTCHA_OCR_SECONDS.time(court=self.code):
+                    ans = self._read_captcha(r.content)
+            except Exception as e:
+                logger.error(f"CAPTCHA processing failed: {e}")
+                raise
+            metrics.CAPTCHA_SOLVES.inc(court=self.code, result="unreadable" if ans is None else "ok")
+            if ans is not None:
+                return ans
+        raise RetriesExhausted(f"Captcha fail: {CAPTCHA_RETRY.attempts} unreadable images")
 
     def refresh_token(self, use_app=False):
         ans = self.solve_captcha()
         data = {"captcha": ans, "search_opt": "PHRASE", "ajax_req": "true"}
         if use_app and self.app_token:
             data["app_token"] = self.app_token
-        r = self.session.post(CAPTCHA_TOKEN_URL, headers=self.headers(),
-                              data=data, verify=False, timeout=60)
+        metrics.TOKEN_REFRESHES.inc(court=self.code)
+        with (metrics.API_REQUEST_SECONDS.time(court=self.code, endpoint="checkCaptcha"),
+              self._permit(CAPTCHA_TOKEN_URL)):
+            r = self.session.post(CAPTCHA_TOKEN_URL, headers=self.headers(),
+                                  data=data, verify=False, timeout=60)
         self.app_token = r.json().get("app_token")
 
     def request_api(self, method, url, data):
-        r = self.session.request(method, url, headers=self.headers(),
-                                 data=data, verify=False, timeout=60)
-        try:
-            j = r.json()
-        except:
-            j = {}
-        if "app_token" in j:
-            self.app_token = j["app_token"]
-        if "filename" in j and "securimage_show" in j["filename"]:
-            tree = LH.fromstring(j["filename"])
-            src = tree.xpath("//img[@id='captcha_image_pdf']/@src")[0]
-            ans = self.solve_captcha()
-            data.update({"captcha1": ans, "app_token": j["app_token"]})
-            return self.session.post(PDF_LINK_WO_CAPTCHA, headers=self.headers(),
-                                     data=data, verify=False, timeout=60)
-        if j.get("session_expire") == "Y" or "errormsg" in j:
+        endpoint = endpoint_name(url)
+        for attempt in range(1, API_RETRY.attempts + 1):
+            with metrics.API_REQUEST_SECONDS.time(court=self.code, endpoint=endpoint), self._permit(url):
+                r = self.session.request(method, url, headers=self.headers(),
+                                         data=data, verify=False, timeout=60)
+            try:
+                j = r.json()
+            except:
+                j = {}
+            if "app_token" in j:
+                self.app_token = j["app_token"]
+            if "filename" in j and "securimage_show" in j["filename"]:
+                ans = self.solve_captcha()
+                metrics.API_RETRIES.inc(court=self.code, endpoint=endpoint, reason="pdf_captcha")
+                data.update({"captcha1": ans, "app_token": j["app_token"]})
+                with (metrics.API_REQUEST_SECONDS.time(court=self.code, endpoint="openpdf"),
+                      self._permit(PDF_LINK_WO_CAPTCHA)):
+                    return self.session.post(PDF_LINK_WO_CAPTCHA, headers=self.headers(),
+                                             data=data, verify=False, timeout=60)
+            if not (j.get("session_expire") == "Y" or "errormsg" in j):
+                return r
+            reason = "session_expire" if j.get("session_expire") == "Y" else "errormsg"
+            self._congested(url)
+            if attempt >= API_RETRY.attempts:
+                break
+            metrics.API_RETRIES.inc(court=self.code, endpoint=endpoint, reason=reason)
+            time.sleep(API_RETRY.delay(attempt))
             self.refresh_token(use_app=True)
             data["app_token"] = self.app_token
-            return self.request_api(method, url, data)
-        return r
+        raise RetriesExhausted(f"{endpoint}: {reason} after {API_RETRY.attempts} attempts")
 
     def default_search_payload(self) -> Dict:
         qs = urllib.parse.parse_qs(PAYLOAD.lstrip("&"))
@@ -286,6 +753,19 @@ class Downloader:
         out.update({"sEcho": 1, "iDisplayStart": 0, "iDisplayLength": PAGE_SIZE})
         return out
 
+    def count_results(self, frm: str, to: str) -> Optional[int]:
+        """Total judgments the portal reports for a window (one 1-row search)."""
+        sp = self.default_search_payload()
+        sp.update({"from_date": frm, "to_date": to, "state_code": self.code,
+                   "app_token": self.app_token or "", "iDisplayLength": 1})
+        with self.lock:
+            data = self.request_api("POST", SEARCH_URL, sp).json()
+        for src in (data.get("reportrow", {}), data):
+            for k in ("iTotalDisplayRecords", "iTotalRecords"):
+                if k in src:
+                    return int(src[k])
+        return None
+
     def default_pdf_payload(self) -> Dict:
         qs = urllib.parse.parse_qs(PDF_LINK_PAYLOAD)
         return {k: v[0] for k, v in qs.items()}
@@ -301,31 +781,62 @@ class Downloader:
         return self.get_pdf_path(frag, frm, to).with_suffix(".json")
 
     def already_downloaded(self, frag: str, frm: str, to: str) -> bool:
+        if self.ctx.index:
+            return self.ctx.index.contains(frag)
         return self.get_meta_path(frag, frm, to).exists()
 
-    def _parse_metadata(self, html: str) -> Dict:
-        tree = LH.fromstring(html)
-        title = "".join(tree.xpath("//button//text()")).strip()
-        desc = " ".join(t.strip() for t in tree.xpath("//button/text()") if t.strip())
-        judge = ""
-        for s in tree.xpath("//strong/text()"):
-            if "Judge" in s or "Hon'ble" in s:
-                judge = s.split(":", 1)[-1].strip()
-                break
-        cd = tree.xpath('//strong[@class="caseDetailsTD"]')
-        details = {"cnr": "", "date_reg": "", "date_dec": "", "disp": ""}
-        if cd:
-            block = cd[0]
-            def ex(label):
-                r = block.xpath(f'.//span[contains(text(), "{label}")]/following-sibling::font/text()')
-                return r[0].strip() if r else ""
-            details = {
-                "cnr": ex("CNR"),
-                "date_reg": ex("Date of registration"),
-                "date_dec": ex("Decision Date"),
-                "disp": ex("Disposal Nature"),
-            }
-        return {"title": title, "description": desc, "judge": judge, **details}
+    def _wants(self, frag: str, frm: str, to: str) -> bool:
+        """Whether a row needs fetching: not stored yet, or on the retry list."""
+        if self.only is not None:
+            return frag in self.only
+        if self.already_downloaded(frag, frm, to):
+            metrics.ROWS.inc(court=self.code, outcome="skipped")
+            logger.debug(f"⏩ Skipping already downloaded case: {frag}")
+            return False
+        return True
+
+    def _row_failed(self, frag: Optional[str], frm: str, to: str, error: str, exc_info=True,
+                    offset: Optional[int]=None):
+        """
+        Count and dead-letter a row. One that could not even be parsed is keyed
+        by its listing `offset`, and is retried by re-searching its window.
+        """
+        metrics.ROWS.inc(court=self.code, outcome="failed")
+        logger.error(f"Row failed: {frag or f'(unparsed, row {offset})'}", exc_info=exc_info)
+        if self.ctx.failures:
+            self.ctx.failures.record(self.code, frm, to, frag or f"{UNPARSED}{offset}", error)
+
+    def _row_done(self, frag: str, frm: str, to: str):
+        if self.only is not None and self.ctx.failures:
+            self.ctx.failures.resolve(self.code, frm, to, frag)
+
+    def _resume_offset(self, frm: str, to: str) -> int:
+        """Where an interrupted window left off (retries always rescan the whole window)."""
+        offset = 0
+        if self.ctx.progress and self.only is None:
+            offset = self.ctx.progress.cursor(self.code, frm, to)
+        if offset:
+            logger.info(f"↪ Resuming {self.code} {frm}→{to} at row {offset}")
+        self._saved_offset = offset
+        self._saved_at = time.monotonic()
+        return offset
+
+    def _checkpoint(self, frm: str, to: str, next_offset: int, force=False):
+        """Save the window's cursor: every row before `next_offset` that isn't still open is settled."""
+        if not self.ctx.progress or self.only is not None:
+            return
+        with self._cond:
+            offset = min(self._open_offsets, default=next_offset)
+        now = time.monotonic()
+        if offset == self._saved_offset or (not force and now - self._saved_at < CHECKPOINT_SECONDS):
+            return
+        self.ctx.progress.save_cursor(self.code, frm, to, offset)
+        self._saved_offset = offset
+        self._saved_at = now
+
+    def _settle(self, offset: int):
+        with self._cond:
+            self._open_offsets.discard(offset)
 
     def process_date_range(self, frm: str, to: str):
         if not (frm and to):
@@ -333,123 +844,383 @@ class Downloader:
         logger.info(f"Processing {self.code} {frm}->{to}")
         sp = self.default_search_payload()
         sp.update({"from_date": frm, "to_date": to, "state_code": self.code, "app_token": self.app_token or ""})
+        sp["iDisplayStart"] = self._resume_offset(frm, to)
 
         self.init_session()
-        downloaded_count = 0
+        sp["app_token"] = self.app_token or ""
         more = True
 
         while more:
-            resp = self.request_api("POST", SEARCH_URL, sp)
+            with self.lock:
+                resp = self.request_api("POST", SEARCH_URL, sp)
             data = resp.json()
             rows = data.get("reportrow", {}).get("aaData", [])
             if not rows:
                 more = False
-                self.tracking["last_date"] = to
-                save_court_tracking(self.code, self.tracking)
-                logger.info(f"Updated track for {self.code}→{to}")
+                self._wait_for("_unfinished")
+                if self.ctx.progress:
+                    self.ctx.progress.mark_done(self.code, frm, to)
+                logger.info(f"Marked {self.code} {frm}→{to} done")
                 break
 
             for idx, row in enumerate(rows):
+                offset = sp["iDisplayStart"] + idx
+                if self.ctx.stopping.is_set():
+                    self._wait_for("_unfinished")
+                    self._checkpoint(frm, to, offset, force=True)
+                    logger.info(f"✋ Stopped {self.code} {frm}→{to} at row {offset}")
+                    raise Shutdown()
+                self._checkpoint(frm, to, offset)
+                rec = None
                 try:
-                    self._handle_row(row, idx, frm, to)
-                    downloaded_count += 1
-                    if downloaded_count >= NO_CAPTCHA_BATCH:
+                    rec = parse_row(row[1])
+                    if self.pipeline:
+                        spent = self._enqueue_row(rec, idx, frm, to, offset)
+                    else:
+                        spent = self._handle_row(rec, idx, frm, to)
+                    # Only rows that cost a link POST use up the session.
+                    if not spent:
+                        continue
+                    self.uses_left -= 1
+                    if self.uses_left <= 0:
                         logger.info("Resetting session after batch")
-                        downloaded_count = 0
+                        self._wait_for("_unresolved")
                         self.init_session()
                         sp["app_token"] = self.app_token
+                        # Resume the listing after this row instead of re-reading the page.
+                        sp["sEcho"] += 1
+                        sp["iDisplayStart"] += idx + 1
                         break
-                except Exception:
-                    logger.error("Row failed:", exc_info=True)
+                except Exception as e:
+                    self._row_failed(rec.pdf_link if rec else None, frm, to, repr(e),
+                                     offset=offset)
             else:
                 sp["sEcho"] += 1
                 sp["iDisplayStart"] += PAGE_SIZE
 
-    def _handle_row(self, row, idx: int, frm: str, to: str) -> None:
-        html = row[1]
-        soup = BeautifulSoup(html, "html.parser")
-        btn = soup.find("button", onclick=True)
-        if not btn:
-            return
+    def gcs_keys(self, frag: str, frm: str, to: str) -> Tuple[str, str]:
+        slug = slugify(self.name)
+        year = frm[:4]
+        return (f"pdf/highcourt/{slug}/{year}/{self.get_pdf_path(frag, frm, to).name}",
+                f"metadata/highcourt/{slug}/{year}/{self.get_meta_path(frag, frm, to).name}")
 
-        frag_m = re.search(r"open_pdf\('.*?','.*?','(.*?)'\)", btn["onclick"])
-        frag = frag_m.group(1).split("#")[0] if frag_m else None
-        if not frag:
-            return
+    def _open_pdf_sink(self, frag: str, frm: str, to: str) -> PdfSink:
+        if self.ctx.segments:
+            return PdfSink(self.ctx.segments.staging_path(frag))
+        if self.ctx.content:
+            return PdfSink(self.ctx.content.staging_path(frag))
+        if self.ctx.local_copy:
+            return PdfSink(self.get_pdf_path(frag, frm, to))
+        return PdfSink(remote=open_gcs_writer(self.gcs_keys(frag, frm, to)[0]))
 
-        # ✅ Skip if already downloaded
-        if self.already_downloaded(frag, frm, to):
-            logger.info(f"⏩ Skipping already downloaded case: {frag}")
+    def _pdf_stored(self, sink: PdfSink, frag: str, frm: str, to: str) -> None:
+        if self.ctx.content:
+            path, new = self.ctx.content.adopt(sink.path, sink.sha256)
+            if not new:
+                metrics.PDF_DEDUPED.inc(court=self.code, skipped="local")
+                logger.info(f"♻️ Same PDF already stored: {frag} → {path.name}")
+            self.ctx.index.record(frag, court_code=self.code, local_path=path,
+                                  size=sink.size, sha256=sink.sha256)
             return
+        # Packed PDFs are only indexed once _pack() has moved them into a segment.
+        if self.ctx.index and not self.ctx.segments:
+            self.ctx.index.record(frag, court_code=self.code, local_path=sink.path,
+                                  size=sink.size, sha256=sink.sha256,
+                                  gcs_key=None if sink.path else self.gcs_keys(frag, frm, to)[0])
 
-        pdf_path = self.get_pdf_path(frag, frm, to)
-        meta_path = self.get_meta_path(frag, frm, to)
-        fresh = False
+    def _download_pdf(self, session, outputfile: Optional[str], frag: str, frm: str, to: str) -> None:
+        """
+        Stream the PDF behind `outputfile` to disk/GCS. Raises if there is no
+        PDF, so the row is dead-lettered rather than saved without one.
+        """
+        if not outputfile:
+            raise RuntimeError("No outputfile in PDF-link response")
+        sink = self._open_pdf_sink(frag, frm, to)
+        started = time.perf_counter()
+        write_s = 0.0
+        try:
+            # NotAPdf raised mid-stream releases the slot as a congestion signal.
+            with (self._permit(ROOT_URL),
+                  session.get(ROOT_URL + outputfile, verify=False, timeout=60, stream=True) as r):
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    t = time.perf_counter()
+                    sink.write(chunk)
+                    write_s += time.perf_counter() - t
+            t = time.perf_counter()
+            sink.commit()
+            write_s += time.perf_counter() - t
+        except NotAPdf:
+            sink.abort()
+            raise NotAPdf(f"Portal served HTML in place of the PDF: {frag}") from None
+        except Exception:
+            sink.abort()
+            raise
+        self._pdf_timed(sink, time.perf_counter() - started, write_s)
+        self._pdf_stored(sink, frag, frm, to)
 
-        # 1) Download PDF
-        lp = self.default_pdf_payload()
-        lp.update({"path": frag, "val": idx, "app_token": self.app_token or ""})
-        r2 = self.request_api("POST", PDF_LINK_URL, lp)
-        j2 = r2.json()
-        if "outputfile" in j2:
-            url = ROOT_URL + j2["outputfile"]
-            pdf_resp = self.session.get(url, verify=False, timeout=60)
-            content = pdf_resp.content
-            if content.lstrip().startswith(b"%PDF"):
-                pdf_path.parent.mkdir(parents=True, exist_ok=True, mode=0o755)
-                pdf_path.write_bytes(content)
-                pdf_path.chmod(0o644)
-                fresh = True
-            else:
-                logger.error(f"Skipped corrupt HTML in place of PDF: {frag}")
-        else:
-            logger.error("No outputfile in PDF-link response")
+    def _pdf_timed(self, sink: PdfSink, total_s: float, write_s: float) -> None:
+        metrics.PDF_FETCH_SECONDS.observe(total_s - write_s, court=self.code)
+        metrics.PDF_WRITE_SECONDS.observe(write_s, court=self.code)
+        metrics.PDF_BYTES.inc(sink.size, court=self.code)
+        metrics.ROWS.inc(court=self.code, outcome="downloaded")
+
+    def _enqueue_row(self, rec: RowRecord, idx: int, frm: str, to: str, offset: int) -> bool:
+        frag = rec.pdf_link
+        if not frag or frag in self._queued or not self._wants(frag, frm, to):
+            return False
+        with self._cond:
+            self._queued.add(frag)
+            self._open_offsets.add(offset)
+            self._unresolved += 1
+            self._unfinished += 1
+        self.pipeline.put(RowJob(self, rec, idx, frm, to, offset))
+        return True
+
+    def _wait_for(self, counter: str):
+        with self._cond:
+            self._cond.wait_for(lambda: getattr(self, counter) == 0)
+
+    def _row_resolved(self):
+        with self._cond:
+            self._unresolved -= 1
+            self._cond.notify_all()
+
+    def _row_exited(self, job: RowJob):
+        with self._cond:
+            if not job.resolved:
+                self._unresolved -= 1
+            self._unfinished -= 1
+            self._queued.discard(job.frag)
+            self._open_offsets.discard(job.offset)
+            self._release_retired()
+            self._cond.notify_all()
+
+    def _save_and_upload(self, rec: RowRecord, frm: str, to: str) -> None:
+        meta = self._save_metadata(rec, frm, to)
+        self._upload(meta, rec.pdf_link, frm, to)
+
+    def _save_metadata(self, rec: RowRecord, frm: str, to: str) -> Dict:
+        frag = rec.pdf_link
+        meta_path = self.get_meta_path(frag, frm, to)
 
         # 2) Build metadata dict
-        meta = self._parse_metadata(html)
+        meta = rec.as_dict()
         meta.update({
             "court_code": self.code,
             "court": self.name,
-            "pdf_link": frag,
-            "downloaded": fresh,
+            "downloaded": True,
             "from_date": frm,
             "to_date": to
         })
+        if self.ctx.segments:
+            return self._pack(meta, frm)
+        if self.ctx.content:
+            stored = self.ctx.index.get(frag)
+            meta["sha256"] = stored["sha256"]
+            meta["pdfpath"] = stored["local_path"]
+            if self.ctx.upload:
+                gcs_pdf_key = self.ctx.content.gcs_key(stored["sha256"])
+                meta["pdfpathgcs"] = gcs_pdf_key
+                meta["pdfurl"] = gcs_public_url(gcs_pdf_key)
+        elif self.ctx.upload:
+            # Keys are deterministic, so the JSON is written (and uploaded) once.
+            gcs_pdf_key = self.gcs_keys(frag, frm, to)[0]
+            meta["pdfpathgcs"] = gcs_pdf_key
+            meta["pdfurl"] = gcs_public_url(gcs_pdf_key)
 
         # 3) Save metadata locally
         save_json(meta_path, meta)
+        if self.ctx.index:
+            self.ctx.index.record(frag, court_code=self.code, meta_path=meta_path)
+        return meta
 
-        # 4) Upload PDF → get PDF URL
-        slug = slugify(self.name)
-        year = frm[:4]
-        gcs_pdf_key = f"pdf/highcourt/{slug}/{year}/{pdf_path.name}"
-        gcs_meta_key = f"metadata/highcourt/{slug}/{year}/{meta_path.name}"
+    def _pack(self, meta: Dict, frm: str) -> Dict:
+        frag = meta["pdf_link"]
+        staged = self.ctx.segments.staging_path(frag)
+        loc = self.ctx.segments.store(self.code, frm[:4], meta, staged)
+        if self.ctx.index:
+            self.ctx.index.record(frag, court_code=self.code, meta_path=loc.meta,
+                                  local_path=loc.pdfs, pdf_offset=loc.offset,
+                                  size=loc.length, sha256=loc.sha256)
+        return meta
+
+    def _upload(self, meta: Dict, frag: str, frm: str, to: str) -> None:
+        # Packed storage uploads whole segments as they are sealed (upload_segment).
+        if not self.ctx.upload or not meta.get("downloaded") or self.ctx.segments:
+            return
+        pdf_path = self.get_pdf_path(frag, frm, to)
+        meta_path = self.get_meta_path(frag, frm, to)
+
+        # 4) Upload PDF + metadata side by side
+        gcs_pdf_key, gcs_meta_key = self.gcs_keys(frag, frm, to)
+        upload_pdf = self.ctx.local_copy  # otherwise _download_pdf already streamed it
+        if self.ctx.content:
+            pdf_path, gcs_pdf_key = Path(meta["pdfpath"]), meta["pdfpathgcs"]
+            if self.ctx.index.has_gcs_copy(meta["sha256"], gcs_pdf_key):
+                upload_pdf = False
+                metrics.PDF_DEDUPED.inc(court=self.code, skipped="gcs")
+        uploader = self.ctx.uploader
 
         try:
-            pdf_url = upload_to_gcs(str(pdf_path), gcs_pdf_key)
-            meta["pdfpathgcs"] = gcs_pdf_key
-            meta["pdfurl"] = pdf_url
-            save_json(meta_path, meta)
-            upload_to_gcs(str(meta_path), gcs_meta_key)
+            futs = [uploader.submit(meta_path, gcs_meta_key, "application/json")]
+            if upload_pdf:
+                futs.append(uploader.submit(pdf_path, gcs_pdf_key, "application/pdf"))
+            with metrics.UPLOAD_WAIT_SECONDS.time(court=self.code):
+                for f in futs:
+                    f.result()
+            if self.ctx.index:
+                self.ctx.index.record(frag, gcs_key=gcs_pdf_key)
             logger.info(f"Uploaded PDF+meta to GCS: {gcs_pdf_key}, {gcs_meta_key}")
         except Exception as e:
             logger.error(f"GCS upload failed: {e}")
 
+    def _handle_row(self, rec: RowRecord, idx: int, frm: str, to: str) -> bool:
+        """Download one row; returns False if it was skipped without a request."""
+        frag = rec.pdf_link
+        if not frag:
+            return False
+
+        # ✅ Skip if already downloaded
+        if not self._wants(frag, frm, to):
+            return False
+
+        # 1) Download PDF
+        lp = self.default_pdf_payload()
+        lp.update({"path": frag, "val": idx, "app_token": self.app_token or ""})
+        r2 = self.request_api("POST", PDF_LINK_URL, lp)
+        self._download_pdf(self.session, r2.json().get("outputfile"), frag, frm, to)
+
+        self._save_and_upload(rec, frm, to)
+        self._row_done(frag, frm, to)
+        return True
+
+# ─── Command Line ──────────────────────────────────────────────────────────────
+
+def add_run_arguments(p: argparse.ArgumentParser):
+    """How to download (engine, limits, storage, metrics); shared with cli.py."""
+    p.add_argument("--max_workers", type=int, default=4,
+                   help="Parallel threads (or concurrent tasks with --engine async); with "
+                        "--adaptive, the concurrency the limits start from")
+    p.add_argument("--engine", choices=["thread", "pipeline", "async"], default="thread",
+                   help="Download engine: one Downloader per thread, threaded stages joined "
+                        "by bounded queues, or asyncio over a shared pool")
+    p.add_argument("--max_in_flight", type=int, default=32,
+                   help="Async engine: global limit on requests in flight "
+                        "(with --adaptive: ceiling of the per-host limit, any engine)")
+    p.add_argument("--per_court_in_flight", type=int, default=4,
+                   help="Async engine: per-court limit on requests in flight "
+                        "(with --adaptive: ceiling of the per-court limit, any engine)")
+    p.add_argument("--per_court_tasks", type=int, default=0,
+                   help="Max tasks (windows) of one court running at once; the rest of the "
+                        "workers go to other courts (0 = no cap)")
+    p.add_argument("--order", choices=list(ORDERS), default="oldest",
+                   help="Which of a court's windows run first: newest (recent) or oldest; "
+                        "courts are interleaved either way")
+    p.add_argument("--rate", type=float, default=0,
+                   help="Max portal requests/s across the run (token bucket; 0 = unlimited)")
+    p.add_argument("--court_rate", type=float, default=0,
+                   help="Max portal requests/s per court (0 = unlimited)")
+    p.add_argument("--adaptive", action="store_true",
+                   help="AIMD concurrency: widen while responses are healthy (up to "
+                        "--max_in_flight / --per_court_in_flight), halve on timeouts, expiries, "
+                        "errormsg replies and HTML-for-PDF; worker pools are sized for the ceiling")
+    p.add_argument("--latency_target", type=float, default=0,
+                   help="With --adaptive: responses slower than this (s) count as congestion")
+    p.add_argument("--resolve_workers", type=int, default=2,
+                   help="Pipeline engine: link-resolve threads")
+    p.add_argument("--fetch_workers", type=int, default=4,
+                   help="Pipeline engine: PDF fetch threads")
+    p.add_argument("--upload_workers", type=int, default=4,
+                   help="Pipeline engine: GCS upload threads")
+    p.add_argument("--queue_size", type=int, default=64,
+                   help="Pipeline engine: bound on each stage's queue")
+    p.add_argument("--session_pool", type=int, default=0,
+                   help="Keep N authenticated portal sessions warm and share them "
+                        "across tasks (thread/pipeline engines; 0 = off)")
+    p.add_argument("--no-index", dest="use_index", action="store_false",
+                   help="Detect downloaded judgments by stat()ing the window's metadata path "
+                        "instead of the persistent index")
+    p.add_argument("--storage", choices=["files", "segments"], default="files",
+                   help="files: a PDF and a metadata JSON per judgment; segments: PDFs "
+                        "appended to large per-court/year segments with a JSONL of metadata "
+                        "each (random access via the index; see segment_store.py)")
+    p.add_argument("--segment_mb", type=int, default=1024,
+                   help="With --storage segments: seal and upload a segment past this size")
+    p.add_argument("--dedupe", action="store_true",
+                   help="Store each distinct PDF once, named by its sha256, locally "
+                        "(ecourts-data/cas/) and in GCS (pdf/sha256/); metadata points at the hash")
+    p.add_argument("--no-local-copy", dest="local_copy", action="store_false",
+                   help="Stream PDFs straight to GCS (resumable upload) without writing them locally")
+    p.add_argument("--no-upload", dest="upload", action="store_false",
+                   help="Keep files local only; never create a GCS client")
+    p.add_argument("--metrics_port", type=int, default=0,
+                   help="Serve Prometheus metrics on this port at /metrics (0 = off)")
+    p.add_argument("--metrics_dump", type=Path, default=None,
+                   help="Write a JSON metrics snapshot to this file every --metrics_interval s")
+    p.add_argument("--metrics_interval", type=float, default=60,
+                   help="Seconds between metrics dumps")
+
+def run_options(args: argparse.Namespace) -> Dict:
+    """run() keyword arguments for the options add_run_arguments() defines."""
+    return dict(
+        workers=args.max_workers, engine=args.engine, max_in_flight=args.max_in_flight,
+        per_court_in_flight=args.per_court_in_flight,
+        per_court_tasks=args.per_court_tasks, order=args.order,
+        stage_workers={"resolve": args.resolve_workers, "fetch": args.fetch_workers,
+                       "upload": args.upload_workers},
+        queue_size=args.queue_size, upload=args.upload, session_pool=args.session_pool,
+        use_index=args.use_index, local_copy=args.local_copy,
+        storage=args.storage, segment_mb=args.segment_mb, dedupe=args.dedupe,
+        metrics_port=args.metrics_port, metrics_dump=args.metrics_dump,
+        metrics_interval=args.metrics_interval, rate=args.rate, court_rate=args.court_rate,
+        adaptive=args.adaptive, latency_target=args.latency_target)
+
 # ─── Main Entrypoint ───────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
+    # Engines import `download`; make that resolve to this module rather than
+    # re-executing the file (and its module-level setup) a second time.
+    sys.modules.setdefault("download", sys.modules[__name__])
+
     p = argparse.ArgumentParser(description="Download e-Court judgments and push to GCS")
-    p.add_argument("--court_codes", required=True,
-                   help="Comma-separated codes, e.g. '9~13,27~1,19~16,18~6'")
+    p.add_argument("--court_codes",
+                   help="Comma-separated codes, e.g. '9~13,27~1,19~16,18~6' "
+                        "(required unless --queue_join)")
     p.add_argument("--start_date", type=str, default=None,
-                   help="YYYY-MM-DD start (falls back to track.json)")
+                   help="YYYY-MM-DD start (default: every window not yet marked done "
+                        "in progress.db since START_DATE)")
     p.add_argument("--end_date", type=str, default=None,
                    help="YYYY-MM-DD end (optional)")
     p.add_argument("--day_step", type=int, default=1,
                    help="Days per batch")
-    p.add_argument("--max_workers", type=int, default=4,
-                   help="Parallel threads")
+    p.add_argument("--plan_target", type=int, default=0,
+                   help="Probe result counts and split/merge windows to about this many "
+                        "judgments per task (0 = fixed --day_step windows)")
+    p.add_argument("--plan_span", type=int, default=31,
+                   help="With --plan_target: days per initial probe window")
+    p.add_argument("--rescan", action="store_true",
+                   help="Re-search windows already marked done in progress.db")
+    p.add_argument("--retry-failed", dest="retry_failed", action="store_true",
+                   help="Only redo what failed.db recorded: failed windows in full, and "
+                        "failed rows of otherwise-finished windows")
+    p.add_argument("--queue", type=Path, default=None,
+                   help="Shared work-queue file (e.g. on a shared volume): enqueue this run's "
+                        "windows there and drain it together with every other node using it")
+    p.add_argument("--queue_join", action="store_true",
+                   help="With --queue: don't enqueue anything, just work on queued tasks")
+    p.add_argument("--lease_seconds", type=float, default=300,
+                   help="With --queue: how long a claimed task stays leased without a "
+                        "heartbeat before another node may take it over")
+    add_run_arguments(p)
     args = p.parse_args()
 
-    codes = [c.strip() for c in args.court_codes.split(",")]
-    run(codes, args.start_date, args.end_date, args.day_step, args.max_workers)
+    if not (args.court_codes or args.queue_join):
+        p.error("--court_codes is required")
+    codes = [c.strip() for c in (args.court_codes or "").split(",") if c.strip()]
+    try:
+        run(codes, args.start_date, args.end_date, args.day_step,
+            rescan=args.rescan, plan_target=args.plan_target, plan_span=args.plan_span,
+            retry_failed=args.retry_failed, queue=args.queue, queue_join=args.queue_join,
+            lease_seconds=args.lease_seconds, **run_options(args))
+    except Shutdown:
+        sys.exit(130)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# download_index.py
+#
+# Persistent index of downloaded judgments, keyed by the portal's pdf_link
+# fragment (independent of the {frm}_{to} window a file was saved under).
+# SQLite in WAL mode; one shared connection guarded by a lock so every
+# Downloader thread can use the same index. Judgments packed into segments
+# (segment_store.py) have local_path = the segment, pdf_offset/size = where
+# the PDF sits in it, and meta_path = the segment's .jsonl.
+#
+#   python download_index.py --rebuild [--hash]   # rebuild from ecourts-data/
+
+import argparse
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from segment_store import iter_metadata
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS judgments (
+    pdf_link   TEXT PRIMARY KEY,
+    court_code TEXT,
+    local_path TEXT,
+    meta_path  TEXT,
+    size       INTEGER,
+    sha256     TEXT,
+    gcs_key    TEXT,
+    updated    REAL,
+    pdf_offset INTEGER
+);
+CREATE INDEX IF NOT EXISTS judgments_sha256 ON judgments(sha256);
+"""
+
+FIELDS = ("court_code", "local_path", "meta_path", "size", "sha256", "gcs_key", "pdf_offset")
+
+# Fields passed as None keep their stored value.
+UPSERT = (
+    f"INSERT INTO judgments (pdf_link, {', '.join(FIELDS)}, updated) "
+    f"VALUES (?, {', '.join('?' for _ in FIELDS)}, ?) "
+    f"ON CONFLICT(pdf_link) DO UPDATE SET "
+    + ", ".join(f"{f} = COALESCE(excluded.{f}, {f})" for f in FIELDS)
+    + ", updated = excluded.updated"
+)
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DownloadIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.created = not self.path.exists()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        cols = {r[1] for r in self._db.execute("PRAGMA table_info(judgments)")}
+        if "pdf_offset" not in cols:  # indexes created before packed storage
+            self._db.execute("ALTER TABLE judgments ADD COLUMN pdf_offset INTEGER")
+
+    @classmethod
+    def open(cls, path: Path, root: Optional[Path] = None) -> "DownloadIndex":
+        """Open the index, seeding a brand-new one from an existing `root` tree."""
+        idx = cls(path)
+        if idx.created and root is not None and Path(root).exists():
+            logger.info(f"New download index; rebuilding from {root}")
+            idx.rebuild(root)
+        return idx
+
+    def contains(self, pdf_link: str) -> bool:
+        """
+        Whether the judgment is fully stored. The PDF's entry is recorded as it
+        lands, before its metadata is saved; until meta_path is set too (e.g.
+        after a crash in between) the judgment still counts as not downloaded.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM judgments WHERE pdf_link = ? "
+                                   "AND meta_path IS NOT NULL", (pdf_link,)).fetchone()
+        return row is not None
+
+    def get(self, pdf_link: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(FIELDS)} FROM judgments WHERE pdf_link = ?",
+                (pdf_link,)).fetchone()
+        return dict(zip(FIELDS, row)) if row else None
+
+    @staticmethod
+    def _row(pdf_link: str, fields: Dict) -> tuple:
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown index fields: {unknown}")
+        vals = [fields.get(f) for f in FIELDS]
+        vals = [str(v) if isinstance(v, Path) else v for v in vals]
+        return (pdf_link, *vals, time.time())
+
+    def record(self, pdf_link: str, **fields):
+        """Insert or update an entry; fields left as None keep their stored value."""
+        row = self._row(pdf_link, fields)
+        with self._lock, self._db:
+            self._db.execute(UPSERT, row)
+
+    def record_many(self, entries):
+        """Like record() for an iterable of (pdf_link, fields) in one transaction."""
+        rows = [self._row(frag, fields) for frag, fields in entries]
+        with self._lock, self._db:
+            self._db.executemany(UPSERT, rows)
+
+    def has_gcs_copy(self, sha256: str, gcs_key: str) -> bool:
+        """Whether any judgment with this content is recorded as uploaded to `gcs_key`."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM judgments WHERE sha256 = ? AND gcs_key = ? LIMIT 1",
+                (sha256, gcs_key)).fetchone()
+        return row is not None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM judgments").fetchone()[0]
+
+    def rebuild(self, root: Path, hash_files: bool = False) -> int:
+        """Re-create entries from the metadata JSONs and packed segments under `root`."""
+        n = 0
+        batch = []
+        for meta_path in Path(root).glob("**/*.json"):
+            try:
+                meta = json.loads(meta_path.read_text())
+            except (OSError, ValueError):
+                logger.warning(f"Unreadable metadata: {meta_path}")
+                continue
+            frag = meta.get("pdf_link") if isinstance(meta, dict) else None
+            if not frag:
+                continue
+            # Deduplicated PDFs live at their content path (content_store.py).
+            pdf_path = Path(meta["pdfpath"]) if meta.get("pdfpath") else meta_path.with_suffix(".pdf")
+            pdf = pdf_path if pdf_path.exists() else None
+            batch.append((frag, {
+                "court_code": meta.get("court_code"),
+                "meta_path": meta_path,
+                "local_path": pdf,
+                "size": pdf.stat().st_size if pdf else None,
+                "sha256": meta.get("sha256") or (file_sha256(pdf) if pdf and hash_files else None),
+                "gcs_key": meta.get("pdfpathgcs"),
+            }))
+            n += 1
+            if len(batch) >= 1000:
+                self.record_many(batch)
+                batch = []
+        for jsonl, meta in iter_metadata(root):
+            if not meta.get("pdf_link"):
+                continue
+            packed = meta.get("offset") is not None
+            batch.append((meta["pdf_link"], {
+                "court_code": meta.get("court_code"),
+                "meta_path": jsonl,
+                "local_path": jsonl.with_suffix(".pdfs") if packed else None,
+                "pdf_offset": meta.get("offset"),
+                "size": meta.get("length"),
+                "sha256": meta.get("sha256"),
+            }))
+            n += 1
+            if len(batch) >= 1000:
+                self.record_many(batch)
+                batch = []
+        self.record_many(batch)
+        logger.info(f"Indexed {n} judgments from {root}")
+        return n
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    p = argparse.ArgumentParser(description="Manage the downloaded-judgments index")
+    p.add_argument("--index", default="ecourts-data/index.sqlite")
+    p.add_argument("--root", default="ecourts-data")
+    p.add_argument("--rebuild", action="store_true",
+                   help="(Re)index every metadata JSON under --root")
+    p.add_argument("--hash", action="store_true",
+                   help="With --rebuild, also hash each PDF (slow)")
+    args = p.parse_args()
+
+    idx = DownloadIndex(args.index)
+    if args.rebuild:
+        idx.rebuild(Path(args.root), hash_files=args.hash)
+    print(f"{idx.count()} judgments in {args.index}")
+    idx.close()
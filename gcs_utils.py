@@ -1,21 +1,181 @@
 # gcs_utils.py
+#
+# Set STORAGE_EMULATOR_HOST (e.g. http://localhost:4443 for fake-gcs-server)
+# to run everything here against a local fake GCS with anonymous credentials.
 
-from google.cloud import storage
+import base64
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
 
 # ── CONFIGURE YOUR BUCKET HERE ───────────────────────────────────────────────
 GCS_BUCKET_NAME = "legal-data-bucket" 
 
-# Initialize client and bucket once
-_client = storage.Client()
-_bucket = _client.bucket(GCS_BUCKET_NAME)
+# Resumable-upload chunk; must be a multiple of 256 KiB.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Client and bucket are created once, on first upload, so importing this module
+# (and runs with --no-upload) never touch google-cloud-storage.
+_client = None
+_bucket = None
+_lock = threading.Lock()
+
+def get_bucket():
+    global _client, _bucket
+    with _lock:
+        if _bucket is None:
+            from google.cloud import storage
+            if os.environ.get("STORAGE_EMULATOR_HOST"):
+                from google.auth.credentials import AnonymousCredentials
+                _client = storage.Client(project="local", credentials=AnonymousCredentials())
+            else:
+                _client = storage.Client()
+            _bucket = _client.bucket(GCS_BUCKET_NAME)
+        return _bucket
 
 def upload_to_gcs(local_path: str, dest_path: str) -> str:
     """
     Upload `local_path` to gs://<GCS_BUCKET_NAME>/<dest_path>
     Returns the public URL of the uploaded object.
     """
-    blob = _bucket.blob(dest_path)
-    blob.upload_from_filename(local_path)
+    blob = get_bucket().blob(dest_path)
+    with metrics.GCS_UPLOAD_SECONDS.time(content_type="", outcome="uploaded"):
+        blob.upload_from_filename(local_path)
     # If you want the object to be publicly readable, uncomment next line:
     # blob.make_public()
     return blob.public_url
+
+def open_gcs_writer(dest_path: str, content_type: str = "application/pdf"):
+    """
+    Writable file object streaming to gs://<GCS_BUCKET_NAME>/<dest_path> via a
+    resumable upload, buffering one chunk at a time; close() finalises it.
+    """
+    blob = get_bucket().blob(dest_path)
+    return blob.open("wb", content_type=content_type, chunk_size=UPLOAD_CHUNK_SIZE)
+
+def gcs_public_url(dest_path: str) -> str:
+    return get_bucket().blob(dest_path).public_url
+
+# ── Batched uploader ─────────────────────────────────────────────────────────
+
+# HTTP statuses worth retrying; 412 means another writer raced us, so the
+# existence check is simply redone.
+_RETRY_CODES = {408, 412, 429, 500, 502, 503, 504}
+
+def _retryable(e: Exception) -> bool:
+    code = getattr(e, "code", None)
+    if isinstance(code, int):
+        return code in _RETRY_CODES
+    # requests/urllib3 connection errors and timeouts are OSErrors.
+    return isinstance(e, OSError)
+
+def file_md5_b64(path: str) -> str:
+    """MD5 of a file in the base64 form GCS reports as `md5_hash`."""
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return base64.b64encode(h.digest()).decode()
+
+class GCSUploader:
+    """
+    Concurrent uploads over the shared client. Objects already present with
+    the same MD5 are skipped; writes carry a generation precondition so a
+    concurrent writer is detected, and transient failures are retried with
+    jittered exponential backoff. submit() returns a Future; flush() waits for
+    everything submitted so far; close() flushes and stops the workers.
+    """
+
+    def __init__(self, workers: int = 8, retries: int = 5, backoff: float = 0.5,
+                 max_backoff: float = 30.0, skip_existing: bool = True):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.skip_existing = skip_existing
+        self.uploaded = 0
+        self.skipped = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gcs-upload")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, local_path: str, dest_path: str,
+               content_type: Optional[str] = None) -> Future:
+        fut = self._pool.submit(self.upload, str(local_path), dest_path, content_type)
+        with self._lock:
+            self._pending.add(fut)
+        fut.add_done_callback(self._done)
+        return fut
+
+    def _done(self, fut: Future):
+        with self._lock:
+            self._pending.discard(fut)
+
+    def upload(self, local_path: str, dest_path: str,
+               content_type: Optional[str] = None) -> str:
+        """Blocking upload with skip-if-identical and retries; returns the public URL."""
+        started = time.perf_counter()
+        outcome = "failed"
+        try:
+            url, outcome = self._upload(local_path, dest_path, content_type)
+            return url
+        finally:
+            metrics.GCS_UPLOAD_SECONDS.observe(time.perf_counter() - started,
+                                               content_type=content_type or "", outcome=outcome)
+
+    def _upload(self, local_path: str, dest_path: str, content_type: Optional[str]):
+        bucket = get_bucket()
+        md5 = file_md5_b64(local_path) if self.skip_existing else None
+        attempt = 0
+        while True:
+            try:
+                kwargs = {}
+                if self.skip_existing:
+                    existing = bucket.get_blob(dest_path)
+                    if existing is not None and existing.md5_hash == md5:
+                        with self._lock:
+                            self.skipped += 1
+                        return existing.public_url, "skipped"
+                    # Create-only, or replace exactly the generation we looked at.
+                    kwargs["if_generation_match"] = existing.generation if existing else 0
+                blob = bucket.blob(dest_path)
+                blob.upload_from_filename(local_path, content_type=content_type, **kwargs)
+                with self._lock:
+                    self.uploaded += 1
+                return blob.public_url, "uploaded"
+            except Exception as e:
+                attempt += 1
+                if attempt > self.retries or not _retryable(e):
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.0)
+                metrics.GCS_UPLOAD_RETRIES.inc(content_type=content_type or "")
+                logger.warning(f"Upload of {dest_path} failed ({e}); retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def flush(self) -> int:
+        """Wait for all submitted uploads; returns how many of them failed."""
+        with self._lock:
+            pending = list(self._pending)
+        done, _ = wait(pending)
+        return sum(1 for f in done if f.exception() is not None)
+
+    def close(self):
+        failed = self.flush()
+        self._pool.shutdown(wait=True)
+        logger.info(f"GCS uploader: {self.uploaded} uploaded, {self.skipped} skipped, "
+                    f"{failed} failed in last flush")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
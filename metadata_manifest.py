@@ -0,0 +1,112 @@
+# metadata_manifest.py
+#
+# Manifest of the metadata JSONs already consolidated by process_metadata.py.
+# Each source file is remembered by (path, mtime_ns, size) together with the
+# pdf_link it produced and the run that processed it, so an incremental run
+# only parses files that are new or changed and can emit tombstones for
+# files that changed or disappeared. SQLite, stored next to the output.
+
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path      TEXT PRIMARY KEY,
+    mtime_ns  INTEGER NOT NULL,
+    size      INTEGER NOT NULL,
+    pdf_link  TEXT,
+    run       INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run       INTEGER PRIMARY KEY,
+    started   REAL NOT NULL,
+    finished  REAL NOT NULL,
+    processed INTEGER NOT NULL,
+    deleted   INTEGER NOT NULL
+);
+"""
+
+# (relative path, pdf_link it produced last time)
+Entry = Tuple[str, Optional[str]]
+
+
+class Diff:
+    def __init__(self):
+        self.todo: List[Path] = []               # new or changed files to parse
+        self.stats: Dict[str, tuple] = {}        # str(file) -> (rel, mtime_ns, size)
+        self.changed: List[Entry] = []
+        self.deleted: List[Entry] = []
+        self.unchanged = 0
+
+
+class Manifest:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def reset(self):
+        """
+        Forget every file and run. A full rebuild starts again at run 0, so
+        the caller also clears what earlier runs wrote.
+        """
+        with self._db:
+            self._db.execute("DELETE FROM files")
+            self._db.execute("DELETE FROM runs")
+
+    def next_run(self) -> int:
+        last = self._db.execute("SELECT MAX(run) FROM runs").fetchone()[0]
+        return 0 if last is None else last + 1
+
+    def diff(self, root: Path, files: Iterable[Path]) -> Diff:
+        """Compare the files now under `root` with what the manifest has seen."""
+        known = {
+            path: (mtime_ns, size, link)
+            for path, mtime_ns, size, link in self._db.execute(
+                "SELECT path, mtime_ns, size, pdf_link FROM files")
+        }
+        d = Diff()
+        for file in files:
+            st = os.stat(file)
+            rel = os.path.relpath(file, root)
+            d.stats[str(file)] = (rel, st.st_mtime_ns, st.st_size)
+            prev = known.pop(rel, None)
+            if prev is None:
+                d.todo.append(file)
+            elif prev[:2] != (st.st_mtime_ns, st.st_size):
+                d.todo.append(file)
+                d.changed.append((rel, prev[2]))
+            else:
+                d.unchanged += 1
+        d.deleted = [(rel, link) for rel, (_, _, link) in sorted(known.items())]
+        return d
+
+    def commit(self, run: int, started: float, diff: Diff,
+               done: Iterable[Tuple[str, Optional[str]]]):
+        """
+        Record a finished run: `done` is (str(file), pdf_link) for every file
+        parsed successfully; files that failed keep their old entry and are
+        retried next time.
+        """
+        rows = []
+        for file, link in done:
+            rel, mtime_ns, size = diff.stats[file]
+            rows.append((rel, mtime_ns, size, link, run))
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, pdf_link, run) "
+                "VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.executemany("DELETE FROM files WHERE path = ?",
+                                 [(rel,) for rel, _ in diff.deleted])
+            self._db.execute(
+                "INSERT OR REPLACE INTO runs (run, started, finished, processed, deleted) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (run, started, time.time(), len(rows), len(diff.deleted)))
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,266 @@
+# metrics.py
+#
+# In-process counters and histograms for the scraper's hot paths, labelled
+# per court. Stdlib only: a MetricsExporter serves them in Prometheus text
+# format on /metrics and/or dumps a JSON snapshot every few seconds, so a slow
+# night can be pinned on captcha, the portal, the disk or GCS.
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels_text(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.label_names)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._series.items())
+        for key, v in items:
+            yield f"{self.name}{_labels_text(self.label_names, key)} {v}"
+
+    def snapshot(self):
+        with self._lock:
+            return [{"labels": dict(zip(self.label_names, k)), "value": v}
+                    for k, v in sorted(self._series.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                # [per-bucket counts..., +Inf count], sum
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            i = 0
+            while i < len(self.buckets) and value > self.buckets[i]:
+                i += 1
+            s[0][i] += 1
+            s[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t, **labels)
+
+    def _cumulative(self):
+        with self._lock:
+            items = [(k, list(s[0]), s[1]) for k, s in sorted(self._series.items())]
+        for key, counts, total in items:
+            cum, acc = [], 0
+            for c in counts:
+                acc += c
+                cum.append(acc)
+            yield key, cum, total
+
+    def render(self):
+        les = [repr(b) for b in self.buckets] + ["+Inf"]
+        for key, cum, total in self._cumulative():
+            for le, c in zip(les, cum):
+                le_label = f'le="{le}"'
+                yield f"{self.name}_bucket{_labels_text(self.label_names, key, le_label)} {c}"
+            yield f"{self.name}_sum{_labels_text(self.label_names, key)} {total}"
+            yield f"{self.name}_count{_labels_text(self.label_names, key)} {cum[-1]}"
+
+    def snapshot(self):
+        les = [str(b) for b in self.buckets] + ["+Inf"]
+        return [{"labels": dict(zip(self.label_names, key)), "count": cum[-1], "sum": total,
+                 "buckets": dict(zip(les, cum))}
+                for key, cum, total in self._cumulative()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {"time": time.time(),
+                "metrics": {m.name: {"type": m.kind, "help": m.help, "series": m.snapshot()}
+                            for m in metrics}}
+
+
+REGISTRY = Registry()
+
+# ── Scraper metrics ──────────────────────────────────────────────────────────
+
+INIT_SESSION_SECONDS = REGISTRY.histogram(
+    "ecourts_init_session_seconds", "Time to open (or lease) a portal session", ["court"])
+CAPTCHA_HTTP_SECONDS = REGISTRY.histogram(
+    "ecourts_captcha_http_seconds", "Captcha image download time", ["court"])
+CAPTCHA_OCR_SECONDS = REGISTRY.histogram(
+    "ecourts_captcha_ocr_seconds", "Captcha OCR time (including batching wait)", ["court"])
+CAPTCHA_SOLVES = REGISTRY.counter(
+    "ecourts_captcha_solves_total", "Captcha images read, by result", ["court", "result"])
+TOKEN_REFRESHES = REGISTRY.counter(
+    "ecourts_token_refreshes_total", "app_token refreshes via checkCaptcha", ["court"])
+API_REQUEST_SECONDS = REGISTRY.histogram(
+    "ecourts_api_request_seconds", "Portal API request time", ["court", "endpoint"])
+API_RETRIES = REGISTRY.counter(
+    "ecourts_api_retries_total", "Portal API requests repeated, by reason",
+    ["court", "endpoint", "reason"])
+PDF_FETCH_SECONDS = REGISTRY.histogram(
+    "ecourts_pdf_fetch_seconds", "PDF download time, excluding writes", ["court"])
+PDF_WRITE_SECONDS = REGISTRY.histogram(
+    "ecourts_pdf_write_seconds", "Time spent writing PDF chunks to disk or GCS", ["court"])
+PDF_BYTES = REGISTRY.counter(
+    "ecourts_pdf_bytes_total", "PDF bytes stored", ["court"])
+PDF_DEDUPED = REGISTRY.counter(
+    "ecourts_pdf_deduplicated_total", "PDFs whose content was already stored, by the "
+    "write skipped", ["court", "skipped"])
+ROWS = REGISTRY.counter(
+    "ecourts_rows_total", "Search rows handled, by outcome", ["court", "outcome"])
+UPLOAD_WAIT_SECONDS = REGISTRY.histogram(
+    "ecourts_upload_wait_seconds", "Time a row waited for its GCS uploads", ["court"])
+GCS_UPLOAD_SECONDS = REGISTRY.histogram(
+    "ecourts_gcs_upload_seconds", "GCS upload time per object, by outcome",
+    ["content_type", "outcome"])
+GCS_UPLOAD_RETRIES = REGISTRY.counter(
+    "ecourts_gcs_upload_retries_total", "GCS upload attempts retried", ["content_type"])
+
+
+# ── Export ───────────────────────────────────────────────────────────────────
+
+class MetricsExporter:
+    def __init__(self, registry: Registry = REGISTRY, port: int = 0,
+                 dump_path: Optional[Path] = None, interval: float = 60, host: str = "0.0.0.0"):
+        """
+        Serve `registry` on http://<host>:<port>/metrics (port 0 = off) and/or
+        write its JSON snapshot to `dump_path` every `interval` seconds and on
+        close().
+        """
+        self.registry = registry
+        self.dump_path = Path(dump_path) if dump_path else None
+        self.interval = interval
+        self._stop = threading.Event()
+        self._server = None
+        self._dumper = None
+        if port:
+            self._server = ThreadingHTTPServer((host, port), self._handler())
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, name="metrics-http",
+                             daemon=True).start()
+            logger.info(f"Serving metrics on :{port}/metrics")
+        if self.dump_path:
+            self._dumper = threading.Thread(target=self._dump_loop, name="metrics-dump",
+                                            daemon=True)
+            self._dumper.start()
+
+    def _handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics":
+                    body, ctype = registry.render().encode(), "text/plain; version=0.0.4"
+                elif self.path.split("?")[0] == "/metrics.json":
+                    body, ctype = json.dumps(registry.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def dump(self):
+        tmp = self.dump_path.with_name(self.dump_path.name + ".tmp")
+        tmp.write_text(json.dumps(self.registry.snapshot(), indent=2))
+        os.replace(tmp, self.dump_path)
+
+    def _dump_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except OSError as e:
+                logger.error(f"Metrics dump failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._dumper:
+            self._dumper.join(timeout=5)
+            self.dump()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,95 @@
+# pdf_stream.py
+#
+# Chunked PDF sink used by every download engine. The %PDF magic is checked
+# on the first bytes, the body is hashed as it streams, and chunks go to a
+# local .part file (renamed into place on commit) and/or a remote writer such
+# as a GCS resumable upload — the whole PDF is never held in memory.
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+
+CHUNK_SIZE = 64 * 1024
+
+# The portal sometimes pads the PDF with whitespace; look this far for %PDF.
+_MAX_HEAD = 1024
+
+
+class NotAPdf(Exception):
+    pass
+
+
+class PdfSink:
+    def __init__(self, path: Optional[Path] = None, remote=None):
+        """
+        `path`: local destination (written via `<path>.part`); `remote`: a
+        writable file object, closed on commit. At least one is required.
+        """
+        if path is None and remote is None:
+            raise ValueError("PdfSink needs a local path or a remote writer")
+        self.path = Path(path) if path else None
+        self.remote = remote
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self._checked = False
+        self._fh = None
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def _part(self) -> Path:
+        return self.path.with_name(self.path.name + ".part")
+
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+        if not self._checked:
+            self._head += chunk
+            head = self._head.lstrip()
+            if len(head) < 4 and len(self._head) < _MAX_HEAD:
+                return
+            self._check(head)
+            chunk, self._head = self._head, b""
+        self._emit(chunk)
+
+    def _emit(self, chunk: bytes):
+        if self._fh is not None:
+            self._fh.write(chunk)
+        if self.remote is not None:
+            self.remote.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def _check(self, head: bytes):
+        if not head.startswith(b"%PDF"):
+            raise NotAPdf()
+        self._checked = True
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True, mode=0o755)
+            self._fh = open(self._part, "wb")
+
+    def commit(self):
+        if not self._checked:
+            # Body shorter than the probe window: judge what we have.
+            self._check(self._head.lstrip())
+            chunk, self._head = self._head, b""
+            self._emit(chunk)
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+            os.replace(self._part, self.path)
+            self.path.chmod(0o644)
+        if self.remote is not None:
+            self.remote.close()
+
+    def abort(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+            self._part.unlink(missing_ok=True)
+        # An unfinished resumable upload is simply never finalised.
+        self.remote = None
@@ -0,0 +1,98 @@
+# pipeline.py
+#
+# Minimal thread-based producer/consumer pipeline: each Stage has its own
+# worker threads and a bounded input queue, so a slow stage (e.g. GCS upload)
+# applies backpressure upstream instead of stalling unrelated work.
+
+import logging
+import queue
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable, workers: int = 1, maxsize: int = 64):
+        """
+        `fn(item)` returns the item to hand to the next stage, or None to drop it.
+        """
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._alive = 0
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    def __init__(self, stages: list[Stage], on_exit: Optional[Callable] = None):
+        """
+        `on_exit(item)` is called once for every item that leaves the pipeline,
+        whether it finished the last stage, was dropped or failed.
+        """
+        self.stages = stages
+        self.on_exit = on_exit
+        self._threads = []
+
+    def start(self):
+        for i, stage in enumerate(self.stages):
+            stage._alive = stage.workers
+            for n in range(stage.workers):
+                t = threading.Thread(target=self._work, args=(i,),
+                                     name=f"{stage.name}-{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        return self
+
+    def put(self, item):
+        """Feed the first stage; blocks while it is full."""
+        self.stages[0].queue.put(item)
+
+    def close(self):
+        """Stop accepting work, drain every stage in order and join the workers."""
+        first = self.stages[0]
+        for _ in range(first.workers):
+            first.queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+
+    def _exit(self, item):
+        if self.on_exit:
+            try:
+                self.on_exit(item)
+            except Exception:
+                logger.error("Pipeline exit hook failed:", exc_info=True)
+
+    def _work(self, i: int):
+        stage = self.stages[i]
+        nxt = self.stages[i + 1] if i + 1 < len(self.stages) else None
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                break
+            try:
+                out = stage.fn(item)
+            except Exception:
+                logger.error(f"Stage {stage.name} failed:", exc_info=True)
+                out = None
+            if out is None or nxt is None:
+                self._exit(item)
+            else:
+                nxt.queue.put(out)
+
+        # Last worker out of this stage stops the next one.
+        with stage._lock:
+            stage._alive -= 1
+            last = stage._alive == 0
+        if last and nxt is not None:
+            for _ in range(nxt.workers):
+                nxt.queue.put(_STOP)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,69 @@
+# planner.py
+#
+# Adaptive date-window planning. Instead of fixed --day_step windows, each
+# candidate window is probed for its result count (one 1-row search), dense
+# windows are halved until they fit `target` judgments and sparse neighbours
+# are merged back together, so every task carries a similar amount of work
+# and empty stretches cost no task at all.
+
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FMT = "%Y-%m-%d"
+
+Window = Tuple[str, str, Optional[int]]
+
+
+def _day(s: str) -> datetime:
+    return datetime.strptime(s, FMT)
+
+
+def _days(frm: str, to: str) -> int:
+    return (_day(to) - _day(frm)).days + 1
+
+
+def _next(s: str) -> str:
+    return (_day(s) + timedelta(days=1)).strftime(FMT)
+
+
+def split_window(count: Callable[[str, str], Optional[int]], frm: str, to: str,
+                 target: int) -> List[Window]:
+    """Halve [frm, to] until each piece holds at most `target` results (or one day)."""
+    try:
+        n = count(frm, to)
+    except Exception as e:
+        logger.warning(f"Count probe failed for {frm}->{to}: {e}")
+        n = None
+    if n is None or n <= target or _days(frm, to) <= 1:
+        return [(frm, to, n)]
+    mid = (_day(frm) + timedelta(days=_days(frm, to) // 2 - 1)).strftime(FMT)
+    return split_window(count, frm, mid, target) + split_window(count, _next(mid), to, target)
+
+
+def merge_windows(windows: Iterable[Window], target: int) -> List[Window]:
+    """Merge adjacent windows of known count while the total stays within `target`."""
+    out: List[Window] = []
+    for frm, to, n in windows:
+        if out:
+            p_frm, p_to, p_n = out[-1]
+            if (n is not None and p_n is not None and _next(p_to) == frm
+                    and p_n + n <= target):
+                out[-1] = (p_frm, to, p_n + n)
+                continue
+        out.append((frm, to, n))
+    return out
+
+
+def plan_windows(count: Callable[[str, str], Optional[int]],
+                 windows: Iterable[Tuple[str, str]], target: int) -> List[Window]:
+    """
+    Balanced (frm, to, count) windows covering `windows`. count is None where
+    the probe gave no answer; those windows are kept as they are.
+    """
+    leaves: List[Window] = []
+    for frm, to in windows:
+        leaves.extend(split_window(count, frm, to, target))
+    return merge_windows(leaves, target)
@@ -1,137 +1,270 @@
+import argparse
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import json
-import lxml.html as LH
 from tqdm import tqdm
-import pandas as pd
 import pyarrow as pa
 import pyarrow.parquet as pq
 
+from metadata_manifest import Manifest
+from row_parser import record_from_metadata
+
 src = Path("./data")
 
+# Columns stored in each Parquet file; court_code and year live in the
+# hive-style partition path (court_code=<code>/year=<yyyy>/). `run` is the
+# manifest run that wrote the row: a row is live unless _tombstones/ holds
+# its pdf_link with a later run.
+PARQUET_SCHEMA = pa.schema([
+    ("run", pa.int32()),
+    ("pdf_link", pa.string()),
+    ("cnr", pa.string()),
+    ("title", pa.string()),
+    ("description", pa.string()),
+    ("judge", pa.string()),
+    ("court", pa.string()),
+    ("date_of_registration", pa.string()),
+    ("decision_date", pa.string()),
+    ("disposal_nature", pa.string()),
+])
+# Low-cardinality columns that compress far better dictionary-encoded.
+DICTIONARY_FIELDS = ["court", "disposal_nature", "judge"]
+UNKNOWN_YEAR = "unknown"
+# Underscore-prefixed so Parquet dataset readers skip them.
+MANIFEST_NAME = "_manifest.sqlite"
+TOMBSTONE_DIR = "_tombstones"
+
+
+def load_metadata(file: Path | str) -> dict:
+    with open(file) as f:
+        return json.load(f)
+
+
+def parse_metadata(metadata: dict) -> dict | None:
+    """Flatten one metadata JSON into a record; None if it has nothing to parse."""
+    rec = record_from_metadata(metadata)
+    if rec is None:
+        return None
+    record = rec.as_dict()
+    record["court"] = record.pop("bench")  # the bench, under its original Parquet column
+    return {"court_code": metadata["court_code"], **record}
+
+
+def decision_year(date_s: str) -> str:
+    m = re.search(r"\b(\d{4})\b", date_s or "")
+    return m.group(1) if m else UNKNOWN_YEAR
+
+
+class ParquetBatchWriter:
+    """
+    Writes records into <out_dir>/court_code=<code>/year=<yyyy>/<part_name>.parquet.
+    Records are buffered per partition and a buffer is appended as a row group
+    once it reaches `row_group_size`; when all buffers together pass
+    `max_buffered` rows, the largest are flushed early, so memory stays
+    bounded however thinly the corpus spreads over partitions. At most
+    `max_open` writers stay open: the least recently written is closed, and
+    a partition written to again afterwards continues in a new file
+    (<part_name>-1.parquet, ...).
+    """
+
+    def __init__(self, out_dir, row_group_size=50_000, part_name="part-00000",
+                 max_buffered=200_000, max_open=64):
+        self.out_dir = Path(out_dir)
+        self.row_group_size = row_group_size
+        self.part_name = part_name
+        self.max_buffered = max_buffered
+        self.max_open = max_open
+        self._buffers = {}
+        self._buffered = 0
+        self._writers = OrderedDict()  # least recently written first
+        self._files = defaultdict(int)  # files started per partition
+
+    def write(self, record: dict):
+        key = (record.get("court_code") or "", decision_year(record.get("decision_date")))
+        buf = self._buffers.setdefault(key, [])
+        buf.append(record)
+        self._buffered += 1
+        if len(buf) >= self.row_group_size:
+            self._flush(key)
+        elif self._buffered > self.max_buffered:
+            self._spill()
+
+    def _spill(self):
+        """Flush the largest buffers until no more than half of `max_buffered` is left."""
+        for key in sorted(self._buffers, key=lambda k: len(self._buffers[k]), reverse=True):
+            if self._buffered <= self.max_buffered // 2:
+                break
+            self._flush(key)
+
+    def _flush(self, key):
+        buf = self._buffers.pop(key, None)
+        if not buf:
+            return
+        self._buffered -= len(buf)
+        writer = self._writers.pop(key, None)
+        if writer is None:
+            writer = self._open(key)
+        self._writers[key] = writer
+        table = pa.Table.from_pylist(buf, schema=PARQUET_SCHEMA)
+        writer.write_table(table, row_group_size=self.row_group_size)
+
+    def _open(self, key) -> pq.ParquetWriter:
+        while len(self._writers) >= self.max_open:
+            self._writers.popitem(last=False)[1].close()
+        court_code, year = key
+        n = self._files[key]
+        self._files[key] += 1
+        name = f"{self.part_name}-{n}" if n else self.part_name
+        path = self.out_dir / f"court_code={court_code}" / f"year={year}" / f"{name}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return pq.ParquetWriter(str(path), PARQUET_SCHEMA, compression="zstd",
+                                use_dictionary=DICTIONARY_FIELDS)
+
+    def close(self):
+        for key in list(self._buffers):
+            self._flush(key)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = OrderedDict()
+
+
+def process_chunk(files: list) -> tuple:
+    """
+    Worker: parse a shard of files → (records, files_without_raw_html, errors,
+    done), `done` being (str(file), pdf_link) for every file read successfully.
+    """
+    records, without_rh, errors, done = [], 0, [], []
+    for file in files:
+        try:
+            rec = parse_metadata(load_metadata(file))
+        except Exception as e:
+            errors.append(f"Error processing {file}: {e}")
+            continue
+        if rec is None:
+            without_rh += 1
+            done.append((str(file), None))
+        else:
+            records.append(rec)
+            done.append((str(file), rec["pdf_link"]))
+    return records, without_rh, errors, done
+
+
+def ordered_imap(pool, fn, items, window: int):
+    """Like pool.map, but with at most `window` shards in flight (results stay in input order)."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def chunked(iterable, size: int):
+    chunk = []
+    for x in iterable:
+        chunk.append(x)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 
 class MetadataProcessor:
-    def __init__(self, src, batch_size=5000):
-        self.src = src
+    def __init__(self, src, batch_size=5000, workers=1, chunk_size=500,
+                 output_path="processed_metadata", output_format="json",
+                 row_group_size=50_000, incremental=False, max_buffered=200_000):
+        self.src = Path(src)
         self.without_rh = 0
-        self.output_path = "processed_metadata.json"  # Ensure this is .json for JSON output
+        self.output_path = output_path
         self.record_count = 0
         self.batch_size = batch_size
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.output_format = output_format
+        self.row_group_size = row_group_size
+        self.max_buffered = max_buffered
+        self.incremental = incremental
+        self.parquet = None
+        self.run = 0
 
         # Buffer to hold records before writing
         self.record_buffer = []
 
-        # List to hold all records if you want a single file
-        self.all_records = []
-
     def get_metadata_files(self):
-        for file in self.src.glob("**/*.json"):
-            yield file
+        # Sorted so batch contents and numbering don't depend on directory order.
+        return sorted(self.src.glob("**/*.json"))
 
     def process(self):
+        started = time.time()
+        manifest = Manifest(Path(self.output_path) / MANIFEST_NAME)
         try:
-            for file in tqdm(self.get_metadata_files()):
-                try:
-                    metadata = self.load_metadata(file)
-                    processed = self.process_metadata(metadata)
-                    if processed:  # Only add if we got valid data
-                        self.add_record(processed)
-                except Exception as e:
-                    print(f"Error processing {file}: {e}")
-
-            # Write any remaining records in the buffer
-            if self.record_buffer:
-                self.write_json_batch()
-
+            if not self.incremental:
+                manifest.reset()
+                self.clear_output()
+            self.run = manifest.next_run()
+            diff = manifest.diff(self.src, self.get_metadata_files())
+            print(f"Run {self.run}: {len(diff.todo)} new/changed, "
+                  f"{len(diff.deleted)} deleted, {diff.unchanged} unchanged files")
+
+            if self.output_format == "parquet":
+                self.parquet = ParquetBatchWriter(self.output_path, self.row_group_size,
+                                                  part_name=f"part-{self.run:05d}",
+                                                  max_buffered=self.max_buffered)
+            done = []
+            try:
+                with tqdm(total=len(diff.todo)) as bar:
+                    for records, without_rh, errors, seen in self._parsed_chunks(diff.todo):
+                        for err in errors:
+                            print(err)
+                        self.without_rh += without_rh
+                        done.extend(seen)
+                        for rec in records:
+                            self.add_record(rec)
+                        bar.update(len(seen) + len(errors))
+
+                # Write any remaining records in the buffer
+                if self.record_buffer:
+                    self.write_json_batch()
+
+            finally:
+                if self.parquet:
+                    self.parquet.close()
+                print(f"Wrote {self.record_count} records to {self.output_path}")
+
+            self.write_tombstones(diff.changed + diff.deleted)
+            manifest.commit(self.run, started, diff, done)
         finally:
-            print(f"Wrote {self.record_count} records to {self.output_path}")
+            manifest.close()
+
+    def _parsed_chunks(self, files):
+        chunks = chunked(files, self.chunk_size)
+        if self.workers <= 1:
+            yield from map(process_chunk, chunks)
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            yield from ordered_imap(pool, process_chunk, chunks, window=self.workers * 2)
 
     def process_metadata(self, metadata: dict) -> dict:
-        if "raw_html" not in metadata:
+        processed = parse_metadata(metadata)
+        if processed is None:
             self.without_rh += 1
-            return None
-
-        html_s = metadata["raw_html"]
-        html_element = LH.fromstring(html_s)
-
-        # Add try-except to handle missing title
-        try:
-            title = html_element.xpath("./button//text()")[0].strip()
-        except (IndexError, KeyError):
-            title = ""
-
-        description_elem = html_element.xpath("./text()")
-        judge_txt = html_element.xpath("./strong/text()")
-        judge_name = judge_txt[0].split(":")[1].strip() if judge_txt else ""
-        description = (
-            description_elem[0].strip() if description_elem else ""
-        )  # Empty string instead of None
-
-        case_details = {
-            "court_code": metadata["court_code"],
-            "title": title,
-            "description": description,
-            "judge": judge_name,
-            "pdf_link": metadata["pdf_link"],
-        }
-
-        # Wrap XPath queries in try-except to handle missing elements
-        try:
-            case_details_elements = html_element.xpath(
-                '//strong[@class="caseDetailsTD"]'
-            )[0]
-
-            # Handle potential missing fields with default empty strings
-            try:
-                case_details["cnr"] = case_details_elements.xpath(
-                    './/span[contains(text(), "CNR")]/following-sibling::font/text()'
-                )[0].strip()
-            except (IndexError, KeyError):
-                case_details["cnr"] = ""
-
-            try:
-                case_details["date_of_registration"] = case_details_elements.xpath(
-                    './/span[contains(text(), "Date of registration")]/following-sibling::font/text()'
-                )[0].strip()
-            except (IndexError, KeyError):
-                case_details["date_of_registration"] = ""
-
-            try:
-                case_details["decision_date"] = case_details_elements.xpath(
-                    './/span[contains(text(), "Decision Date")]/following-sibling::font/text()'
-                )[0].strip()
-            except (IndexError, KeyError):
-                case_details["decision_date"] = ""
-
-            try:
-                case_details["disposal_nature"] = case_details_elements.xpath(
-                    './/span[contains(text(), "Disposal Nature")]/following-sibling::font/text()'
-                )[0].strip()
-            except (IndexError, KeyError):
-                case_details["disposal_nature"] = ""
-
-            try:
-                case_details["court"] = (
-                    case_details_elements.xpath(
-                        './/span[contains(text(), "Court")]/text()'
-                    )[0]
-                    .split(":")[1]
-                    .strip()
-                )
-            except (IndexError, KeyError):
-                case_details["court"] = ""
-
-        except (IndexError, KeyError):
-            # If we can't find the case details element, set all fields to empty strings
-            case_details["cnr"] = ""
-            case_details["date_of_registration"] = ""
-            case_details["decision_date"] = ""
-            case_details["disposal_nature"] = ""
-            case_details["court"] = ""
-
-        return case_details
+        return processed
 
     def add_record(self, record):
         """Add a record to the buffer and write if the buffer is full."""
+        record["run"] = self.run
+        if self.parquet:
+            self.parquet.write(record)
+            self.record_count += 1
+            return
+
         self.record_buffer.append(record)
 
         # If buffer reaches batch size, write the batch
@@ -144,7 +277,10 @@ class MetadataProcessor:
             return
 
         # Create output path for JSON files
-        output_file = Path("processed_metadata") / f"metadata_batch_{self.record_count}.json"
+        name = f"metadata_batch_{self.record_count}.json"
+        if self.run:
+            name = f"metadata_batch_r{self.run:05d}_{self.record_count}.json"
+        output_file = Path(self.output_path) / name
         output_file.parent.mkdir(exist_ok=True)
 
         # Write the batch to the JSON file
@@ -154,13 +290,67 @@ class MetadataProcessor:
         self.record_count += len(self.record_buffer)
         self.record_buffer = []
 
-    def load_metadata(self, file: Path | str) -> dict:
-        with open(file) as f:
-            return json.load(f)
-
-
-# You can adjust the batch size based on your data characteristics and memory availability
-processor = MetadataProcessor(src, batch_size=1000)
-processor.process()
+    def clear_output(self):
+        """
+        Remove what earlier runs wrote (Parquet partitions, JSON batches,
+        tombstones): a full rebuild restarts at run 0, and their rows and
+        tombstones would otherwise be read alongside the new run's.
+        """
+        out = Path(self.output_path)
+        if not out.is_dir():
+            return
+        for part in out.glob("court_code=*"):
+            shutil.rmtree(part)
+        for batch in out.glob("metadata_batch_*.json"):
+            batch.unlink()
+        shutil.rmtree(out / TOMBSTONE_DIR, ignore_errors=True)
+
+    def write_tombstones(self, entries):
+        """
+        Record pdf_links whose source file changed or vanished in this run; any
+        row for them from an earlier run is superseded.
+        """
+        tombstones = [{"pdf_link": link, "path": rel, "run": self.run}
+                      for rel, link in entries if link]
+        if not tombstones:
+            return
+        output_file = Path(self.output_path) / TOMBSTONE_DIR / f"run-{self.run:05d}.json"
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(tombstones, f, indent=2, ensure_ascii=False)
+        print(f"Tombstoned {len(tombstones)} records")
 
-print(f"Records without raw_html: {processor.without_rh}")
+    def load_metadata(self, file: Path | str) -> dict:
+        return load_metadata(file)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Consolidate scraped metadata JSONs into batches")
+    p.add_argument("--src", default=str(src), help="Tree of metadata JSON files")
+    p.add_argument("--out", default="processed_metadata", help="Output directory")
+    # You can adjust the batch size based on your data characteristics and memory availability
+    p.add_argument("--batch_size", type=int, default=1000, help="Records per output batch")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                   help="Parser processes (1 = parse in this process)")
+    p.add_argument("--chunk_size", type=int, default=500, help="Files per worker shard")
+    p.add_argument("--format", choices=["json", "parquet"], default="json",
+                   help="JSON batches, or Parquet partitioned by court_code and decision year")
+    p.add_argument("--row_group_size", type=int, default=50_000,
+                   help="Parquet: rows per row group (per partition)")
+    p.add_argument("--max_buffered", type=int, default=200_000,
+                   help="Parquet: rows held across all partitions before the largest "
+                        "buffers are written out early")
+    p.add_argument("--incremental", action="store_true",
+                   help="Only process files new or changed since the last run (per the "
+                        "manifest in --out), writing them as a new run")
+    args = p.parse_args()
+
+    processor = MetadataProcessor(Path(args.src), batch_size=args.batch_size,
+                                  workers=args.workers, chunk_size=args.chunk_size,
+                                  output_path=args.out, output_format=args.format,
+                                  row_group_size=args.row_group_size,
+                                  incremental=args.incremental,
+                                  max_buffered=args.max_buffered)
+    processor.process()
+
+    print(f"Records without raw_html or parsed fields: {processor.without_rh}")
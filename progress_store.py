@@ -0,0 +1,172 @@
+# progress_store.py
+#
+# Single progress store for download.py and scrape_year.py. Completion is
+# recorded per (court, date window) in SQLite, one small transaction per
+# window, so parallel workers can finish windows in any order without a
+# global lock or whole-file rewrites, and a crash can't leave a torn file.
+# Within a window, a cursor records how many rows of the portal's listing are
+# settled, so an interrupted window resumes from there instead of row 0.
+# The legacy track.json / progress.json high-water marks are imported once.
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS windows (
+    court_code TEXT NOT NULL,
+    frm        TEXT NOT NULL,
+    to_date    TEXT NOT NULL,
+    completed  REAL NOT NULL,
+    PRIMARY KEY (court_code, frm, to_date)
+);
+CREATE TABLE IF NOT EXISTS cursors (
+    court_code TEXT NOT NULL,
+    frm        TEXT NOT NULL,
+    to_date    TEXT NOT NULL,
+    offset     INTEGER NOT NULL,
+    updated    REAL NOT NULL,
+    PRIMARY KEY (court_code, frm, to_date)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+FMT = "%Y-%m-%d"
+
+
+def _day(s: str) -> datetime:
+    return datetime.strptime(s, FMT)
+
+
+def _shift(s: str, days: int) -> str:
+    return (_day(s) + timedelta(days=days)).strftime(FMT)
+
+
+class ProgressStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    # ── writes ────────────────────────────────────────────────────────────────
+
+    def mark_done(self, court_code: str, frm: str, to: str):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO windows (court_code, frm, to_date, completed) "
+                "VALUES (?, ?, ?, ?)", (court_code, frm, to, time.time()))
+            self._db.execute(
+                "DELETE FROM cursors WHERE court_code = ? AND frm = ? AND to_date = ?",
+                (court_code, frm, to))
+
+    def save_cursor(self, court_code: str, frm: str, to: str, offset: int):
+        """Rows [0, offset) of the window's listing are settled (stored or dead-lettered)."""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cursors (court_code, frm, to_date, offset, updated) "
+                "VALUES (?, ?, ?, ?, ?)", (court_code, frm, to, offset, time.time()))
+
+    def import_legacy(self, track_file: Path, progress_file: Path, start_date: str):
+        """Fold track.json and progress.json into the store (once)."""
+        with self._lock:
+            done = self._db.execute(
+                "SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone()
+        if done:
+            return
+        spans = []
+        track = _load_json(track_file)
+        for code, t in track.items():
+            if isinstance(t, dict) and t.get("last_date"):
+                spans.append((code, start_date, t["last_date"]))
+        for key, last in _load_json(progress_file).items():
+            code, _, yr = key.rpartition("_")
+            if code and yr.isdigit() and last:
+                spans.append((code, f"{yr}-01-01", last))
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO windows (court_code, frm, to_date, completed) "
+                "VALUES (?, ?, ?, ?)", [(*s, time.time()) for s in spans if s[1] <= s[2]])
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', ?)",
+                (str(time.time()),))
+        if spans:
+            logger.info(f"Imported {len(spans)} legacy progress entries into {self.path}")
+
+    # ── reads ─────────────────────────────────────────────────────────────────
+
+    def cursor(self, court_code: str, frm: str, to: str) -> int:
+        """Listing offset to resume an unfinished window from (0 if none)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT offset FROM cursors WHERE court_code = ? AND frm = ? AND to_date = ?",
+                (court_code, frm, to)).fetchone()
+        return row[0] if row else 0
+
+    def completed(self, court_code: str) -> List[Tuple[str, str]]:
+        """Merged, sorted (frm, to) spans already done for a court."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT frm, to_date FROM windows WHERE court_code = ? ORDER BY frm",
+                (court_code,)).fetchall()
+        merged = []
+        for frm, to in rows:
+            if merged and frm <= _shift(merged[-1][1], 1):
+                if to > merged[-1][1]:
+                    merged[-1][1] = to
+            else:
+                merged.append([frm, to])
+        return [tuple(m) for m in merged]
+
+    def gaps(self, court_code: str, start: str, end: str) -> List[Tuple[str, str]]:
+        """Sub-ranges of [start, end] not yet covered by completed windows."""
+        out = []
+        cur = start
+        for frm, to in self.completed(court_code):
+            if to < cur:
+                continue
+            if frm > end:
+                break
+            if frm > cur:
+                out.append((cur, min(_shift(frm, -1), end)))
+            cur = max(cur, _shift(to, 1))
+            if cur > end:
+                break
+        if cur <= end:
+            out.append((cur, end))
+        return out
+
+    def is_done(self, court_code: str, start: str, end: str) -> bool:
+        return not self.gaps(court_code, start, end)
+
+    def pending_ranges(self, court_code: str, start: str, end: str,
+                       step: int = 1) -> Iterator[Tuple[str, str]]:
+        """`step`-day windows covering only the not-yet-done parts of [start, end]."""
+        for g_start, g_end in self.gaps(court_code, start, end):
+            cur = g_start
+            while cur <= g_end:
+                r_end = min(_shift(cur, step - 1), g_end)
+                yield cur, r_end
+                cur = _shift(r_end, 1)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _load_json(path: Optional[Path]) -> dict:
+    try:
+        return json.loads(Path(path).read_text()) or {}
+    except (TypeError, OSError, ValueError):
+        return {}
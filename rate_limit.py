@@ -0,0 +1,228 @@
+# rate_limit.py
+#
+# Shared pacing for every request a run makes to the portal. Each host and
+# each court gets a token bucket (requests/s) and an AIMD concurrency limit:
+# the limit grows by one after a window of healthy responses and is halved
+# on congestion — timeouts, connection errors, slow responses, HTML served
+# instead of a PDF, session expiries and `errormsg` replies — with a cooldown
+# so one burst of failures halves it only once. Works from threads and from
+# asyncio (the async side polls, which is cheap at portal request rates).
+#
+# With AIMD on, the limiter rather than the worker count bounds concurrency:
+# download.py sizes its task pools and portal-facing stages for ceiling(),
+# and the limits start at --max_workers and widen from there.
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff for retry `attempt` (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** max(0, attempt - 1)))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """`rate` tokens/s (0 = unlimited), holding at most `burst` (default: 1 s worth)."""
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long the caller must wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class AIMDLimit:
+    def __init__(self, name: str, initial: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 decrease: float = 0.5, latency_target: float = 0.0, cooldown: float = 5.0):
+        self.name = name
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._healthy = 0
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    def cancel(self):
+        """Give back a slot that was never used for a request."""
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, latency: float, ok: bool):
+        with self._cond:
+            self.in_flight -= 1
+            if not ok or (self.latency_target and latency > self.latency_target):
+                self._cut()
+            else:
+                # Additive increase: +1 per window of `limit` healthy responses.
+                self._healthy += 1
+                if self._healthy >= self.limit and self.limit < self.max_limit:
+                    self._healthy = 0
+                    self.limit += 1
+            self._cond.notify_all()
+
+    def congested(self):
+        with self._cond:
+            self._cut()
+
+    def _cut(self):
+        now = time.monotonic()
+        self._healthy = 0
+        if now - self._last_cut < self.cooldown:
+            return
+        self._last_cut = now
+        new = max(self.min_limit, int(self.limit * self.decrease))
+        if new < self.limit:
+            logger.info(f"Concurrency for {self.name}: {int(self.limit)} → {new}")
+        self.limit = float(new)
+
+
+class _Permit:
+    def __init__(self):
+        self.ok = True
+
+    def congested(self):
+        """Mark the response as a congestion signal (e.g. session expired)."""
+        self.ok = False
+
+
+class PortalLimiter:
+    def __init__(self, host_rate: float = 0, court_rate: float = 0, adaptive: bool = True,
+                 initial: int = 4, max_concurrency: int = 64, per_court: int = 8,
+                 min_concurrency: int = 1, latency_target: float = 0.0):
+        """
+        `host_rate`/`court_rate`: requests/s (0 = unlimited). With `adaptive`,
+        requests also hold an AIMD slot per host (ceiling `max_concurrency`)
+        and per court (ceiling `per_court`).
+        """
+        self.host_rate = host_rate
+        self.court_rate = court_rate
+        self.adaptive = adaptive
+        self.initial = initial
+        self.max_concurrency = max_concurrency
+        self.per_court = per_court
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._limits: Dict[str, AIMDLimit] = {}
+        self._lock = threading.Lock()
+
+    def ceiling(self, courts: Optional[int] = None) -> int:
+        """
+        Most requests the AIMD limits could ever let through at once, over
+        `courts` courts if known (0 when not adaptive: no limit of its own).
+        """
+        if not self.adaptive:
+            return 0
+        if courts is None:
+            return self.max_concurrency
+        return min(self.max_concurrency, self.per_court * courts)
+
+    def _get(self, key: str, court: bool):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(
+                    self.court_rate if court else self.host_rate)
+            limit = None
+            if self.adaptive:
+                limit = self._limits.get(key)
+                if limit is None:
+                    ceiling = self.per_court if court else self.max_concurrency
+                    limit = self._limits[key] = AIMDLimit(
+                        key, initial=min(self.initial, ceiling), min_limit=self.min_concurrency,
+                        max_limit=ceiling, latency_target=self.latency_target)
+            return bucket, limit
+
+    def _scopes(self, host: str, court: str):
+        # Court first: waiting on the host slot while holding a court slot
+        # only ever blocks that court.
+        return [self._get(f"court:{court}", True), self._get(f"host:{host}", False)]
+
+    def signal(self, host: str, court: str):
+        """Congestion seen outside a request() block (e.g. in a parsed response)."""
+        for _, limit in self._scopes(host, court):
+            if limit:
+                limit.congested()
+
+    @contextmanager
+    def request(self, host: str, court: str):
+        scopes = self._scopes(host, court)
+        held = []
+        try:
+            for _, limit in scopes:
+                if limit:
+                    limit.acquire()
+                    held.append(limit)
+            time.sleep(max(b.reserve() for b, _ in scopes))
+        except BaseException:
+            for limit in held:
+                limit.cancel()
+            raise
+        with self._measure(held) as permit:
+            yield permit
+
+    @asynccontextmanager
+    async def arequest(self, host: str, court: str):
+        scopes = self._scopes(host, court)
+        held = []
+        try:
+            for _, limit in scopes:
+                if limit:
+                    while not limit.try_acquire():
+                        await asyncio.sleep(0.01)
+                    held.append(limit)
+            await asyncio.sleep(max(b.reserve() for b, _ in scopes))
+        except BaseException:
+            for limit in held:
+                limit.cancel()
+            raise
+        with self._measure(held) as permit:
+            yield permit
+
+    @contextmanager
+    def _measure(self, held):
+        permit = _Permit()
+        started = time.monotonic()
+        try:
+            yield permit
+        except BaseException:
+            permit.ok = False
+            raise
+        finally:
+            for limit in held:
+                limit.release(time.monotonic() - started, permit.ok)
@@ -0,0 +1,67 @@
+# retry.py
+#
+# Bounded retries with full-jitter exponential backoff, shared by the portal
+# calls (captcha, token refresh, API), whole tasks and the async engine.
+# Anything still failing after the last attempt is surfaced to the caller,
+# which records it in the dead-letter store (dead_letter.py).
+
+import asyncio
+import logging
+import time
+from typing import Callable, Tuple, Type
+
+from rate_limit import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+
+class RetriesExhausted(RuntimeError):
+    pass
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int = 5, base: float = 0.5, cap: float = 30.0,
+                 retry_on: Tuple[Type[BaseException], ...] = (Exception,)):
+        """`attempts` counts the first try; delays are uniform in [0, min(cap, base·2ⁿ)]."""
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.retry_on = retry_on
+
+    def delay(self, attempt: int) -> float:
+        """Wait before retry number `attempt` (1-based)."""
+        return backoff_delay(attempt, self.base, self.cap)
+
+    def call(self, fn: Callable, *args, what: str = "", **kwargs):
+        """fn(*args, **kwargs), retried on `retry_on`; the last error propagates."""
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return fn(*args, **kwargs)
+            except self.retry_on as e:
+                if attempt >= self.attempts:
+                    raise
+                delay = self.delay(attempt)
+                logger.warning(f"{what or fn.__name__} failed ({e}); "
+                               f"retry {attempt}/{self.attempts - 1} in {delay:.1f}s")
+                time.sleep(delay)
+
+    async def acall(self, fn: Callable, *args, what: str = "", **kwargs):
+        """Async call(): `fn` returns an awaitable."""
+        for attempt in range(1, self.attempts + 1):
+            try:
+                return await fn(*args, **kwargs)
+            except self.retry_on as e:
+                if attempt >= self.attempts:
+                    raise
+                delay = self.delay(attempt)
+                logger.warning(f"{what or fn.__name__} failed ({e}); "
+                               f"retry {attempt}/{self.attempts - 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+# Unreadable captcha images: fetch another one straight away.
+CAPTCHA_RETRY = RetryPolicy(attempts=6, base=0.0, cap=0.0)
+# session_expire / errormsg replies: refresh the token and try again.
+API_RETRY = RetryPolicy(attempts=5, base=0.5, cap=30.0)
+# A whole (court, window) task.
+TASK_RETRY = RetryPolicy(attempts=3, base=5.0, cap=120.0)
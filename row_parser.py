@@ -0,0 +1,119 @@
+# row_parser.py
+#
+# The one parser for a search-result row (`aaData[i][1]`), shared by the
+# downloader and process_metadata.py. Each row is parsed once with lxml and
+# read with precompiled XPath: the case-details block is walked in a single
+# pass over its <span> labels instead of one query per field.
+
+import re
+from dataclasses import dataclass, fields
+from typing import Dict, Optional
+
+import lxml.html as LH
+from lxml import etree
+
+_ONCLICK = etree.XPath("(.//button[@onclick])[1]/@onclick")
+_TITLE = etree.XPath(".//button//text()")
+_DESCRIPTION = etree.XPath("./text()")
+_STRONG = etree.XPath(".//strong/text()")
+_DETAIL_SPANS = etree.XPath('(.//strong[@class="caseDetailsTD"])[1]//span')
+_FONT = etree.XPath("following-sibling::font[1]/text()")
+_FRAG_RE = re.compile(r"open_pdf\('.*?','.*?','(.*?)'\)")
+
+# Span label (substring) → field holding the following <font> text.
+_LABELS = (
+    ("CNR", "cnr"),
+    ("Date of registration", "date_of_registration"),
+    ("Decision Date", "decision_date"),
+    ("Disposal Nature", "disposal_nature"),
+)
+
+# Field names written by older downloader versions.
+LEGACY_ALIASES = {
+    "date_reg": "date_of_registration",
+    "date_dec": "decision_date",
+    "disp": "disposal_nature",
+}
+
+
+@dataclass(slots=True)
+class RowRecord:
+    pdf_link: Optional[str] = None
+    title: str = ""
+    description: str = ""
+    judge: str = ""
+    cnr: str = ""
+    date_of_registration: str = ""
+    decision_date: str = ""
+    disposal_nature: str = ""
+    bench: str = ""  # the "Court :" label; saved metadata's `court` is the High Court's name
+
+    def as_dict(self) -> Dict:
+        return {f: getattr(self, f) for f in FIELDS}
+
+
+FIELDS = tuple(f.name for f in fields(RowRecord))
+
+
+def _first(texts) -> str:
+    for t in texts:
+        t = t.strip()
+        if t:
+            return t
+    return ""
+
+
+def parse_row(html: str) -> RowRecord:
+    rec = RowRecord()
+    tree = LH.fromstring(html)
+
+    onclick = _ONCLICK(tree)
+    if onclick:
+        m = _FRAG_RE.search(onclick[0])
+        if m:
+            rec.pdf_link = m.group(1).split("#")[0]
+
+    rec.title = "".join(_TITLE(tree)).strip()
+    rec.description = _first(_DESCRIPTION(tree))
+    strong = _STRONG(tree)
+    for s in strong:
+        if "Judge" in s or "Hon'ble" in s:
+            rec.judge = s.split(":", 1)[-1].strip()
+            break
+    else:
+        if strong and ":" in strong[0]:
+            rec.judge = strong[0].split(":", 1)[1].strip()
+
+    for span in _DETAIL_SPANS(tree):
+        label = span.text or ""
+        for needle, field in _LABELS:
+            if needle in label:
+                setattr(rec, field, _first(_FONT(span)))
+                break
+        else:
+            if "Court" in label and ":" in label:
+                rec.bench = label.split(":", 1)[1].strip()
+    return rec
+
+
+def record_from_metadata(meta: Dict) -> Optional[RowRecord]:
+    """
+    RowRecord for a saved metadata JSON: parsed from its raw_html when present,
+    otherwise taken from the fields the downloader already extracted (current
+    or legacy names). None if the file has neither.
+    """
+    if meta.get("raw_html"):
+        rec = parse_row(meta["raw_html"])
+    elif any(f in meta for f in LEGACY_ALIASES) or "decision_date" in meta:
+        rec = RowRecord()
+        for old, new in LEGACY_ALIASES.items():
+            if old in meta:
+                setattr(rec, new, meta[old] or "")
+        for f in FIELDS:
+            if meta.get(f):
+                setattr(rec, f, meta[f])
+    else:
+        return None
+    if meta.get("pdf_link"):
+        rec.pdf_link = meta["pdf_link"]
+    return rec
@@ -0,0 +1,95 @@
+# scheduler.py
+#
+# Fair cross-court scheduling of download tasks. Every (court, window) task
+# of a run is handed to one scheduler up front instead of being run court
+# by court. Tasks wait in one queue per court, ordered newest window first
+# ("recent") or oldest first. A worker asking for work gets the head of the
+# court with the fewest tasks running, then the fewest handed out so far, so
+# W workers spread across the courts. A court already running `per_court`
+# tasks is passed over, so one slow High Court can hold at most its own cap
+# of workers while the rest keep the other courts moving.
+
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Optional
+
+ORDERS = ("recent", "oldest")
+
+
+class FairScheduler:
+    def __init__(self, tasks: Iterable, per_court: int = 0, order: str = "recent"):
+        """`per_court` caps running tasks per court (0 = no cap)."""
+        if order not in ORDERS:
+            raise ValueError(f"order must be one of {ORDERS}")
+        self.per_court = per_court
+        self.recent = order == "recent"
+        by_court: Dict[str, list] = defaultdict(list)
+        for t in tasks:
+            by_court[t.court_code].append(t)
+        self._queues = {code: deque(sorted(ts, key=lambda t: (t.frm, t.to), reverse=self.recent))
+                        for code, ts in by_court.items()}
+        self._running = defaultdict(int)
+        self._served = defaultdict(int)
+        self._total = sum(len(q) for q in self._queues.values())
+        self._pending = self._total
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return self._total
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._pending
+
+    def _before(self, a, b) -> bool:
+        return a.frm > b.frm if self.recent else a.frm < b.frm
+
+    def _take(self):
+        best, best_key = None, None
+        for code, q in self._queues.items():
+            if not q or (self.per_court and self._running[code] >= self.per_court):
+                continue
+            key = (self._running[code], self._served[code])
+            if (best is None or key < best_key
+                    or (key == best_key and self._before(q[0], self._queues[best][0]))):
+                best, best_key = code, key
+        if best is None:
+            return None
+        self._running[best] += 1
+        self._served[best] += 1
+        self._pending -= 1
+        return self._queues[best].popleft()
+
+    def take(self):
+        """The next task allowed to start now, or None (without waiting)."""
+        with self._cond:
+            return self._take()
+
+    def next(self, stop: Optional[threading.Event] = None, poll: float = 1.0):
+        """
+        Block until a task may start. Returns None once nothing is pending, or
+        when `stop` is set.
+        """
+        with self._cond:
+            while not (stop and stop.is_set()):
+                task = self._take()
+                if task is not None or not self._pending:
+                    return task
+                self._cond.wait(poll)
+            return None
+
+    def done(self, task):
+        """A task handed out by next()/take() finished (however it ended)."""
+        with self._cond:
+            self._running[task.court_code] -= 1
+            self._cond.notify_all()
+
+
+def interleave(tasks: Iterable, order: str = "recent") -> List:
+    """A fixed fair order for `tasks` (e.g. to enqueue them in the shared work queue)."""
+    sched = FairScheduler(tasks, per_court=1, order=order)
+    out = []
+    while (task := sched.take()) is not None:
+        sched.done(task)
+        out.append(task)
+    return out
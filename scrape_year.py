@@ -1,35 +1,19 @@
 #!/usr/bin/env python3
 # scrape_year.py
+#
+# Every court × year in one run: all pending windows go to a single
+# cross-court scheduler (scheduler.py), newest first by default, so workers
+# spread over the courts instead of queueing behind one court at a time.
 
 import argparse
 import logging
-import signal
 import sys
-import json
-from datetime import datetime, timedelta
 
-from download import run
+from download import run, open_progress_store, PROGRESS_DB, Shutdown
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
-PROGRESS_FILE = "progress.json"
-
-def load_progress():
-    try:
-        with open(PROGRESS_FILE) as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-
-def save_progress(progress):
-    with open(PROGRESS_FILE, "w") as f:
-        json.dump(progress, f, indent=2)
-
-def bump_date(date_str):
-    d = datetime.strptime(date_str, "%Y-%m-%d")
-    return (d + timedelta(days=1)).strftime("%Y-%m-%d")
-
 def main():
     parser = argparse.ArgumentParser(
         description="Scrape one or more full calendar years of e-Court data, with graceful shutdown & resume"
@@ -52,7 +36,19 @@ def main():
     )
     parser.add_argument(
         "--max_workers", type=int, default=5,
-        help="Parallel threads (courts scraped simultaneously)."
+        help="Parallel threads, shared across all courts and years."
+    )
+    parser.add_argument(
+        "--per_court_tasks", type=int, default=2,
+        help="Max windows of one court in flight at once, so a slow court can't take every worker (0 = no cap)"
+    )
+    parser.add_argument(
+        "--order", choices=["recent", "oldest"], default="recent",
+        help="Within each court, newest windows first (recent) or oldest first"
+    )
+    parser.add_argument(
+        "--no-upload", dest="upload", action="store_false",
+        help="Keep files local only; never create a GCS client"
     )
     args = parser.parse_args()
 
@@ -62,32 +58,33 @@ def main():
         start_year = args.start_year
         end_year = args.end_year or args.start_year
 
-    def handle_sigint(signum, frame):
-        logger.warning("✋ Interrupted—shutting down. Progress saved to %s.", PROGRESS_FILE)
-        sys.exit(0)
-    signal.signal(signal.SIGINT, handle_sigint)
-
     codes = [c.strip() for c in args.court_codes.split(",")]
-    progress = load_progress()
-
+    progress = open_progress_store()
+    pending = 0
     for yr in range(start_year, end_year + 1):
         for code in codes:
-            key = f"{code}_{yr}"
-            if key in progress:
-                start_date = bump_date(progress[key])
-            else:
-                start_date = f"{yr}-01-01"
-            end_date = f"{yr}-12-31"
-
-            if start_date > end_date:
+            if progress.is_done(code, f"{yr}-01-01", f"{yr}-12-31"):
                 logger.info("✅ %s already complete for %s", code, yr)
-                continue
-
-            logger.info(f"▶▶▶ Scraping code={code} for {yr}: {start_date} → {end_date} with {args.max_workers} workers")
-            run([code], start_date, end_date, step=1, workers=args.max_workers)
-
-            progress[key] = end_date
-            save_progress(progress)
+            else:
+                pending += 1
+    progress.close()
+    if not pending:
+        logger.info("✅ ALL YEARS & CODES COMPLETE.")
+        return
+
+    # One run over the whole span: it only schedules windows not yet marked
+    # done, and interleaves the courts instead of finishing one before the next.
+    logger.info(f"▶▶▶ Scraping {pending} court-years of {len(codes)} courts, {start_year} → {end_year}, "
+                f"with {args.max_workers} workers (per court: {args.per_court_tasks or 'no cap'})")
+    try:
+        # run() turns SIGINT/SIGTERM into a checkpointed stop (Shutdown).
+        run(codes, f"{start_year}-01-01", f"{end_year}-12-31", step=1,
+            workers=args.max_workers, upload=args.upload,
+            per_court_tasks=args.per_court_tasks, order=args.order)
+    except Shutdown:
+        logger.warning("✋ Interrupted—in-flight rows finished and every open window "
+                       "checkpointed in %s; rerun to resume.", PROGRESS_DB)
+        sys.exit(130)
 
     logger.info("✅ ALL YEARS & CODES COMPLETE.")
 
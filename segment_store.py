@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# segment_store.py
+#
+# Packed storage (`download.py --storage segments`). Instead of one PDF and
+# one metadata JSON per judgment, PDFs are appended back to back to large
+# segment files per court and year, next to a line-delimited metadata file:
+#
+#   ecourts-data/segments/<court_code>/<year>/seg-00003.pdfs    PDF bytes
+#   ecourts-data/segments/<court_code>/<year>/seg-00003.jsonl   one metadata line
+#                                                               per judgment, with
+#                                                               its offset/length
+#
+# PDFs stream into a staging file first (the PDF sink needs a whole file to
+# validate and hash), then are copied into the segment under the segment's
+# lock, and only then is the metadata line written, so a metadata line
+# never points at bytes that aren't there. A segment is sealed once it
+# passes `segment_bytes`, and every segment still open is sealed by
+# seal_open() (on close(), and after each poll of the cli.py daemon).
+# Each run therefore starts fresh segments and never reopens one it did not
+# write. Sealed segments are handed to `on_seal`, which download.py uses to
+# upload them as two GCS objects. The offset index lives in the download
+# index. SegmentReader gives random access through one mmap per segment.
+#
+#   python segment_store.py --get <pdf_link> > judgment.pdf
+#   python segment_store.py --stats
+
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_DIR = "segments"
+STAGING_DIR = ".staging"
+SEGMENT_BYTES = 1 << 30
+COPY_CHUNK = 1 << 20
+
+
+class Location:
+    def __init__(self, pdfs: Path, meta: Path, offset: Optional[int], length: Optional[int],
+                 sha256: Optional[str]):
+        self.pdfs = pdfs
+        self.meta = meta
+        self.offset = offset
+        self.length = length
+        self.sha256 = sha256
+
+
+class Segment:
+    def __init__(self, court_code: str, year: str, pdfs: Path):
+        self.court_code = court_code
+        self.year = year
+        self.pdfs = pdfs
+        self.meta = pdfs.with_suffix(".jsonl")
+        pdfs.parent.mkdir(parents=True, exist_ok=True, mode=0o755)
+        self._pdf_fh = open(pdfs, "ab")
+        self._meta_fh = open(self.meta, "a", encoding="utf-8")
+        self.size = self._pdf_fh.tell()
+
+    def append(self, meta: Dict, pdf: Optional[Path]) -> Location:
+        offset = length = digest = None
+        if pdf is not None:
+            # tell(), not self.size: a copy that failed half-way leaves junk bytes behind.
+            offset = self._pdf_fh.tell()
+            h = hashlib.sha256()
+            with open(pdf, "rb") as src:
+                for chunk in iter(lambda: src.read(COPY_CHUNK), b""):
+                    self._pdf_fh.write(chunk)
+                    h.update(chunk)
+            self._pdf_fh.flush()
+            self.size = self._pdf_fh.tell()
+            length = self.size - offset
+            digest = h.hexdigest()
+        line = dict(meta, segment=self.pdfs.name, offset=offset, length=length, sha256=digest)
+        self._meta_fh.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self._meta_fh.flush()
+        return Location(self.pdfs, self.meta, offset, length, digest)
+
+    def close(self):
+        self._pdf_fh.close()
+        self._meta_fh.close()
+
+
+class SegmentStore:
+    def __init__(self, root: Path, segment_bytes: int = SEGMENT_BYTES,
+                 on_seal: Optional[Callable[[Segment], None]] = None):
+        self.root = Path(root) / SEGMENT_DIR
+        self.staging = self.root / STAGING_DIR
+        self.staging.mkdir(parents=True, exist_ok=True, mode=0o755)
+        self.segment_bytes = segment_bytes
+        self.on_seal = on_seal
+        self._open: Dict[Tuple[str, str], Segment] = {}
+        self._locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def staging_path(self, frag: str) -> Path:
+        """Where a PDF streams to before store() packs it."""
+        return self.staging / f"{hashlib.sha1(frag.encode()).hexdigest()}.pdf"
+
+    def _key_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            return self._locks[key]
+
+    def _new_segment(self, court_code: str, year: str) -> Segment:
+        d = self.root / court_code / year
+        nums = [int(p.stem.split("-")[1]) for p in d.glob("seg-*.pdfs")] if d.exists() else []
+        return Segment(court_code, year, d / f"seg-{max(nums, default=-1) + 1:05d}.pdfs")
+
+    def store(self, court_code: str, year: str, meta: Dict, pdf: Optional[Path]) -> Location:
+        """Pack a staged PDF (if any) and its metadata into the court/year's open segment."""
+        key = (court_code, year)
+        with self._key_lock(key):
+            seg = self._open.get(key)
+            if seg is None:
+                seg = self._open[key] = self._new_segment(court_code, year)
+            loc = seg.append(meta, pdf)
+            if seg.size >= self.segment_bytes:
+                del self._open[key]
+                self._seal(seg)
+        if pdf is not None:
+            pdf.unlink(missing_ok=True)
+        return loc
+
+    def _seal(self, seg: Segment):
+        seg.close()
+        logger.info(f"Sealed {seg.pdfs} ({seg.size / 1e6:.1f} MB)")
+        if self.on_seal:
+            try:
+                self.on_seal(seg)
+            except Exception as e:
+                logger.error(f"Sealed-segment hook failed for {seg.pdfs}: {e}")
+
+    def seal_open(self):
+        """Seal every open segment; the next store() for its court/year starts a new one."""
+        with self._lock:
+            keys = list(self._open)
+        for key in keys:
+            with self._key_lock(key):
+                seg = self._open.pop(key, None)
+                if seg is not None:
+                    self._seal(seg)
+
+    def close(self):
+        self.seal_open()
+
+
+class SegmentReader:
+    """Random access to packed PDFs: one read-only mmap per segment, opened on demand."""
+
+    def __init__(self):
+        self._maps: Dict[Path, mmap.mmap] = {}
+        self._lock = threading.Lock()
+
+    def _map(self, pdfs: Path, need: int) -> mmap.mmap:
+        with self._lock:
+            m = self._maps.get(pdfs)
+            # A segment still being written may have grown since it was mapped;
+            # the old map lives on for as long as views into it do.
+            if m is None or len(m) < need:
+                with open(pdfs, "rb") as fh:
+                    m = self._maps[pdfs] = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            return m
+
+    def read(self, pdfs: Path, offset: int, length: int) -> memoryview:
+        m = self._map(Path(pdfs), offset + length)
+        return memoryview(m)[offset:offset + length]
+
+    def read_indexed(self, entry: Dict) -> Optional[memoryview]:
+        """PDF bytes for a download-index entry; None if it isn't packed."""
+        if not entry or entry.get("pdf_offset") is None or not entry.get("local_path"):
+            return None
+        return self.read(Path(entry["local_path"]), entry["pdf_offset"], entry["size"])
+
+    def close(self):
+        with self._lock:
+            for m in self._maps.values():
+                try:
+                    m.close()
+                except BufferError:
+                    pass  # a caller still holds a view; unmapped when it's dropped
+            self._maps.clear()
+
+
+def iter_metadata(root: Path) -> Iterator[Tuple[Path, Dict]]:
+    """(jsonl path, metadata) for every packed judgment under `root`."""
+    for jsonl in sorted((Path(root) / SEGMENT_DIR).glob("*/*/seg-*.jsonl")):
+        with open(jsonl, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield jsonl, json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write.
+                    logger.warning(f"Skipping unreadable line in {jsonl}")
+
+
+if __name__ == "__main__":
+    import sys
+    from download_index import DownloadIndex
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    p = argparse.ArgumentParser(description="Read packed judgment segments")
+    p.add_argument("--root", default="ecourts-data")
+    p.add_argument("--index", default="ecourts-data/index.sqlite")
+    p.add_argument("--get", metavar="PDF_LINK", help="Write this judgment's PDF to stdout")
+    p.add_argument("--stats", action="store_true", help="Segments, judgments and bytes per court")
+    args = p.parse_args()
+
+    if args.get:
+        idx = DownloadIndex(args.index)
+        reader = SegmentReader()
+        data = reader.read_indexed(idx.get(args.get))
+        if data is None:
+            sys.exit(f"{args.get} is not in a segment")
+        sys.stdout.buffer.write(data)
+        reader.close()
+        idx.close()
+    if args.stats:
+        totals = defaultdict(lambda: [set(), 0, 0])
+        for jsonl, meta in iter_metadata(Path(args.root)):
+            t = totals[jsonl.parent.parent.name]
+            t[0].add(jsonl)
+            t[1] += 1
+            t[2] += meta.get("length") or 0
+        for court, (segs, n, size) in sorted(totals.items()):
+            print(f"{court:10s} {len(segs):6d} segments {n:9d} judgments {size / 1e9:9.2f} GB")
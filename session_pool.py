@@ -0,0 +1,157 @@
+# session_pool.py
+#
+# Pool of authenticated portal sessions shared by every Downloader in a run.
+# Background threads keep `size` sessions warm (cookies + captcha-backed
+# app_token) so tasks never wait on session setup; a session returns to the
+# pool with whatever uses it has left and is handed to the next task.
+#
+# Nobody waits on the pool forever: acquire() gives up after a timeout, when
+# the pool closes or its `stop` event is set, and once session setup has
+# failed `max_failures` times in a row (the portal or captcha is down), so
+# the task fails into the dead letter instead of hanging.
+#
+# pause() drops the warm sessions and stops refilling, for a process that
+# goes idle between bursts of work (the cli.py daemon between polls); the
+# next acquire() resumes refilling on demand.
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+ACQUIRE_TIMEOUT = 300
+
+
+class PortalSession:
+    def __init__(self, session, app_token: Optional[str], uses: int):
+        self.session = session
+        self.app_token = app_token
+        self.uses_left = uses
+        self.created = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+
+class SessionPool:
+    def __init__(self, factory: Callable[[], PortalSession], size: int = 4,
+                 max_age: float = 600, refillers: int = 2, max_failures: int = 5):
+        """
+        `factory()` opens and authenticates a new PortalSession. Sessions older
+        than `max_age` seconds are retired instead of being handed out.
+        """
+        self.factory = factory
+        self.size = size
+        self.max_age = max_age
+        self._ready = deque()
+        self._opening = 0
+        self._closed = False
+        self._paused = False
+        self.max_failures = max_failures
+        self._failures = 0  # consecutive factory() errors
+        self._error: Optional[Exception] = None
+        self._cond = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._refill, name=f"session-refill-{i}", daemon=True)
+            for i in range(max(1, refillers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def acquire(self, timeout: Optional[float] = ACQUIRE_TIMEOUT,
+                stop: Optional[threading.Event] = None, poll: float = 1.0) -> Optional[PortalSession]:
+        """
+        Block until a session is ready. Returns None when `stop` is set; raises
+        once the pool is closed, after `timeout` seconds, or while session
+        setup keeps failing.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._paused:
+                self._paused = False
+                self._cond.notify_all()
+            while True:
+                while self._ready:
+                    ps = self._ready.popleft()
+                    if ps.age() < self.max_age:
+                        self._cond.notify_all()  # a slot opened; refill ahead of demand
+                        return ps
+                if self._closed:
+                    raise RuntimeError("Session pool closed")
+                if self._failures >= self.max_failures:
+                    raise RuntimeError(f"Session setup failed {self._failures} times "
+                                       f"in a row: {self._error!r}")
+                if stop and stop.is_set():
+                    return None
+                wait = poll if stop else None
+                if deadline is not None:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        raise TimeoutError("No portal session available")
+                    wait = left if wait is None else min(wait, left)
+                self._cond.wait(wait)
+
+    def release(self, ps: PortalSession):
+        """Return a session; spent or stale ones are dropped and replaced."""
+        with self._cond:
+            if (ps.uses_left > 0 and ps.age() < self.max_age
+                    and not (self._closed or self._paused)):
+                self._ready.appendleft(ps)
+            self._cond.notify_all()
+
+    def pause(self):
+        """Drop the ready sessions and open no more until the next acquire()."""
+        with self._cond:
+            self._paused = True
+            self._ready.clear()
+            self._failures = 0
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._ready.clear()
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
+
+    def _refill(self):
+        while True:
+            with self._cond:
+                while not self._closed and (self._paused
+                                            or len(self._ready) + self._opening >= self.size):
+                    self._cond.wait(timeout=self.max_age / 4)
+                    self._retire_stale()
+                if self._closed:
+                    return
+                self._opening += 1
+            ps, failures = None, 0
+            try:
+                ps = self.factory()
+            except Exception as e:
+                logger.error(f"Session setup failed: {e}")
+                with self._cond:
+                    self._failures += 1
+                    self._error = e
+                    failures = self._failures
+                    self._cond.notify_all()  # waiters give up after max_failures
+            with self._cond:
+                self._opening -= 1
+                if ps is not None:
+                    self._failures = 0
+                    if not (self._closed or self._paused):
+                        self._ready.append(ps)
+                self._cond.notify_all()
+            if failures:
+                # Keep trying, slower, so the pool recovers once the portal does.
+                retry_at = time.monotonic() + min(60, 2 * failures)
+                with self._cond:
+                    while not self._closed and time.monotonic() < retry_at:
+                        self._cond.wait(retry_at - time.monotonic())
+
+    def _retire_stale(self):
+        fresh = [ps for ps in self._ready if ps.age() < self.max_age]
+        if len(fresh) != len(self._ready):
+            self._ready = deque(fresh)
@@ -0,0 +1,212 @@
+# work_queue.py
+#
+# Shared task queue for multi-node runs (`download.py --queue PATH`). Tasks
+# (court × date window) are rows of one SQLite file on a shared volume. Each
+# node enqueues the windows it would have run — idempotently, so every node
+# can be started with the same command — and then claims them one at a time
+# under a time-limited lease. A heartbeat thread keeps extending the leases a
+# node holds; when a node dies its leases run out and the tasks go to the
+# next node that asks. Adding nodes speeds a backfill up with no hand-split
+# --court_codes.
+#
+# The file uses a rollback journal rather than WAL: WAL needs shared memory,
+# which network filesystems don't provide. Everything else (progress.db, the
+# index, data/) stays per node.
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    court_code  TEXT NOT NULL,
+    frm         TEXT NOT NULL,
+    to_date     TEXT NOT NULL,
+    expected    INTEGER,
+    only        TEXT,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    owner       TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    error       TEXT,
+    updated     REAL NOT NULL,
+    PRIMARY KEY (court_code, frm, to_date)
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, lease_until);
+CREATE INDEX IF NOT EXISTS tasks_owner ON tasks (owner);
+"""
+
+PENDING, LEASED, DONE, FAILED = "pending", "leased", "done", "failed"
+
+
+def node_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    def __init__(self, lease_id: str, court_code: str, frm: str, to: str,
+                 expected: Optional[int], only: Optional[set], attempts: int):
+        self.id = lease_id
+        self.court_code = court_code
+        self.frm = frm
+        self.to = to
+        self.expected = expected
+        self.only = only
+        self.attempts = attempts
+
+    def __str__(self):
+        return f"{self.court_code} {self.frm}->{self.to} [lease {self.id}]"
+
+
+class WorkQueue:
+    def __init__(self, path: Path, lease_seconds: float = 300.0, max_attempts: int = 5,
+                 node: Optional[str] = None):
+        """
+        Tasks whose lease has expired `max_attempts` times (a window that keeps
+        killing nodes) are marked failed instead of being handed out again.
+        """
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.node = node or node_id()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=60)
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.executescript(SCHEMA)
+        self._held = set()
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="queue-heartbeat",
+                                           daemon=True)
+        self._heartbeat.start()
+
+    # ── producers ─────────────────────────────────────────────────────────────
+
+    def add(self, tasks: Iterable) -> int:
+        """Enqueue CourtDateTask-like objects; windows already queued are left alone."""
+        now = time.time()
+        rows = [(t.court_code, t.frm, t.to, t.expected,
+                 None if t.only is None else json.dumps(sorted(t.only)), now) for t in tasks]
+        with self._lock, self._db:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO tasks (court_code, frm, to_date, expected, only, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            return self._db.total_changes - before
+
+    # ── consumers ─────────────────────────────────────────────────────────────
+
+    def claim(self) -> Optional[Lease]:
+        """Lease the oldest pending (or abandoned) task; None if there is none right now."""
+        now = time.time()
+        lease_id = f"{self.node}/{uuid.uuid4().hex[:8]}"
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE tasks SET status = 'failed', updated = ?, "
+                "error = 'lease expired ' || attempts || ' times' "
+                "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts))
+            # One statement, so two nodes can never take the same row.
+            self._db.execute(
+                "UPDATE tasks SET status = 'leased', owner = ?, lease_until = ?, "
+                "attempts = attempts + 1, updated = ? WHERE rowid = ("
+                "  SELECT rowid FROM tasks WHERE status = 'pending' "
+                "  OR (status = 'leased' AND lease_until < ?) ORDER BY rowid LIMIT 1)",
+                (lease_id, now + self.lease_seconds, now, now))
+            row = self._db.execute(
+                "SELECT court_code, frm, to_date, expected, only, attempts FROM tasks "
+                "WHERE owner = ? AND status = 'leased'", (lease_id,)).fetchone()
+            if row is None:
+                return None
+            self._held.add(lease_id)
+        code, frm, to, expected, only, attempts = row
+        lease = Lease(lease_id, code, frm, to, expected,
+                      None if only is None else set(json.loads(only)), attempts)
+        if attempts > 1:
+            logger.warning(f"Reclaimed {lease} (attempt {attempts}) after its lease expired")
+        return lease
+
+    def next(self, poll: Optional[float] = None,
+             stop: Optional[threading.Event] = None) -> Optional[Lease]:
+        """
+        Block until a task can be claimed. Returns None once the queue is
+        drained (nothing pending and no other node still holding a lease that
+        could yet expire) or `stop` is set.
+        """
+        poll = poll if poll is not None else min(30.0, self.lease_seconds / 3)
+        stop = stop or self._stop
+        while not (stop.is_set() or self._stop.is_set()):
+            lease = self.claim()
+            if lease is not None:
+                return lease
+            if not self.counts().get(LEASED):
+                return None
+            stop.wait(poll)
+        return None
+
+    def finish(self, lease: Lease, ok: bool, error: Optional[str] = None):
+        """Mark a claimed task done, or failed for good (its errors are dead-lettered)."""
+        now = time.time()
+        with self._lock, self._db:
+            self._held.discard(lease.id)
+            if ok:
+                # Done is done, even if our lease lapsed and another node took it.
+                self._db.execute(
+                    "UPDATE tasks SET status = 'done', lease_until = NULL, error = NULL, "
+                    "updated = ? WHERE court_code = ? AND frm = ? AND to_date = ?",
+                    (now, lease.court_code, lease.frm, lease.to))
+            else:
+                self._db.execute(
+                    "UPDATE tasks SET status = 'failed', lease_until = NULL, error = ?, "
+                    "updated = ? WHERE owner = ? AND status = 'leased'",
+                    ((error or "")[:2000], now, lease.id))
+
+    def release(self, lease: Lease):
+        """Hand an unfinished task back (e.g. on shutdown) without counting an attempt."""
+        with self._lock, self._db:
+            self._held.discard(lease.id)
+            self._db.execute(
+                "UPDATE tasks SET status = 'pending', owner = NULL, lease_until = NULL, "
+                "attempts = MAX(0, attempts - 1), updated = ? WHERE owner = ? AND status = 'leased'",
+                (time.time(), lease.id))
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            now = time.time()
+            with self._lock, self._db:
+                for lease_id in list(self._held):
+                    cur = self._db.execute(
+                        "UPDATE tasks SET lease_until = ? WHERE owner = ? AND status = 'leased'",
+                        (now + self.lease_seconds, lease_id))
+                    if cur.rowcount == 0:
+                        self._held.discard(lease_id)
+                        logger.warning(f"Lost lease {lease_id}; another node may redo its window")
+
+    # ── reads ─────────────────────────────────────────────────────────────────
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        """Stop heartbeating and hand back whatever this node still holds."""
+        self._stop.set()
+        self._heartbeat.join(timeout=5)
+        with self._lock, self._db:
+            for lease_id in self._held:
+                self._db.execute(
+                    "UPDATE tasks SET status = 'pending', owner = NULL, lease_until = NULL, "
+                    "attempts = MAX(0, attempts - 1), updated = ? "
+                    "WHERE owner = ? AND status = 'leased'", (time.time(), lease_id))
+            self._held.clear()
+        with self._lock:
+            self._db.close()